@@ -1,20 +1,21 @@
 import os
+import time
 import logging
 import numpy as np
+from collections import deque
 from typing import List, Dict, Any, Optional, Tuple
 
-# Import Google Generative AI for Gemini
-import google.generativeai as genai
 from django.conf import settings
-
-# Import for embeddings
-from sentence_transformers import SentenceTransformer
-
-# FAISS for vector storage/search
-import faiss
+from django.db import transaction
 
 # Local imports
-from .models import Chunk, Document, AssignmentDraft
+from . import embedding_cache, retrieval_cache
+from .models import Chunk, Document, AssignmentDraft, EmbeddingSegment
+from .embedding_segments import delete_segment_file, load_segment, save_document_embeddings
+from .model_registry import get_cross_encoder, get_embedding_model, get_gemini_model
+from .vector_store import CourseIndexStore, get_course_id_for_document
+from .lexical_index import CourseLexicalIndex, reciprocal_rank_fusion
+from .text_extractor import iter_document_text
 from classroom_integration.models import Assignment
 
 logger = logging.getLogger(__name__)
@@ -27,23 +28,24 @@ class RAGSystem:
     """
     
     def __init__(self):
-        # Initialize Gemini API
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.gemini_model = genai.GenerativeModel('gemini-pro')
-        
-        # Initialize the embedding model (using Sentence Transformers)
-        # This works without an API key and runs locally
-        try:
-            # Can use a larger model like 'all-mpnet-base-v2' for better quality
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-            logger.info("Embedding model initialized successfully")
-        except Exception as e:
-            logger.error(f"Error initializing embedding model: {str(e)}")
-            self.embedding_model = None
+        # Models are shared per process through the registry, so creating a
+        # RAGSystem is cheap; they are loaded lazily on first use.
+        pass
+    
+    @property
+    def gemini_model(self):
+        return get_gemini_model('gemini-pro')
+    
+    @property
+    def embedding_model(self):
+        # Sentence Transformers model, works without an API key and runs locally
+        return get_embedding_model()
     
     def create_embedding(self, text: str) -> np.ndarray:
         """
-        Create an embedding vector for the given text.
+        Create an embedding vector for a query. Queries are single-use, so
+        they skip the persistent embedding cache kept for document chunks;
+        retrieval_cache holds recent query vectors instead.
         
         Args:
             text (str): Text to embed
@@ -51,24 +53,72 @@ class RAGSystem:
         Returns:
             numpy.ndarray: Embedding vector
         """
-        if not self.embedding_model:
-            logger.error("Embedding model not initialized")
+        embeddings = self.create_embeddings([text], use_cache=False)
+        if embeddings is None:
             return None
+        return embeddings[0]
+    
+    def create_embeddings(self, texts: List[str], batch_size: int = None,
+                          use_cache: bool = True) -> Optional[np.ndarray]:
+        """
+        Create L2-normalized embedding vectors for many texts at once.
+        
+        Args:
+            texts (List[str]): Texts to embed
+            batch_size (int, optional): Encoder batch size, defaults to settings.EMBEDDING_BATCH_SIZE
+            use_cache (bool): Read and write the persistent embedding cache
+                (when settings.EMBEDDING_CACHE_ENABLED)
             
+        Returns:
+            numpy.ndarray: float32 matrix of shape (len(texts), dimension), or None on failure
+        """
         try:
-            # Generate embedding and normalize
-            embedding = self.embedding_model.encode(text)
-            # Convert to unit vector (L2 normalization)
-            faiss.normalize_L2(embedding.reshape(1, -1))
-            return embedding
+            model_name = settings.EMBEDDING_MODEL_NAME
+            use_cache = use_cache and settings.EMBEDDING_CACHE_ENABLED
+            text_hashes = [embedding_cache.hash_text(text) for text in texts]
+            
+            # Reuse cached vectors for text we've already embedded
+            vectors_by_hash = {}
+            if use_cache:
+                vectors_by_hash = embedding_cache.get_cached_embeddings(model_name, text_hashes)
+            
+            # Encode each distinct uncached text once
+            missing = {}
+            for text, text_hash in zip(texts, text_hashes):
+                if text_hash not in vectors_by_hash:
+                    missing.setdefault(text_hash, text)
+            
+            if missing:
+                if not self.embedding_model:
+                    logger.error("Embedding model not initialized")
+                    return None
+                    
+                # Encode in batches; the model normalizes to unit vectors for us
+                encoded = self.embedding_model.encode(
+                    list(missing.values()),
+                    batch_size=batch_size or settings.EMBEDDING_BATCH_SIZE,
+                    normalize_embeddings=True,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                ).astype(np.float32, copy=False)
+                new_vectors = dict(zip(missing.keys(), encoded))
+                vectors_by_hash.update(new_vectors)
+                
+                if use_cache:
+                    embedding_cache.store_embeddings(model_name, new_vectors)
+            
+            logger.debug(f"Embedded {len(texts)} texts ({len(texts) - len(missing)} cache hits)")
+            return np.vstack([vectors_by_hash[text_hash] for text_hash in text_hashes])
         except Exception as e:
-            logger.error(f"Error creating embedding: {str(e)}")
+            logger.error(f"Error creating embeddings: {str(e)}")
             return None
     
     def retrieve_relevant_chunks(self, 
                                query_text: str, 
                                assignment: Assignment,
-                               top_k: int = 5) -> List[Chunk]:
+                               top_k: int = 5,
+                               sections: List[str] = None,
+                               boost_sections: List[str] = None) -> List[Chunk]:
         """
         Retrieve the most relevant chunks for a query from all materials
         associated with the assignment's course.
@@ -77,82 +127,179 @@ class RAGSystem:
             query_text (str): The query text (e.g., assignment description)
             assignment (Assignment): The assignment object
             top_k (int): Number of chunks to retrieve
+            sections (List[str], optional): Only return chunks whose section path
+                has a heading containing one of these terms
+            boost_sections (List[str], optional): Rank chunks in matching sections
+                higher by settings.RAG_SECTION_BOOST
             
         Returns:
             List[Chunk]: List of retrieved chunks
         """
         try:
+            course_id = assignment.course_id
+            
+            # Regenerating a draft for unchanged content against an unchanged course reuses the ranking
+            cache_key = retrieval_cache.get_results_cache_key(
+                course_id, query_text, top_k, sorted(sections or []), sorted(boost_sections or [])
+            )
+            cached_ids = retrieval_cache.get_cached_results(cache_key)
+            if cached_ids is not None:
+                chunks_by_id = Chunk.objects.select_related('document__material').in_bulk(cached_ids)
+                return [chunks_by_id[chunk_id] for chunk_id in cached_ids if chunk_id in chunks_by_id]
+            
             # Create query embedding
-            query_embedding = self.create_embedding(query_text)
+            query_embedding = retrieval_cache.get_cached_query_embedding(query_text)
             if query_embedding is None:
-                return []
+                query_embedding = self.create_embedding(query_text)
+                if query_embedding is None:
+                    return []
+                retrieval_cache.cache_query_embedding(query_text, query_embedding)
                 
-            # Get all materials for this assignment's course
+            # Search the persistent indices for this assignment's course
             # This includes materials from all assignments in the same course
-            course = assignment.course
-            materials_ids = course.assignments.values_list('materials__id', flat=True)
+            store = CourseIndexStore(course_id)
+            if not store.exists():
+                logger.info(f"No FAISS index for course {course_id}, building it")
+                store.rebuild()
+            
+            # Keep only chunks with positive similarity
+            candidate_count = max(top_k, settings.RAG_FUSION_CANDIDATES)
+            if sections:
+                # Sections are filtered after the search, so search deeper to still fill top_k
+                candidate_count *= settings.RAG_SECTION_FILTER_EXPANSION
+            results = [
+                (chunk_id, score)
+                for chunk_id, score in store.search(query_embedding, candidate_count)
+                if score > 0
+            ]
+            
+            # Fuse with BM25 so exact terms (formula names, theorem numbers) aren't missed
+            if settings.RAG_HYBRID_SEARCH:
+                lexical_index = CourseLexicalIndex(course_id)
+                if not lexical_index.exists():
+                    logger.info(f"No lexical index for course {course_id}, building it")
+                    lexical_index.rebuild()
+                
+                lexical_results = lexical_index.search(query_text, candidate_count)
+                results = reciprocal_rank_fusion(results, lexical_results, k=settings.RAG_RRF_K)
             
-            # Get all document chunks
-            chunks = Chunk.objects.filter(
-                document__material_id__in=materials_ids
-            ).order_by('document', 'chunk_index')
+            if sections or boost_sections:
+                results = self._apply_section_preferences(results, sections, boost_sections)
             
-            if not chunks:
+            # Keep a wider pool when a cross-encoder will re-rank it
+            rerank = settings.RAG_RERANK_ENABLED
+            results = results[:max(top_k, settings.RAG_RERANK_CANDIDATES) if rerank else top_k]
+            if not results:
                 logger.warning(f"No chunks found for assignment {assignment.id}")
                 return []
                 
-            # Get all embeddings as a numpy array
-            embeddings = []
-            chunk_objects = []
-            
-            for chunk in chunks:
-                if chunk.embedding_vector:
-                    # Convert binary field to numpy array
-                    embedding = np.frombuffer(chunk.embedding_vector, dtype=np.float32)
-                    embeddings.append(embedding)
-                    chunk_objects.append(chunk)
-            
-            if not embeddings:
-                logger.warning("No valid embeddings found in chunks")
-                return []
-                
-            # Create FAISS index (in-memory)
-            embeddings_matrix = np.vstack(embeddings)
-            dimension = embeddings_matrix.shape[1]
-            
-            index = faiss.IndexFlatIP(dimension)  # Inner product = cosine similarity for normalized vectors
-            index.add(embeddings_matrix)
-            
-            # Search index
-            scores, indices = index.search(query_embedding.reshape(1, -1), min(top_k, len(embeddings)))
+            # Fetch the matched chunks in one query, keeping ranked order
+            chunks_by_id = Chunk.objects.select_related('document__material').in_bulk(
+                [chunk_id for chunk_id, score in results]
+            )
             
-            # Return chunks sorted by relevance score
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx < len(chunk_objects) and scores[0][i] > 0:  # Ensure positive similarity
-                    results.append((chunk_objects[idx], float(scores[0][i])))
+            # Keep only chunks that still exist
+            chunks = [
+                chunks_by_id[chunk_id]
+                for chunk_id, score in results
+                if chunk_id in chunks_by_id
+            ]
             
-            # Sort by score descending
-            results.sort(key=lambda x: x[1], reverse=True)
+            if rerank:
+                chunks = self.rerank_chunks(query_text, chunks)
             
-            # Return only the chunks
-            return [chunk for chunk, score in results]
+            chunks = chunks[:top_k]
+            retrieval_cache.cache_results(cache_key, [chunk.id for chunk in chunks])
+            return chunks
             
         except Exception as e:
             logger.exception(f"Error retrieving chunks: {str(e)}")
             return []
     
+    def _apply_section_preferences(self,
+                                   results: List[Tuple[int, float]],
+                                   sections: List[str] = None,
+                                   boost_sections: List[str] = None) -> List[Tuple[int, float]]:
+        """
+        Filter and boost ranked (chunk_id, score) results by the chunks' section paths.
+        
+        Returns:
+            List[Tuple[int, float]]: Remaining results, re-sorted by boosted score
+        """
+        chunk_ids = [chunk_id for chunk_id, score in results]
+        chunks = {
+            chunk_id: Chunk(metadata=metadata)
+            for chunk_id, metadata in Chunk.objects.filter(id__in=chunk_ids).values_list('id', 'metadata')
+        }
+        
+        preferred = []
+        for chunk_id, score in results:
+            chunk = chunks.get(chunk_id)
+            if chunk is None or (sections and not chunk.section_matches(sections)):
+                continue
+            if boost_sections and chunk.section_matches(boost_sections):
+                score *= 1 + settings.RAG_SECTION_BOOST
+            preferred.append((chunk_id, score))
+        
+        return sorted(preferred, key=lambda item: item[1], reverse=True)
+    
+    def rerank_chunks(self, query_text: str, chunks: List[Chunk], budget_ms: int = None) -> List[Chunk]:
+        """
+        Re-rank retrieved chunks with a cross-encoder, scoring (query, chunk)
+        pairs in batches until the latency budget runs out.
+        Chunks that were not scored in time keep their first-stage order
+        after the scored ones.
+        
+        Args:
+            query_text (str): The query text
+            chunks (List[Chunk]): Candidates in first-stage order
+            budget_ms (int, optional): Latency budget, defaults to settings.RAG_RERANK_BUDGET_MS
+            
+        Returns:
+            List[Chunk]: The candidates in re-ranked order
+        """
+        cross_encoder = get_cross_encoder()
+        if not cross_encoder or not chunks:
+            return chunks
+        
+        budget_seconds = (budget_ms or settings.RAG_RERANK_BUDGET_MS) / 1000.0
+        batch_size = settings.RAG_RERANK_BATCH_SIZE
+        start = time.perf_counter()
+        scores = []
+        
+        try:
+            for offset in range(0, len(chunks), batch_size):
+                if scores and time.perf_counter() - start >= budget_seconds:
+                    logger.info(f"Re-ranking budget exhausted after {len(scores)} of {len(chunks)} candidates")
+                    break
+                    
+                batch = chunks[offset:offset + batch_size]
+                batch_scores = cross_encoder.predict(
+                    [(query_text, chunk.text) for chunk in batch],
+                    batch_size=batch_size,
+                    show_progress_bar=False
+                )
+                scores.extend(float(score) for score in batch_scores)
+        except Exception as e:
+            logger.error(f"Error re-ranking chunks: {str(e)}")
+            return chunks
+        
+        scored = sorted(zip(chunks, scores), key=lambda pair: pair[1], reverse=True)
+        return [chunk for chunk, score in scored] + chunks[len(scores):]
+    
     def generate_draft_with_context(self, 
                                   assignment: Assignment,
-                                  relevant_chunks: List[Chunk] = None) -> Optional[AssignmentDraft]:
+                                  relevant_chunks: List[Chunk] = None,
+                                  sections: List[str] = None) -> Optional[AssignmentDraft]:
         """
         Generate a draft for an assignment using the Gemini API,
-        incorporating context from relevant chunks.
+        incorporating cited context from relevant chunks.
         
         Args:
             assignment (Assignment): The assignment to generate a draft for
             relevant_chunks (List[Chunk], optional): Pre-retrieved relevant chunks
                                                    If None, will retrieve chunks
+            sections (List[str], optional): Section headings to favour when retrieving
                                                    
         Returns:
             Optional[AssignmentDraft]: The created draft object or None if failed
@@ -166,15 +313,17 @@ class RAGSystem:
             if relevant_chunks is None:
                 # Use title + description as the query
                 query = f"{assignment_title} {assignment_description}"
-                relevant_chunks = self.retrieve_relevant_chunks(query, assignment)
+                relevant_chunks = self.retrieve_relevant_chunks(query, assignment, boost_sections=sections)
             
             if not relevant_chunks:
                 logger.warning(f"No relevant chunks found for assignment {assignment.id}")
             
-            # Construct context from chunks
+            # Construct context from chunks, numbered so the draft can cite them
             context_texts = []
-            for chunk in relevant_chunks:
-                context_texts.append(f"--- Start of Material Section ---\n{chunk.text}\n--- End of Section ---")
+            for number, chunk in enumerate(relevant_chunks, start=1):
+                context_texts.append(
+                    f"--- Source [{number}]: {chunk.get_citation()} ---\n{chunk.text}\n--- End of Source [{number}] ---"
+                )
             
             context = "\n\n".join(context_texts)
             
@@ -193,6 +342,7 @@ Based on the assignment prompt and the provided course materials, write a compre
 2. Uses information from the course materials to support your points
 3. Is well-organized with clear structure
 4. Includes examples or evidence from the course materials
+5. Cites the sources it draws on by their bracketed number, e.g. [2]
 
 DO NOT:
 - Make up information not found in the materials
@@ -265,39 +415,205 @@ RESPONSE:"""
         Returns:
             bool: Success or failure
         """
-        from .text_extractor import chunk_text
+        return self.process_materials_for_embedding([document]).get(document.id, False)
+    
+    def process_materials_for_embedding(self, documents: List[Document]) -> Dict[int, bool]:
+        """
+        Chunk several documents and bring their stored chunks up to date
+        incrementally, in one transaction.
         
-        try:
-            # Delete existing chunks if any
-            Chunk.objects.filter(document=document).delete()
+        New chunks are matched to existing ones by content hash. Unchanged
+        chunks keep their rows, embeddings and draft links and only have their
+        position and page/section metadata updated; only new chunks are
+        embedded, in batches across all documents; stale chunks are deleted.
+        
+        Args:
+            documents (List[Document]): The documents to process
             
-            # Chunk the document text
-            raw_text = document.raw_text
-            chunks = chunk_text(raw_text)
+        Returns:
+            Dict[int, bool]: Success or failure per document id
+        """
+        from .chunking import DocumentLayout, iter_chunk_spans
+        
+        results = {document.id: False for document in documents}
+        
+        try:
+            # Index the stored chunks of each document by content hash
+            existing = {document.id: {} for document in documents}
+            for chunk in Chunk.objects.filter(document__in=documents).only(
+                'id', 'document_id', 'course_id', 'content_hash', 'segment_row'
+            ).order_by('chunk_index'):
+                existing[chunk.document_id].setdefault(chunk.content_hash, deque()).append(chunk)
+            
+            segments = {
+                segment.document_id: segment
+                for segment in EmbeddingSegment.objects.filter(document__in=documents)
+            }
             
-            # Create chunks with embeddings
-            for i, chunk_text in enumerate(chunks):
-                # Create embedding
-                embedding = self.create_embedding(chunk_text)
+            # Chunk every document's text, reusing stored chunks (and their vectors) where the text is unchanged
+            planned = []  # (document, chunk, vector or None when it needs embedding)
+            stale_chunks = []
+            for document in documents:
+                reusable_vectors = None
+                segment = segments.get(document.id)
+                if segment is not None and segment.model_name == settings.EMBEDDING_MODEL_NAME:
+                    try:
+                        reusable_vectors = load_segment(segment)
+                    except Exception as e:
+                        logger.warning(f"Can't reuse embedding segment of document {document.id}: {str(e)}")
                 
-                if embedding is None:
-                    logger.warning(f"Failed to create embedding for chunk {i} of document {document.id}")
-                    continue
+                layout = DocumentLayout(document.metadata or {})
+                if (document.metadata or {}).get('streamed'):
+                    # Text files too large to store are chunked as they are read from the file
+                    from .tasks import get_material_file_path
+                    spans = iter_chunk_spans(iter_document_text(
+                        document.raw_text, document.metadata, get_material_file_path(document.material)
+                    ))
+                else:
+                    spans = iter_chunk_spans(document.raw_text) if document.raw_text and document.raw_text.strip() else []
+                for i, span in enumerate(spans):
+                    content_hash = embedding_cache.hash_text(span.text)
+                    matches = existing[document.id].get(content_hash)
+                    chunk = matches.popleft() if matches else None
+                    
+                    vector = None
+                    if chunk is None:
+                        chunk = Chunk(
+                            document=document,
+                            course_id=get_course_id_for_document(document),
+                            content_hash=content_hash
+                        )
+                    elif reusable_vectors is not None and chunk.segment_row is not None \
+                            and chunk.segment_row < len(reusable_vectors):
+                        vector = np.array(reusable_vectors[chunk.segment_row])
                     
-                # Convert numpy array to bytes for storage
-                embedding_bytes = embedding.astype(np.float32).tobytes()
+                    chunk.text = span.text
+                    chunk.chunk_index = i
+                    chunk.segment_row = i  # Row in the document's rewritten embedding segment
+                    chunk.metadata = layout.describe(span.start, span.end)
+                    planned.append((document, chunk, vector))
                 
-                # Create chunk
-                Chunk.objects.create(
-                    document=document,
-                    text=chunk_text,
-                    embedding_vector=embedding_bytes,
-                    chunk_index=i,
-                    metadata={"page_estimate": i // 2}  # Rough estimate
-                )
-            
-            return True
+                stale_chunks.extend(chunk for matches in existing[document.id].values() for chunk in matches)
+            
+            # Embed only the chunks without a reusable vector, batched across documents
+            to_embed = [row for row, (_, _, vector) in enumerate(planned) if vector is None]
+            if to_embed:
+                new_vectors = self.create_embeddings([planned[row][1].text for row in to_embed])
+                if new_vectors is None:
+                    logger.error(f"Failed to create embeddings for documents {list(results)}")
+                    return results
+                for row, vector in zip(to_embed, new_vectors):
+                    document, chunk, _ = planned[row]
+                    planned[row] = (document, chunk, vector)
+            
+            # Everything embedded above goes (back) into the course indices: new chunks, and kept
+            # chunks whose stored vectors couldn't be reused (legacy rows or another model)
+            is_new = [chunk.pk is None for _, chunk, _ in planned]
+            kept_chunks = [chunk for row, (_, chunk, _) in enumerate(planned) if not is_new[row]]
+            new_chunks = [chunk for row, (_, chunk, _) in enumerate(planned) if is_new[row]]
+            
+            # Drop stale chunks, and the old vectors of re-embedded ones, from the course indices
+            faiss_removals = {}
+            lexical_removals = {}
+            for chunk in stale_chunks:
+                faiss_removals.setdefault(chunk.course_id, []).append(chunk.id)
+                lexical_removals.setdefault(chunk.course_id, []).append(chunk.id)
+            for row in to_embed:
+                if not is_new[row]:
+                    chunk = planned[row][1]
+                    faiss_removals.setdefault(chunk.course_id, []).append(chunk.id)
+            
+            def apply_index_changes():
+                for course_id, chunk_ids in faiss_removals.items():
+                    CourseIndexStore(course_id).remove(chunk_ids)
+                for course_id, chunk_ids in lexical_removals.items():
+                    CourseLexicalIndex(course_id).remove(chunk_ids)
+                
+                rows_by_course = {}
+                for row in to_embed:
+                    rows_by_course.setdefault(planned[row][1].course_id, []).append(row)
+                
+                for course_id, rows in rows_by_course.items():
+                    store = CourseIndexStore(course_id)
+                    store.add([planned[row][1].id for row in rows], np.vstack([planned[row][2] for row in rows]))
+                    
+                    # Kept chunks' text is unchanged, so only new chunks need lexical indexing
+                    new_rows = [row for row in rows if is_new[row]]
+                    CourseLexicalIndex(course_id).add(
+                        [planned[row][1].id for row in new_rows],
+                        [planned[row][1].text for row in new_rows]
+                    )
+                    
+                    # Switch to an ANN index (or retrain) in the background once needed
+                    if store.needs_rebuild():
+                        from .tasks import build_course_index_task
+                        try:
+                            build_course_index_task.delay(course_id)
+                        except Exception as e:
+                            # The chunks are saved and searchable; the next update retries the trigger
+                            logger.error(f"Could not queue index rebuild for course {course_id}: {str(e)}")
+                
+                # Kept chunks may have moved or changed pages and sections without any vector changing
+                for course_id in {chunk.course_id for chunk in kept_chunks}:
+                    retrieval_cache.bump_course_index_version(course_id)
+            
+            def update_course_indices():
+                try:
+                    apply_index_changes()
+                except Exception as e:
+                    # The chunks are committed, so the documents stay processed; rebuild the indices from them
+                    logger.exception(f"Error updating course indices for documents {list(results)}: {str(e)}")
+                    from .tasks import build_course_index_task
+                    affected_courses = (
+                        {chunk.course_id for _, chunk, _ in planned} | set(faiss_removals) | set(lexical_removals)
+                    )
+                    for course_id in affected_courses:
+                        try:
+                            # Flags the index so the next update retries the rebuild if queueing fails
+                            CourseIndexStore(course_id).mark_stale()
+                            build_course_index_task.delay(course_id, rebuild_lexical=True)
+                        except Exception as e:
+                            logger.error(f"Could not queue index rebuild for course {course_id}: {str(e)}")
+            
+            saved_segments = []
+            committed = []
+            try:
+                with transaction.atomic():
+                    stale_ids = [chunk.id for chunk in stale_chunks]
+                    for start in range(0, len(stale_ids), 500):
+                        Chunk.objects.filter(id__in=stale_ids[start:start + 500]).delete()
+                    
+                    Chunk.objects.bulk_update(kept_chunks, ['text', 'chunk_index', 'segment_row', 'metadata'], batch_size=500)
+                    Chunk.objects.bulk_create(new_chunks, batch_size=500)
+                    
+                    # Rewrite each document's vectors as one contiguous segment in the new chunk order
+                    for document in documents:
+                        vectors = [vector for planned_document, _, vector in planned if planned_document.id == document.id]
+                        if vectors:
+                            saved_segments.append(
+                                save_document_embeddings(document, np.vstack(vectors), settings.EMBEDDING_MODEL_NAME)
+                            )
+                        else:
+                            EmbeddingSegment.objects.filter(document=document).delete()
+                    
+                    # Indices only change once the rows they point at are committed
+                    transaction.on_commit(lambda: committed.append(True))
+                    transaction.on_commit(update_course_indices)
+            except Exception:
+                if not committed:
+                    # Rolled back: the segment rows still name the previous files, so drop the new ones
+                    for segment in saved_segments:
+                        delete_segment_file(segment)
+                raise
+            
+            logger.info(
+                f"Updated chunks of documents {list(results)}: {len(kept_chunks)} kept, "
+                f"{len(new_chunks)} added, {len(stale_chunks)} removed, {len(to_embed)} embedded"
+            )
+            for document in documents:
+                results[document.id] = True
+            return results
             
         except Exception as e:
-            logger.exception(f"Error processing document {document.id}: {str(e)}")
-            return False
\ No newline at end of file
+            logger.exception(f"Error processing documents {list(results)}: {str(e)}")
+            return results
@@ -18,7 +18,7 @@ class DocumentAdmin(admin.ModelAdmin):
 @admin.register(Chunk)
 class ChunkAdmin(admin.ModelAdmin):
     list_display = ('id', 'document', 'chunk_index', 'text_preview')
-    list_filter = ('document__material__assignment__course',)
+    list_filter = ('course',)
     search_fields = ('text', 'document__material__title')
     
     def text_preview(self, obj):
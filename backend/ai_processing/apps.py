@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AiProcessingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_processing'
+
+    def ready(self):
+        # Keep the persistent FAISS indices in step with document deletes
+        from . import signals  # noqa: F401
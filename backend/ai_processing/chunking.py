@@ -0,0 +1,282 @@
+import re
+import zlib
+import logging
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Union
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Takes a batch of texts and returns the token count of each
+TokenCounter = Callable[[List[str]], List[int]]
+
+_paragraph_break_re = re.compile(r'\n\s*\n')
+# A sentence runs to terminal punctuation (plus closing quotes/brackets) followed by whitespace and
+# anything but a lowercase letter, so "e.g. the" doesn't end one, or to a full-width CJK terminator,
+# which needs no space after it, or to the end of the paragraph
+_sentence_re = re.compile(r'\S.*?(?:[.!?]+["\'”’)\]]*(?=\s+[^\sa-z])|[。！？]+["\'”’)\]」』）]*|$)', re.S)
+_word_re = re.compile(r'\S+')
+# Roughly one WordPiece token per short word, piece of a long word, or punctuation mark
+_estimate_re = re.compile(r'\w{1,6}|[^\w\s]')
+
+
+class ChunkSpan(NamedTuple):
+    """A chunk and the [start, end) character range it covers in the source text."""
+    text: str
+    start: int
+    end: int
+
+
+def estimate_token_counts(texts: List[str]) -> List[int]:
+    """Approximate token counts without loading a tokenizer."""
+    return [len(_estimate_re.findall(text)) for text in texts]
+
+
+def get_token_counter() -> TokenCounter:
+    """
+    Return a batch token counter backed by the embedding model's tokenizer,
+    or the estimate when the model isn't available.
+    """
+    from .model_registry import get_embedding_model
+
+    tokenizer = getattr(get_embedding_model(), 'tokenizer', None)
+    if tokenizer is None:
+        logger.warning("Embedding tokenizer unavailable, estimating chunk token counts")
+        return estimate_token_counts
+
+    def count_tokens(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        encoded = tokenizer(texts, add_special_tokens=False, verbose=False)['input_ids']
+        return [len(ids) for ids in encoded]
+
+    return count_tokens
+
+
+def _split_run(text: str, start: int, end: int, tokens: int, max_tokens: int,
+               count_tokens: TokenCounter) -> List[Tuple[int, int, int]]:
+    """
+    Split text[start:end], a run without spaces such as unspaced CJK text or
+    a long URL, into (start, end, tokens) character windows of at most
+    max_tokens tokens.
+    """
+    if tokens <= max_tokens or end - start <= 1:
+        return [(start, end, tokens)]
+
+    # Windows sized from the run's average characters per token, re-split if still too long
+    size = max((end - start) * max_tokens // tokens, 1)
+    bounds = [(window_start, min(window_start + size, end)) for window_start in range(start, end, size)]
+    runs = []
+    for (window_start, window_end), window_tokens in zip(bounds, count_tokens([text[s:e] for s, e in bounds])):
+        runs.extend(_split_run(text, window_start, window_end, window_tokens, max_tokens, count_tokens))
+    return runs
+
+
+def _split_oversize(sentence: str, start: int, max_tokens: int,
+                    count_tokens: TokenCounter) -> List[Tuple[str, int, int, int]]:
+    """
+    Split a sentence longer than max_tokens at word boundaries into (text,
+    tokens, start, end) pieces, splitting any single word that is itself
+    longer than max_tokens between characters.
+    """
+    words = list(_word_re.finditer(sentence))
+    runs = []
+    for word, tokens in zip(words, count_tokens([word.group() for word in words])):
+        runs.extend(_split_run(sentence, word.start(), word.end(), tokens, max_tokens, count_tokens))
+
+    pieces = []
+    first = None
+    last = None
+    current_tokens = 0
+
+    for run_start, run_end, tokens in runs:
+        if first is not None and current_tokens + tokens > max_tokens:
+            pieces.append((sentence[first:last], current_tokens, start + first, start + last))
+            first = None
+            current_tokens = 0
+        if first is None:
+            first = run_start
+        last = run_end
+        current_tokens += tokens
+
+    if first is not None:
+        pieces.append((sentence[first:last], current_tokens, start + first, start + last))
+    return pieces
+
+
+def _iter_paragraphs(parts: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """Yield (paragraph, offset) pairs, with offsets into the parts joined by blank lines."""
+    base = 0
+    for part in parts:
+        start = 0
+        for paragraph_break in [*_paragraph_break_re.finditer(part), None]:
+            end = paragraph_break.start() if paragraph_break else len(part)
+            segment = part[start:end]
+            paragraph = segment.strip()
+            if paragraph:
+                yield paragraph, base + start + len(segment) - len(segment.lstrip())
+            if paragraph_break:
+                start = paragraph_break.end()
+        base += len(part) + 2
+
+
+def iter_chunk_spans(text: Union[str, Iterable[str]],
+                     max_tokens: int = None,
+                     overlap_tokens: int = None,
+                     count_tokens: TokenCounter = None,
+                     anchor_every: int = None) -> Iterator[ChunkSpan]:
+    """
+    Lazily split text into chunks of at most max_tokens embedding-model tokens.
+
+    Chunks are packed from whole sentences and only break a sentence when it
+    alone exceeds max_tokens: at word boundaries, or between characters in
+    runs without spaces. Consecutive chunks share trailing sentences up
+    to overlap_tokens. Each sentence is counted once and enters and leaves
+    the window once, so the total work is linear in the input length.
+
+    Paragraphs whose content hash falls on an anchor always start a new chunk.
+    Because anchors depend only on a paragraph's own text, an edit shifts
+    chunk boundaries only up to the next anchor, and re-chunking an edited
+    document reproduces the unchanged chunks exactly.
+
+    Args:
+        text (str or Iterable[str]): Text, or parts of it such as pages as they
+            are extracted; parts are treated as separate paragraphs
+        max_tokens (int, optional): Chunk size limit, defaults to settings.CHUNK_MAX_TOKENS
+        overlap_tokens (int, optional): Overlap between chunks, defaults to settings.CHUNK_OVERLAP_TOKENS
+        count_tokens (TokenCounter, optional): Batch token counter, defaults to get_token_counter()
+        anchor_every (int, optional): Average paragraphs between anchors, defaults to
+            settings.CHUNK_ANCHOR_PARAGRAPHS; 0 disables anchoring
+
+    Yields:
+        ChunkSpan: Chunk text and its character range in the text (parts joined
+            by blank lines), in document order
+    """
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    count_tokens = count_tokens or get_token_counter()
+    anchor_every = settings.CHUNK_ANCHOR_PARAGRAPHS if anchor_every is None else anchor_every
+    parts = [text] if isinstance(text, str) else text
+
+    window = deque()  # (text, tokens, separator before it, start, end)
+    window_tokens = 0
+    has_unemitted = False
+
+    for paragraph, paragraph_start in _iter_paragraphs(parts):
+        if anchor_every and window and zlib.crc32(paragraph.encode('utf-8')) % anchor_every == 0:
+            if has_unemitted:
+                yield _span(window)
+                has_unemitted = False
+            window.clear()
+            window_tokens = 0
+
+        sentences = list(_sentence_re.finditer(paragraph))
+        units = []
+        for sentence, tokens in zip(sentences, count_tokens([sentence.group() for sentence in sentences])):
+            start = paragraph_start + sentence.start()
+            if tokens > max_tokens:
+                units.extend(_split_oversize(sentence.group(), start, max_tokens, count_tokens))
+            else:
+                units.append((sentence.group(), tokens, start, paragraph_start + sentence.end()))
+
+        for position, (unit, tokens, start, end) in enumerate(units):
+            if window and window_tokens + tokens > max_tokens:
+                if has_unemitted:
+                    yield _span(window)
+                    has_unemitted = False
+                # Keep the tail of the window as overlap, as long as the next unit still fits
+                while window and (window_tokens > overlap_tokens or window_tokens + tokens > max_tokens):
+                    window_tokens -= window.popleft()[1]
+
+            # Units keep the source's spacing: unspaced CJK sentences and split runs join without one
+            if position == 0:
+                separator = '\n\n'
+            else:
+                separator = ' ' if start > units[position - 1][3] else ''
+            window.append((unit, tokens, separator, start, end))
+            window_tokens += tokens
+            has_unemitted = True
+
+    if has_unemitted:
+        yield _span(window)
+
+
+def _span(window: deque) -> ChunkSpan:
+    text = window[0][0] + ''.join(separator + unit for unit, _, separator, _, _ in islice(window, 1, None))
+    return ChunkSpan(text, window[0][3], window[-1][4])
+
+
+def iter_chunks(text: Union[str, Iterable[str]],
+                max_tokens: int = None,
+                overlap_tokens: int = None,
+                count_tokens: TokenCounter = None,
+                anchor_every: int = None) -> Iterator[str]:
+    """Like iter_chunk_spans(), yielding only the chunk texts."""
+    for span in iter_chunk_spans(text, max_tokens, overlap_tokens, count_tokens, anchor_every):
+        yield span.text
+
+
+class DocumentLayout:
+    """
+    Page (or slide) and section structure of a document's text, from the
+    page_map and section_map its extractor recorded in Document.metadata.
+    """
+
+    def __init__(self, metadata: Dict):
+        page_map = metadata.get('page_map') or []
+        section_map = metadata.get('section_map') or []
+        self.page_unit = metadata.get('page_unit', 'page')
+        self._page_offsets = [offset for _, offset in page_map]
+        self._page_numbers = [number for number, _ in page_map]
+        self._section_offsets = [offset for offset, _ in section_map]
+        self._section_paths = [path for _, path in section_map]
+
+    def _page_at(self, offset: int) -> int:
+        return self._page_numbers[max(bisect_right(self._page_offsets, offset) - 1, 0)]
+
+    def describe(self, start: int, end: int) -> Dict:
+        """
+        Build Chunk.metadata for the text range [start, end).
+
+        Returns:
+            dict: char_start/char_end, page_start/page_end (or slide/slide_end
+                for presentations) and the section_path in force at the chunk's start
+        """
+        metadata = {'char_start': start, 'char_end': end}
+
+        if self._page_offsets:
+            first = self._page_at(start)
+            last = self._page_at(max(start, end - 1))
+            if self.page_unit == 'slide':
+                metadata['slide'] = first
+                if last != first:
+                    metadata['slide_end'] = last
+            else:
+                metadata['page_start'] = first
+                metadata['page_end'] = last
+
+        section = bisect_right(self._section_offsets, start) - 1
+        if section >= 0:
+            metadata['section_path'] = self._section_paths[section]
+
+        return metadata
+
+
+def chunk_text(text: str, max_tokens: int = None, overlap_tokens: int = None) -> List[str]:
+    """
+    Split a text into token-bounded, sentence-aligned chunks.
+
+    Args:
+        text (str): The text to chunk
+        max_tokens (int, optional): Chunk size limit in embedding-model tokens
+        overlap_tokens (int, optional): Tokens of overlap between consecutive chunks
+
+    Returns:
+        list: List of text chunks
+    """
+    if not text or not text.strip():
+        return []
+    return list(iter_chunks(text, max_tokens, overlap_tokens))
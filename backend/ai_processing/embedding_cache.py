@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import re
+import unicodedata
+from typing import Dict, List
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import EmbeddingCacheEntry
+
+logger = logging.getLogger(__name__)
+
+_whitespace_re = re.compile(r'\s+')
+
+LOOKUP_BATCH_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """Normalize chunk text so cosmetic whitespace/unicode differences share a cache key."""
+    return _whitespace_re.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def hash_text(text: str) -> str:
+    """Return the SHA-256 hex digest of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def get_cached_embeddings(model_name: str, text_hashes: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Look up cached embeddings and mark the hits as recently used.
+
+    Args:
+        model_name (str): Embedding model identifier
+        text_hashes (List[str]): Hashes from hash_text()
+
+    Returns:
+        Dict[str, numpy.ndarray]: Cached vectors keyed by text hash
+    """
+    if not text_hashes:
+        return {}
+
+    unique_hashes = list(set(text_hashes))
+    hits = {}
+    hit_ids = []
+
+    # Query in slices to stay under database parameter limits
+    for start in range(0, len(unique_hashes), LOOKUP_BATCH_SIZE):
+        entries = EmbeddingCacheEntry.objects.filter(
+            model_name=model_name,
+            text_hash__in=unique_hashes[start:start + LOOKUP_BATCH_SIZE]
+        ).values_list('id', 'text_hash', 'vector')
+
+        for entry_id, text_hash, vector in entries:
+            hits[text_hash] = np.frombuffer(vector, dtype=np.float32)
+            hit_ids.append(entry_id)
+
+    now = timezone.now()
+    for start in range(0, len(hit_ids), LOOKUP_BATCH_SIZE):
+        EmbeddingCacheEntry.objects.filter(
+            id__in=hit_ids[start:start + LOOKUP_BATCH_SIZE]
+        ).update(last_used_at=now)
+
+    return hits
+
+
+def store_embeddings(model_name: str, vectors_by_hash: Dict[str, np.ndarray]):
+    """
+    Add embeddings to the cache and evict least recently used entries
+    beyond settings.EMBEDDING_CACHE_MAX_ENTRIES.
+
+    Args:
+        model_name (str): Embedding model identifier
+        vectors_by_hash (Dict[str, numpy.ndarray]): Vectors keyed by text hash
+    """
+    if not vectors_by_hash:
+        return
+
+    now = timezone.now()
+    EmbeddingCacheEntry.objects.bulk_create(
+        [
+            EmbeddingCacheEntry(
+                model_name=model_name,
+                text_hash=text_hash,
+                dimension=len(vector),
+                vector=np.asarray(vector, dtype=np.float32).tobytes(),
+                last_used_at=now
+            )
+            for text_hash, vector in vectors_by_hash.items()
+        ],
+        batch_size=500,
+        ignore_conflicts=True  # Another worker may have cached the same text
+    )
+
+    evict_embeddings(settings.EMBEDDING_CACHE_MAX_ENTRIES)
+
+
+def evict_embeddings(max_entries: int) -> int:
+    """
+    Delete the least recently used cache entries above max_entries.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    excess = EmbeddingCacheEntry.objects.count() - max_entries
+    if excess <= 0:
+        return 0
+
+    stale_ids = list(
+        EmbeddingCacheEntry.objects.order_by('last_used_at').values_list('id', flat=True)[:excess]
+    )
+    deleted, _ = EmbeddingCacheEntry.objects.filter(id__in=stale_ids).delete()
+    logger.info(f"Evicted {deleted} embedding cache entries")
+    return deleted
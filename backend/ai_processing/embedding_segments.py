@@ -0,0 +1,100 @@
+import os
+import logging
+import secrets
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import Document, EmbeddingSegment
+
+logger = logging.getLogger(__name__)
+
+
+def get_segment_path(segment: EmbeddingSegment) -> str:
+    """Return the absolute path of a segment's .npy file."""
+    return os.path.join(str(settings.EMBEDDING_SEGMENT_PATH), segment.file_name)
+
+
+def save_document_embeddings(document: Document,
+                             embeddings: np.ndarray,
+                             model_name: str,
+                             normalized: bool = True) -> EmbeddingSegment:
+    """
+    Write a document's chunk embeddings as one contiguous float32 .npy file
+    and record its layout in an EmbeddingSegment.
+
+    Row i of the matrix belongs to the chunk whose segment_row is i.
+
+    Every save writes a new file and points the record at it; the file it
+    replaces is deleted once the transaction commits. Readers keep seeing
+    the old file until then, and after a rollback the caller should delete
+    the returned segment's file, which nothing references.
+
+    Args:
+        document (Document): The document the embeddings belong to
+        embeddings (numpy.ndarray): Matrix of shape (chunk_count, dimension)
+        model_name (str): Embedding model that produced the vectors
+        normalized (bool): Whether the rows are L2-normalized
+
+    Returns:
+        EmbeddingSegment: The created or updated segment record
+    """
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    file_name = f"document_{document.id}_{secrets.token_hex(6)}.npy"
+    path = os.path.join(str(settings.EMBEDDING_SEGMENT_PATH), file_name)
+
+    # Write to a temporary file and rename it so a partial file never has the final name
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, matrix)
+    os.replace(tmp_path, path)
+
+    try:
+        previous = EmbeddingSegment.objects.filter(document=document).first()
+        if previous is not None and previous.file_name != file_name:
+            transaction.on_commit(lambda: delete_segment_file(previous))
+
+        segment, _ = EmbeddingSegment.objects.update_or_create(
+            document=document,
+            defaults={
+                'file_name': file_name,
+                'model_name': model_name,
+                'dimension': matrix.shape[1],
+                'row_count': matrix.shape[0],
+                'dtype': 'float32',
+                'normalized': normalized,
+            }
+        )
+    except Exception:
+        os.remove(path)
+        raise
+    return segment
+
+
+def load_segment(segment: EmbeddingSegment) -> np.ndarray:
+    """
+    Memory-map a segment's embedding matrix.
+
+    Args:
+        segment (EmbeddingSegment): The segment to load
+
+    Returns:
+        numpy.ndarray: Read-only matrix of shape (row_count, dimension)
+    """
+    matrix = np.load(get_segment_path(segment), mmap_mode='r')
+    if matrix.shape != (segment.row_count, segment.dimension):
+        raise ValueError(
+            f"Embedding segment for document {segment.document_id} has shape {matrix.shape}, "
+            f"expected {(segment.row_count, segment.dimension)}"
+        )
+    return matrix
+
+
+def delete_segment_file(segment: EmbeddingSegment):
+    """Remove a segment's .npy file from disk if it exists."""
+    try:
+        os.remove(get_segment_path(segment))
+    except FileNotFoundError:
+        pass
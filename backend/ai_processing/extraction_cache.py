@@ -0,0 +1,126 @@
+import hashlib
+import logging
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ExtractionCacheEntry
+from .text_extractor import FileSource, TextExtractor, get_extractor_version
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(source: FileSource) -> str:
+    """
+    Return the SHA-256 hex digest of a file's bytes, reading paths in blocks.
+
+    Args:
+        source (FileSource): File path or raw file content
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_cached_extraction(content_hash: str) -> Optional[Tuple[str, Dict, int]]:
+    """
+    Look up a cached extraction for the current extractor version and mark it as recently used.
+
+    Returns:
+        tuple: (extracted_text, metadata, page_count) like TextExtractor.extract_text, or None
+    """
+    entry = ExtractionCacheEntry.objects.filter(
+        content_hash=content_hash,
+        extractor_version=get_extractor_version()
+    ).first()
+    if entry is None:
+        return None
+
+    ExtractionCacheEntry.objects.filter(pk=entry.pk).update(last_used_at=timezone.now())
+    return entry.text, dict(entry.metadata, page_map=entry.page_map), entry.page_count
+
+
+def store_extraction(content_hash: str, extracted_text: str, metadata: Dict, page_count: int):
+    """
+    Cache an extraction result and evict least recently used entries beyond
+    settings.EXTRACTION_CACHE_MAX_ENTRIES.
+    """
+    metadata = dict(metadata)
+    page_map = metadata.pop('page_map', [])
+
+    ExtractionCacheEntry.objects.bulk_create(
+        [ExtractionCacheEntry(
+            content_hash=content_hash,
+            extractor_version=get_extractor_version(),
+            text=extracted_text,
+            page_count=page_count,
+            page_map=page_map,
+            metadata=metadata
+        )],
+        ignore_conflicts=True  # Another worker may have extracted the same file
+    )
+
+    evict_extractions(settings.EXTRACTION_CACHE_MAX_ENTRIES)
+
+
+def evict_extractions(max_entries: int) -> int:
+    """
+    Delete the least recently used cache entries above max_entries.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    excess = ExtractionCacheEntry.objects.count() - max_entries
+    if excess <= 0:
+        return 0
+
+    stale_ids = list(
+        ExtractionCacheEntry.objects.order_by('last_used_at').values_list('id', flat=True)[:excess]
+    )
+    deleted, _ = ExtractionCacheEntry.objects.filter(id__in=stale_ids).delete()
+    logger.info(f"Evicted {deleted} extraction cache entries")
+    return deleted
+
+
+def extract_text_cached(source: FileSource, file_name: str = None, content_hash: str = None) -> Tuple[str, Dict, int]:
+    """
+    Extract text from a file, reusing the cached result for byte-identical
+    files instead of running TextExtractor at all.
+
+    Args:
+        source (FileSource): File path or raw file content
+        file_name (str, optional): Original filename with extension
+        content_hash (str, optional): SHA-256 of the file if already known, e.g. its blob key
+
+    Returns:
+        tuple: (extracted_text, metadata, page_count); metadata includes the file's content_hash
+    """
+    content_hash = content_hash or hash_file(source)
+
+    if settings.EXTRACTION_CACHE_ENABLED:
+        cached = get_cached_extraction(content_hash)
+        if cached is not None:
+            logger.info(f"Extraction cache hit for {file_name or 'file'} ({content_hash[:12]})")
+            extracted_text, metadata, page_count = cached
+            metadata['content_hash'] = content_hash
+            return extracted_text, metadata, page_count
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        extracted_text, metadata, page_count = TextExtractor.extract_text(source, file_name)
+    else:
+        extracted_text, metadata, page_count = TextExtractor.extract_text_from_file(source, file_name)
+
+    # Failed extractions aren't cached so they are retried on the next sync
+    if settings.EXTRACTION_CACHE_ENABLED and extracted_text and 'extraction_error' not in metadata:
+        store_extraction(content_hash, extracted_text, metadata, page_count)
+
+    metadata['content_hash'] = content_hash
+    return extracted_text, metadata, page_count
@@ -0,0 +1,542 @@
+"""
+File format detection and parsers for the formats without a third-party
+extractor: legacy Word (.doc) and PowerPoint (.ppt) binaries, RTF, HTML and
+EPUB.
+
+Formats are identified from their leading bytes (and, for ZIP and OLE2
+containers, their member names) rather than the file name, so Drive files
+without extensions, or with the wrong one, reach the right parser on the
+first try.
+"""
+
+import codecs
+import re
+import struct
+import zipfile
+import posixpath
+import logging
+from html.parser import HTMLParser
+from typing import BinaryIO, List, Optional, Tuple
+from xml.etree import ElementTree
+
+# OLE2 compound files (legacy Office)
+try:
+    import olefile
+except ImportError:
+    olefile = None
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes read for sniffing
+SNIFF_BYTES = 2048
+
+OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ZIP_SIGNATURE = b'PK\x03\x04'
+EPUB_MIMETYPE_ENTRY = b'mimetypeapplication/epub+zip'
+TEXT_BOMS = (b'\xef\xbb\xbf', b'\xff\xfe', b'\xfe\xff')
+
+# Extensions trusted for content without a recognizable signature
+TEXT_EXTENSIONS = frozenset(['.txt', '.md', '.csv', '.tsv', '.json', '.xml', '.tex'])
+HTML_EXTENSIONS = frozenset(['.html', '.htm', '.xhtml'])
+
+# A paragraph of extracted text and its heading level, or None for body text
+Paragraph = Tuple[str, Optional[int]]
+
+# BOM-less UTF-16: share of code units with a NUL high byte, and of printable decoded characters
+MIN_UTF16_NUL_RATIO = 0.3
+MIN_UTF16_PRINTABLE_RATIO = 0.9
+
+
+def detect_utf16(head: bytes) -> Optional[str]:
+    """
+    Recognize UTF-16 text without a BOM from its NUL bytes. Text mostly below
+    U+0100 has a NUL in every other byte: the odd ones for little-endian,
+    the even ones for big-endian.
+
+    Args:
+        head (bytes): Leading bytes of the file
+
+    Returns:
+        str: 'utf-16-le' or 'utf-16-be', or None if the bytes don't look like UTF-16 text
+    """
+    units = len(head) // 2
+    if not units:
+        return None
+    even_nuls = head[0:units * 2:2].count(0)
+    odd_nuls = head[1:units * 2:2].count(0)
+
+    if odd_nuls >= units * MIN_UTF16_NUL_RATIO and even_nuls <= odd_nuls // 20:
+        encoding = 'utf-16-le'
+    elif even_nuls >= units * MIN_UTF16_NUL_RATIO and odd_nuls <= even_nuls // 20:
+        encoding = 'utf-16-be'
+    else:
+        return None
+
+    # Binary formats can have NUL-patterned runs too; text decodes to printable characters
+    try:
+        text = codecs.getincrementaldecoder(encoding)().decode(head[:units * 2], final=False)
+    except UnicodeDecodeError:
+        return None
+    printable = sum(1 for char in text if char.isprintable() or char.isspace())
+    return encoding if text and printable >= len(text) * MIN_UTF16_PRINTABLE_RATIO else None
+
+
+def sniff_file_type(stream: BinaryIO, file_name: str = None) -> str:
+    """
+    Identify a file's format from its content.
+
+    Args:
+        stream (BinaryIO): Seekable binary stream positioned anywhere
+        file_name (str, optional): Original filename, consulted only for
+            text content without a signature
+
+    Returns:
+        str: The format as an extension: .pdf, .docx, .pptx, .xlsx, .epub, .zip,
+            .doc, .ppt, .xls, .rtf, .html, the text extension of file_name or
+            .txt for other text, and .bin for unrecognized binary content
+    """
+    stream.seek(0)
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    extension = posixpath.splitext((file_name or '').lower())[1]
+
+    # PDF readers accept the header anywhere in the first kilobyte
+    if b'%PDF-' in head[:1024]:
+        return '.pdf'
+    if head.startswith(ZIP_SIGNATURE):
+        return _sniff_zip(stream, head)
+    if head.startswith(OLE2_SIGNATURE):
+        return _sniff_ole(stream, extension)
+
+    text_head = head
+    for bom in TEXT_BOMS:
+        if head.startswith(bom):
+            text_head = head[len(bom):]
+            break
+    else:
+        if b'\x00' in head and detect_utf16(head) is None:
+            return '.bin'
+
+    if text_head.lstrip().startswith(b'{\\rtf'):
+        return '.rtf'
+    lowered = text_head.lstrip().lower()
+    if (lowered.startswith(b'<!doctype html') or lowered.startswith(b'<html')
+            or (lowered.startswith(b'<?xml') and b'<html' in lowered)):
+        return '.html'
+    if extension in HTML_EXTENSIONS:
+        return '.html'
+    return extension if extension in TEXT_EXTENSIONS else '.txt'
+
+
+def _sniff_zip(stream: BinaryIO, head: bytes) -> str:
+    # EPUB requires an uncompressed 'mimetype' first entry, so it shows in the local header
+    if head[30:30 + len(EPUB_MIMETYPE_ENTRY)] == EPUB_MIMETYPE_ENTRY:
+        return '.epub'
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            names = set(archive.namelist())
+    except zipfile.BadZipFile:
+        return '.bin'
+    finally:
+        stream.seek(0)
+
+    if 'word/document.xml' in names:
+        return '.docx'
+    if 'ppt/presentation.xml' in names:
+        return '.pptx'
+    if 'xl/workbook.xml' in names:
+        return '.xlsx'
+    if 'META-INF/container.xml' in names:
+        return '.epub'
+    return '.zip'
+
+
+def _sniff_ole(stream: BinaryIO, extension: str) -> str:
+    if olefile is None:
+        # Without olefile the streams can't be listed, and can't be parsed either
+        return extension if extension in ('.doc', '.ppt', '.xls') else '.doc'
+    try:
+        with olefile.OleFileIO(stream) as ole:
+            if ole.exists('WordDocument'):
+                return '.doc'
+            if ole.exists('PowerPoint Document'):
+                return '.ppt'
+            if ole.exists('Workbook') or ole.exists('Book'):
+                return '.xls'
+    except Exception as e:
+        logger.warning(f"Could not read OLE2 container: {str(e)}")
+    finally:
+        stream.seek(0)
+    return '.bin'
+
+
+# Word 97-2003 binary (.doc) ---------------------------------------------------
+
+# FibBase flags and FIB offsets (MS-DOC 2.5)
+FIB_FLAGS_OFFSET = 0x0A
+FIB_ENCRYPTED = 0x0100
+FIB_WHICH_TABLE_STREAM = 0x0200
+FIB_CCP_TEXT_OFFSET = 0x4C
+FIB_FC_CLX_OFFSET = 0x1A2
+PIECE_COMPRESSED = 0x40000000
+
+_doc_field_re = re.compile(r'\x13[^\x13\x14\x15]*(?:\x14|(?=\x15))')
+_doc_control_chars = str.maketrans({
+    '\x07': '\t',  # Table cell mark
+    '\x0b': '\n',  # Line break
+    '\x0c': '\n',  # Page or section break
+    '\x1e': '-',  # Non-breaking hyphen
+    '\x1f': None,  # Optional hyphen
+    '\x01': None,  # Picture anchor
+    '\x08': None,  # Drawn object anchor
+    '\x15': None,  # Field end
+})
+
+
+def read_doc_paragraphs(word_document: bytes, table: bytes) -> List[str]:
+    """
+    Read the main document text of a Word 97-2003 file through its piece table.
+
+    Args:
+        word_document (bytes): The 'WordDocument' stream
+        table (bytes): The '0Table' or '1Table' stream the FIB points to
+
+    Returns:
+        List[str]: Paragraphs, with field codes removed and only field results kept
+    """
+    ccp_text = struct.unpack_from('<i', word_document, FIB_CCP_TEXT_OFFSET)[0]
+    fc_clx, lcb_clx = struct.unpack_from('<II', word_document, FIB_FC_CLX_OFFSET)
+    clx = table[fc_clx:fc_clx + lcb_clx]
+
+    # Skip the formatting (Prc) entries in front of the piece table (Pcdt)
+    position = 0
+    while position < len(clx) and clx[position] == 0x01:
+        position += 3 + struct.unpack_from('<H', clx, position + 1)[0]
+    if position >= len(clx) or clx[position] != 0x02:
+        raise ValueError("Piece table not found")
+
+    lcb = struct.unpack_from('<I', clx, position + 1)[0]
+    plc = clx[position + 5:position + 5 + lcb]
+    piece_count = (len(plc) - 4) // 12
+    cps = struct.unpack_from(f'<{piece_count + 1}i', plc)
+
+    pieces = []
+    for index in range(piece_count):
+        start, end = cps[index], min(cps[index + 1], ccp_text)
+        if start >= end:
+            break
+        fc = struct.unpack_from('<I', plc, 4 * (piece_count + 1) + 8 * index + 2)[0]
+        if fc & PIECE_COMPRESSED:
+            offset = (fc & ~PIECE_COMPRESSED) // 2
+            pieces.append(word_document[offset:offset + end - start].decode('cp1252', errors='replace'))
+        else:
+            pieces.append(word_document[fc:fc + 2 * (end - start)].decode('utf-16-le', errors='replace'))
+
+    text = ''.join(pieces)
+    # Drop field instructions (\x13 code \x14 result \x15), innermost first, keeping the results
+    while '\x13' in text:
+        text, replaced = _doc_field_re.subn('', text)
+        if not replaced:
+            text = text.replace('\x13', '')
+    return [paragraph.translate(_doc_control_chars) for paragraph in text.split('\r')]
+
+
+# PowerPoint 97-2003 binary (.ppt) ---------------------------------------------
+
+# Record types (MS-PPT 2.13.24)
+PPT_SLIDE = 0x03EE
+PPT_NOTES = 0x03F0
+PPT_SLIDE_PERSIST_ATOM = 0x03F3
+PPT_MAIN_MASTER = 0x03F8
+PPT_SLIDE_LIST_WITH_TEXT = 0x0FF0
+PPT_TEXT_CHARS_ATOM = 0x0FA0
+PPT_TEXT_BYTES_ATOM = 0x0FA8
+PPT_CONTAINER_VERSION = 0xF
+
+
+def read_ppt_slides(document: bytes) -> List[str]:
+    """
+    Read slide text from the 'PowerPoint Document' stream of a PowerPoint 97-2003 file.
+
+    Placeholder text (titles, body) is kept per slide in the document's
+    slide list; text boxes live in each slide's own drawing. Slide
+    containers are matched to slide list entries in stream order, which is
+    presentation order for files written by PowerPoint.
+
+    Args:
+        document (bytes): The 'PowerPoint Document' stream
+
+    Returns:
+        List[str]: Text of each slide, in presentation order
+    """
+    listed: List[List[str]] = []
+    drawn: List[List[str]] = []
+
+    def walk(start: int, end: int, target: Optional[List[List[str]]]):
+        while start + 8 <= end:
+            version_instance, record_type, length = struct.unpack_from('<HHI', document, start)
+            body, start = start + 8, min(start + 8 + length, end)
+
+            if record_type == PPT_SLIDE_LIST_WITH_TEXT:
+                # Instance 0 lists slides; 1 and 2 list masters and notes
+                if version_instance >> 4 == 0:
+                    walk(body, start, listed)
+            elif record_type == PPT_SLIDE:
+                drawn.append([])
+                walk(body, start, drawn)
+            elif record_type in (PPT_NOTES, PPT_MAIN_MASTER):
+                continue
+            elif record_type == PPT_SLIDE_PERSIST_ATOM and target is listed:
+                listed.append([])
+            elif record_type in (PPT_TEXT_CHARS_ATOM, PPT_TEXT_BYTES_ATOM) and target:
+                encoding = 'utf-16-le' if record_type == PPT_TEXT_CHARS_ATOM else 'latin-1'
+                text = document[body:start].decode(encoding, errors='replace')
+                target[-1].append(text.replace('\r', '\n').replace('\x0b', '\n'))
+            elif version_instance & 0xF == PPT_CONTAINER_VERSION:
+                walk(body, start, target)
+
+    walk(0, len(document), None)
+
+    slides = []
+    for index in range(max(len(listed), len(drawn))):
+        texts = (listed[index] if index < len(listed) else []) + (drawn[index] if index < len(drawn) else [])
+        slides.append("\n".join(text for text in texts if text.strip()))
+    return slides
+
+
+# RTF ----------------------------------------------------------------------------
+
+_rtf_token_re = re.compile(
+    r"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?"  # Control word with optional parameter
+    r"|\\'([0-9a-fA-F]{2})"  # Hex-escaped byte
+    r"|\\([^a-zA-Z])"  # Control symbol
+    r"|([{}])"
+    r"|[\r\n]+"  # Raw line breaks carry no meaning
+    r"|([^\\{}\r\n]+)",
+    re.S
+)
+
+# Groups holding no document text
+RTF_SKIPPED_DESTINATIONS = frozenset("""
+fonttbl colortbl stylesheet info pict object objdata header headerl headerr headerf footer footerl
+footerr footerf listtable listoverridetable listtext pntext pntxta pntxtb revtbl rsidtbl generator
+themedata colorschememapping latentstyles datastore xmlnstbl fldinst filetbl bkmkstart bkmkend
+nonshppict shpinst userprops docvar
+""".split())
+
+RTF_SPECIAL_WORDS = {
+    'par': '\n\n', 'sect': '\n\n', 'page': '\n\n', 'line': '\n', 'row': '\n', 'cell': '\t', 'tab': '\t',
+    'emdash': '\u2014', 'endash': '\u2013', 'bullet': '\u2022', 'emspace': ' ', 'enspace': ' ',
+    'lquote': '\u2018', 'rquote': '\u2019', 'ldblquote': '\u201c', 'rdblquote': '\u201d',
+}
+RTF_SPECIAL_SYMBOLS = {'~': '\xa0', '_': '-', '-': '', '\\': '\\', '{': '{', '}': '}', '\n': '\n\n', '\r': '\n\n'}
+
+
+def rtf_to_text(rtf: str) -> str:
+    """
+    Convert an RTF document to plain text, with paragraphs separated by blank lines.
+
+    Args:
+        rtf (str): RTF source, decoded as latin-1 so escaped bytes survive
+
+    Returns:
+        str: Document text without formatting, tables of fonts/styles or embedded objects
+    """
+    output = []
+    pending = bytearray()  # Consecutive \'hh bytes, decoded together for multi-byte code pages
+    stack = []
+    ignorable = False
+    unicode_skip = 1  # Fallback characters following each \\uN
+    skip = 0
+    encoding = 'cp1252'
+
+    def flush():
+        if pending:
+            output.append(pending.decode(encoding, errors='replace'))
+            pending.clear()
+
+    for match in _rtf_token_re.finditer(rtf):
+        word, argument, hex_byte, symbol, brace, text = match.groups()
+
+        if hex_byte:
+            if skip:
+                skip -= 1
+            elif not ignorable:
+                pending.append(int(hex_byte, 16))
+            continue
+        flush()
+
+        if brace:
+            skip = 0
+            if brace == '{':
+                stack.append((unicode_skip, ignorable))
+            elif stack:
+                unicode_skip, ignorable = stack.pop()
+        elif symbol:
+            skip = 0
+            if symbol == '*':
+                # Marks an optional destination that readers which don't know it must skip
+                ignorable = True
+            elif not ignorable:
+                output.append(RTF_SPECIAL_SYMBOLS.get(symbol, ''))
+        elif word:
+            skip = 0
+            if word in RTF_SKIPPED_DESTINATIONS:
+                ignorable = True
+            elif word == 'ansicpg' and argument:
+                try:
+                    encoding = codecs.lookup(f'cp{argument}').name
+                except LookupError:
+                    pass
+            elif ignorable:
+                continue
+            elif word == 'uc' and argument:
+                unicode_skip = int(argument)
+            elif word == 'u' and argument:
+                code = int(argument)
+                output.append(chr(code + 0x10000 if code < 0 else code))
+                skip = unicode_skip
+            elif word in RTF_SPECIAL_WORDS:
+                output.append(RTF_SPECIAL_WORDS[word])
+        elif text:
+            if skip:
+                dropped = min(skip, len(text))
+                text, skip = text[dropped:], skip - dropped
+            if not ignorable:
+                output.append(text)
+    flush()
+
+    text = ''.join(output)
+    return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+
+# HTML / EPUB --------------------------------------------------------------------
+
+HTML_BLOCK_TAGS = frozenset("""
+address article aside blockquote body br dd div dl dt figcaption figure footer form h1 h2 h3 h4 h5 h6
+header hr li main nav ol p pre section table td th tr ul
+""".split())
+HTML_SKIPPED_TAGS = frozenset(['script', 'style', 'noscript', 'template', 'head', 'svg'])
+_whitespace_re = re.compile(r'\s+')
+
+
+class _HtmlTextParser(HTMLParser):
+    """Collects the visible text of an HTML document as paragraphs split at block elements."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: List[Paragraph] = []
+        self.title = ''
+        self._buffer = []
+        self._heading_level = None
+        self._skip_depth = 0
+        self._in_title = False
+        self._in_pre = 0
+
+    def _flush(self):
+        raw = ''.join(self._buffer)
+        text = raw.strip('\n') if self._in_pre else _whitespace_re.sub(' ', raw).strip()
+        if text:
+            self.paragraphs.append((text, self._heading_level))
+        self._buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'title':
+            self._in_title = True
+        if tag in HTML_SKIPPED_TAGS:
+            self._skip_depth += 1
+            return
+        if tag in HTML_BLOCK_TAGS:
+            self._flush()
+            self._heading_level = None
+            if len(tag) == 2 and tag[0] == 'h' and tag[1].isdigit():
+                self._heading_level = int(tag[1])
+        if tag == 'pre':
+            self._in_pre += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        if tag in HTML_SKIPPED_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+            return
+        if tag in HTML_BLOCK_TAGS:
+            self._flush()
+            self._heading_level = None
+        if tag == 'pre':
+            self._in_pre = max(self._in_pre - 1, 0)
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self._buffer.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def html_to_paragraphs(html: str) -> Tuple[List[Paragraph], str]:
+    """
+    Extract the visible text of an HTML document.
+
+    Args:
+        html (str): HTML source
+
+    Returns:
+        tuple: (paragraphs, title) where paragraphs are (text, heading level or None) pairs
+    """
+    parser = _HtmlTextParser()
+    parser.feed(html)
+    parser.close()
+    return parser.paragraphs, _whitespace_re.sub(' ', parser.title).strip()
+
+
+def _xml_local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def read_epub(stream: BinaryIO) -> Tuple[List[Tuple[str, bytes]], dict]:
+    """
+    Read the content documents of an EPUB in reading (spine) order.
+
+    Args:
+        stream (BinaryIO): EPUB file stream
+
+    Returns:
+        tuple: ([(href, XHTML bytes)], metadata with title and author)
+    """
+    with zipfile.ZipFile(stream) as archive:
+        container = ElementTree.fromstring(archive.read('META-INF/container.xml'))
+        rootfile = next(element for element in container.iter() if _xml_local_name(element.tag) == 'rootfile')
+        package_path = rootfile.get('full-path')
+        package = ElementTree.fromstring(archive.read(package_path))
+        base = posixpath.dirname(package_path)
+
+        metadata = {'title': '', 'author': ''}
+        manifest = {}
+        spine = []
+        for element in package.iter():
+            name = _xml_local_name(element.tag)
+            if name == 'title' and not metadata['title']:
+                metadata['title'] = (element.text or '').strip()
+            elif name == 'creator' and not metadata['author']:
+                metadata['author'] = (element.text or '').strip()
+            elif name == 'item':
+                manifest[element.get('id')] = (element.get('href'), element.get('media-type', ''))
+            elif name == 'itemref' and element.get('linear', 'yes') != 'no':
+                spine.append(element.get('idref'))
+
+        documents = []
+        for idref in spine:
+            href, media_type = manifest.get(idref, (None, ''))
+            if not href or 'html' not in media_type:
+                continue
+            path = posixpath.normpath(posixpath.join(base, href))
+            try:
+                documents.append((href, archive.read(path)))
+            except KeyError:
+                logger.warning(f"EPUB spine item {href} is missing from the archive")
+
+    return documents, metadata
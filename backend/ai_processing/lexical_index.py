@@ -0,0 +1,203 @@
+import os
+import re
+import math
+import logging
+import sqlite3
+from collections import Counter
+from contextlib import closing
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Keep dotted/hyphenated tokens together so "theorem 3.2" or "x-ray" match exactly
+_token_re = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have how i if in into is it its
+of on or our so such than that the their then there these they this to was we were what when
+where which while who why will with you your
+""".split())
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into index terms, dropping stopwords."""
+    return [token for token in _token_re.findall(text.lower()) if token not in STOPWORDS]
+
+
+class CourseLexicalIndex:
+    """
+    On-disk BM25 inverted index over the chunk text of a single course.
+
+    Stored as a small SQLite database under settings.LEXICAL_INDEX_PATH
+    (`course_<id>.sqlite3`) holding a postings table (term, chunk_id, tf)
+    and per-chunk lengths, so chunks can be added and removed incrementally
+    alongside the FAISS index.
+    """
+
+    def __init__(self, course_id: int, base_path=None):
+        self.course_id = course_id
+        self.base_path = str(base_path or settings.LEXICAL_INDEX_PATH)
+        self.path = os.path.join(self.base_path, f"course_{course_id}.sqlite3")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.base_path, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS docs (
+                chunk_id INTEGER PRIMARY KEY,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id);
+        """)
+        return connection
+
+    @staticmethod
+    def _delete(connection: sqlite3.Connection, ids: List[Tuple[int]]):
+        connection.executemany("DELETE FROM postings WHERE chunk_id = ?", ids)
+        connection.executemany("DELETE FROM docs WHERE chunk_id = ?", ids)
+
+    def add(self, chunk_ids: Sequence[int], texts: Sequence[str]):
+        """
+        Index chunk texts, replacing any existing entries for the same chunks.
+
+        Args:
+            chunk_ids (Sequence[int]): Chunk primary keys
+            texts (Sequence[str]): Chunk texts, in the same order
+        """
+        if not len(chunk_ids):
+            return
+
+        if not self.exists():
+            # A new or lost index must cover the whole course, not just this batch
+            self.rebuild()
+
+        self._insert(chunk_ids, texts)
+
+    def _insert(self, chunk_ids: Sequence[int], texts: Sequence[str]):
+        docs = []
+        postings = []
+        for chunk_id, text in zip(chunk_ids, texts):
+            terms = tokenize(text)
+            docs.append((chunk_id, len(terms)))
+            postings.extend((term, chunk_id, tf) for term, tf in Counter(terms).items())
+
+        with closing(self._connect()) as connection, connection:
+            self._delete(connection, [(chunk_id,) for chunk_id in chunk_ids])
+            connection.executemany("INSERT INTO docs (chunk_id, length) VALUES (?, ?)", docs)
+            connection.executemany("INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)", postings)
+
+        logger.debug(f"Indexed {len(docs)} chunks in lexical index for course {self.course_id}")
+
+    def remove(self, chunk_ids: Iterable[int]):
+        """
+        Remove chunks from the lexical index.
+
+        Args:
+            chunk_ids (Iterable[int]): Chunk primary keys to remove
+        """
+        ids = [(chunk_id,) for chunk_id in chunk_ids]
+        if not ids or not self.exists():
+            return
+
+        with closing(self._connect()) as connection, connection:
+            self._delete(connection, ids)
+
+    def rebuild(self) -> int:
+        """
+        Rebuild the lexical index from the course's Chunk rows.
+
+        Returns:
+            int: Number of indexed chunks
+        """
+        from .models import Chunk
+
+        if self.exists():
+            os.remove(self.path)
+
+        chunk_ids = []
+        texts = []
+        for chunk_id, text in Chunk.objects.filter(course_id=self.course_id).values_list('id', 'text').iterator():
+            chunk_ids.append(chunk_id)
+            texts.append(text)
+
+        if chunk_ids:
+            self._insert(chunk_ids, texts)
+        logger.info(f"Rebuilt lexical index for course {self.course_id} with {len(chunk_ids)} chunks")
+        return len(chunk_ids)
+
+    def search(self, query_text: str, top_k: int = 50) -> List[Tuple[int, float]]:
+        """
+        Rank chunks against a query with BM25.
+
+        Args:
+            query_text (str): Free-text query
+            top_k (int): Number of results to return
+
+        Returns:
+            List[Tuple[int, float]]: (chunk_id, score) pairs sorted by score descending
+        """
+        terms = list(set(tokenize(query_text)))
+        if not terms or not self.exists():
+            return []
+
+        placeholders = ",".join("?" * len(terms))
+        with closing(self._connect()) as connection:
+            doc_count, avg_length = connection.execute(
+                "SELECT COUNT(*), AVG(length) FROM docs"
+            ).fetchone()
+            if not doc_count:
+                return []
+
+            document_frequency = dict(connection.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term",
+                terms
+            ))
+            rows = connection.execute(
+                f"SELECT p.chunk_id, p.term, p.tf, d.length FROM postings p "
+                f"JOIN docs d ON d.chunk_id = p.chunk_id WHERE p.term IN ({placeholders})",
+                terms
+            )
+
+            scores: Dict[int, float] = {}
+            for chunk_id, term, tf, length in rows:
+                df = document_frequency[term]
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / (avg_length or 1))
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
+def reciprocal_rank_fusion(*rankings: Sequence[Tuple[int, float]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse several ranked (id, score) lists with reciprocal rank fusion.
+    Only ranks matter, so scores on different scales (cosine, BM25) combine cleanly.
+
+    Args:
+        *rankings: Ranked lists of (id, score) pairs, best first
+        k (int): RRF damping constant
+
+    Returns:
+        List[Tuple[int, float]]: (id, fused score) pairs sorted by fused score descending
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (item_id, _) in enumerate(ranking, start=1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
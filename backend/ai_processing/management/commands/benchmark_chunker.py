@@ -0,0 +1,76 @@
+import os
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai_processing.chunking import estimate_token_counts, get_token_counter, iter_chunks
+from ai_processing.text_extractor import iter_text_parts
+
+WORDS = (
+    "the of and to in is that for it as with was on be by this are from at or an which have not "
+    "theorem proof lemma equation matrix vector eigenvalue derivative integral function variable "
+    "hypothesis experiment measurement photosynthesis mitochondria enzyme protein genome evolution "
+    "economics inflation equilibrium elasticity marginal utility regression coefficient variance "
+    "characterization electromagnetic thermodynamics interdisciplinary 3.14 x-ray 42 2024"
+).split()
+
+
+def generate_text(size_bytes: int, seed: int = 0) -> str:
+    """Build synthetic course text with ordinary paragraphs, walls of text and run-on sentences."""
+    rng = random.Random(seed)
+    paragraphs = []
+    size = 0
+    while size < size_bytes:
+        kind = rng.random()
+        if kind < 0.05:
+            # Run-on sentence with no terminal punctuation, longer than any chunk
+            paragraph = " ".join(rng.choices(WORDS, k=rng.randint(400, 1200)))
+        else:
+            sentence_count = rng.randint(40, 200) if kind < 0.15 else rng.randint(1, 8)
+            paragraph = " ".join(
+                " ".join(rng.choices(WORDS, k=rng.randint(5, 30))).capitalize() + rng.choice(".!?")
+                for _ in range(sentence_count)
+            )
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark the token-aware chunker on a multi-megabyte text."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help="Stream this text file (any encoding) into the chunker instead of generated text; "
+                                              "timings then include decoding")
+        parser.add_argument('--size-mb', type=float, default=5.0, help="Size of the generated text")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs to time; the fastest is reported")
+        parser.add_argument('--tokenizer', choices=['estimate', 'model'], default='estimate',
+                            help="Count tokens with the estimate or the embedding model's tokenizer")
+        parser.add_argument('--max-tokens', type=int, help="Chunk size limit, defaults to CHUNK_MAX_TOKENS")
+        parser.add_argument('--overlap-tokens', type=int, help="Overlap, defaults to CHUNK_OVERLAP_TOKENS")
+
+    def handle(self, *args, **options):
+        if options['file']:
+            size_mb = os.path.getsize(options['file']) / (1024 * 1024)
+            make_input = lambda: iter_text_parts(options['file'])
+        else:
+            text = generate_text(int(options['size_mb'] * 1024 * 1024))
+            size_mb = len(text.encode('utf-8')) / (1024 * 1024)
+            make_input = lambda: text
+
+        count_tokens = get_token_counter() if options['tokenizer'] == 'model' else estimate_token_counts
+
+        best = None
+        chunks = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            chunks = list(iter_chunks(make_input(), options['max_tokens'], options['overlap_tokens'], count_tokens))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        token_counts = count_tokens(chunks)
+        self.stdout.write(
+            f"{size_mb:.2f} MB -> {len(chunks)} chunks in {best:.3f}s ({size_mb / best:.2f} MB/s), "
+            f"tokens per chunk: mean {sum(token_counts) / max(len(chunks), 1):.1f}, max {max(token_counts, default=0)}"
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ai_processing.vector_store import CourseIndexStore
+
+
+class Command(BaseCommand):
+    help = "Report recall@k and query latency of a course's FAISS index against exact flat search."
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='+', type=int, help="Course IDs to evaluate")
+        parser.add_argument('--k', type=int, default=10, help="Neighbours compared per query")
+        parser.add_argument('--queries', type=int, default=100, help="Number of sampled queries")
+
+    def handle(self, *args, **options):
+        for course_id in options['course_ids']:
+            report = CourseIndexStore(course_id).evaluate_recall(options['k'], options['queries'])
+
+            if not report['ntotal']:
+                self.stdout.write(self.style.WARNING(f"Course {course_id}: no index or no embeddings"))
+                continue
+
+            self.stdout.write(
+                f"Course {course_id}: {report['index_type']} index, {report['ntotal']} vectors, "
+                f"recall@{report['k']} = {report['recall_at_k']:.3f} over {report['queries']} queries, "
+                f"{report['index_ms_per_query']:.3f} ms/query vs {report['flat_ms_per_query']:.3f} ms flat"
+            )
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 06:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_processing', '0005_embeddingcacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunk',
+            name='segment_row',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='EmbeddingSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('model_name', models.CharField(max_length=255)),
+                ('dimension', models.PositiveIntegerField()),
+                ('row_count', models.PositiveIntegerField()),
+                ('dtype', models.CharField(default='float32', max_length=20)),
+                ('normalized', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='embedding_segment', to='ai_processing.document')),
+            ],
+        ),
+    ]
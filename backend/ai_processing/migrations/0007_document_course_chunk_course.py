@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-17 06:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_course(apps, schema_editor):
+    Document = apps.get_model('ai_processing', 'Document')
+    Chunk = apps.get_model('ai_processing', 'Chunk')
+
+    Document.objects.filter(course__isnull=True).update(
+        course_id=Subquery(
+            Document.objects.filter(pk=OuterRef('pk')).values('material__assignment__course_id')[:1]
+        )
+    )
+    Chunk.objects.filter(course__isnull=True).update(
+        course_id=Subquery(
+            Document.objects.filter(pk=OuterRef('document_id')).values('course_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_processing', '0006_embeddingsegment_chunk_segment_row'),
+        ('classroom_integration', '0005_delete_material_remove_assignment_google_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunk',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='classroom_integration.course'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='classroom_integration.course'),
+        ),
+        migrations.AddIndex(
+            model_name='chunk',
+            index=models.Index(fields=['course', 'document', 'chunk_index'], name='chunk_course_doc_idx'),
+        ),
+        migrations.RunPython(backfill_course, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_processing', '0007_document_course_chunk_course'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='metadata',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
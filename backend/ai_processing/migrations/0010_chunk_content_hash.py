@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-17 06:20
+
+import hashlib
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def backfill_content_hash(apps, schema_editor):
+    # Same normalization as ai_processing.embedding_cache.hash_text, frozen here
+    Chunk = apps.get_model('ai_processing', 'Chunk')
+    whitespace_re = re.compile(r'\s+')
+
+    updated = []
+    for chunk in Chunk.objects.filter(content_hash__isnull=True).only('id', 'text').iterator(chunk_size=2000):
+        normalized = whitespace_re.sub(' ', unicodedata.normalize('NFC', chunk.text)).strip()
+        chunk.content_hash = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        updated.append(chunk)
+        if len(updated) >= 2000:
+            Chunk.objects.bulk_update(updated, ['content_hash'])
+            updated = []
+    Chunk.objects.bulk_update(updated, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_processing', '0009_extractioncacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunk',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_processing', '0010_chunk_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcrPageCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('page_number', models.PositiveIntegerField()),
+                ('ocr_version', models.CharField(max_length=100)),
+                ('text', models.TextField(blank=True)),
+                ('seconds', models.FloatField(default=0.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'page_number', 'ocr_version'), name='unique_ocr_page_cache_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,116 @@
+"""
+Process-wide registry for the AI models used by the RAG pipeline.
+
+Models are loaded lazily on first use and then shared by every task that runs
+in the same process, so a Celery worker pays the load cost once instead of on
+every task. Worker child processes can warm the registry up front through the
+`worker_process_init` signal; web processes never import sentence-transformers
+unless they actually embed something.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict
+
+from celery.signals import worker_process_init
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_models = {}
+_lock = threading.Lock()
+_gemini_configured = False
+
+# Seconds spent loading each model in this process, keyed by registry name
+MODEL_LOAD_SECONDS: Dict[str, float] = {}
+
+
+def _load(name: str, loader):
+    """Load a model once per process and record how long it took."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(name)
+        if model is not None:
+            return model
+
+        start = time.perf_counter()
+        model = loader()
+        elapsed = time.perf_counter() - start
+
+        _models[name] = model
+        MODEL_LOAD_SECONDS[name] = elapsed
+        logger.info(f"Loaded model '{name}' in {elapsed:.2f}s", extra={'model_load_seconds': elapsed})
+        return model
+
+
+def get_embedding_model():
+    """
+    Return the shared SentenceTransformer embedding model.
+
+    Returns:
+        SentenceTransformer: The loaded model, or None if loading failed
+    """
+    model_name = settings.EMBEDDING_MODEL_NAME
+
+    def loader():
+        # Imported here so processes that never embed don't pay for torch
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    try:
+        return _load(f"embedding:{model_name}", loader)
+    except Exception as e:
+        logger.error(f"Error initializing embedding model: {str(e)}")
+        return None
+
+
+def get_cross_encoder():
+    """
+    Return the shared cross-encoder used to re-rank retrieved chunks.
+    
+    Returns:
+        CrossEncoder: The loaded model, or None if loading failed
+    """
+    model_name = settings.RERANK_MODEL_NAME
+
+    def loader():
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(model_name)
+
+    try:
+        return _load(f"cross_encoder:{model_name}", loader)
+    except Exception as e:
+        logger.error(f"Error initializing cross-encoder: {str(e)}")
+        return None
+
+
+def get_gemini_model(model_name: str = 'gemini-pro'):
+    """
+    Return a shared Gemini GenerativeModel, configuring the API key once per process.
+    """
+    global _gemini_configured
+    import google.generativeai as genai
+
+    if not _gemini_configured:
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        _gemini_configured = True
+
+    return _load(f"gemini:{model_name}", lambda: genai.GenerativeModel(model_name))
+
+
+def get_model_load_stats() -> Dict[str, float]:
+    """Return the load time in seconds for every model loaded in this process."""
+    return dict(MODEL_LOAD_SECONDS)
+
+
+@worker_process_init.connect
+def warm_up_models(**kwargs):
+    """Preload the embedding (and re-ranking) models in each Celery worker child process."""
+    if getattr(settings, 'EMBEDDING_MODEL_PRELOAD', True):
+        get_embedding_model()
+        if getattr(settings, 'RAG_RERANK_ENABLED', False):
+            get_cross_encoder()
@@ -1,5 +1,6 @@
 from django.db import models
-from classroom_integration.models import AssignmentMaterial, Assignment
+from django.utils import timezone
+from classroom_integration.models import AssignmentMaterial, Assignment, Course
 
 class Document(models.Model):
     """
@@ -7,14 +8,22 @@ class Document(models.Model):
     Contains extracted text content and metadata.
     """
     material = models.OneToOneField(AssignmentMaterial, on_delete=models.CASCADE, related_name='document')
+    # Denormalized from material.assignment.course so retrieval can scope without joins
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='documents', null=True, blank=True)
     raw_text = models.TextField()  # Full extracted text content
     processed_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     language = models.CharField(max_length=10, null=True, blank=True)  # Document language code (e.g., 'en')
     page_count = models.PositiveIntegerField(default=0)  # Number of pages in the original document
+    metadata = models.JSONField(default=dict, blank=True)  # Extraction metadata (document info, per-engine timings, etc.)
+    
+    def save(self, *args, **kwargs):
+        if self.course_id is None:
+            self.course_id = self.material.assignment.course_id
+        super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"Document for {self.material.title}"
+        return f"Document for {self.material.name}"
 
 class Chunk(models.Model):
     """
@@ -22,16 +31,64 @@ class Chunk(models.Model):
     with its embedding vector for similarity search.
     """
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chunks')
+    # Denormalized from document.course for single-table course scoping
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='chunks', null=True, blank=True)
     text = models.TextField()  # Chunk text content
-    embedding_vector = models.BinaryField(null=True, blank=True)  # Store FAISS/vector embedding as binary
+    content_hash = models.CharField(max_length=64, null=True, blank=True)  # SHA-256 of the normalized text, for incremental re-chunking
+    embedding_vector = models.BinaryField(null=True, blank=True)  # Legacy per-row embedding; new chunks use segment_row
+    segment_row = models.PositiveIntegerField(null=True, blank=True)  # Row of this chunk in the document's EmbeddingSegment
     chunk_index = models.PositiveIntegerField()  # Position in the document
     metadata = models.JSONField(default=dict, blank=True)  # Additional metadata (page number, section, etc.)
     
     class Meta:
         ordering = ['document', 'chunk_index']
+        indexes = [
+            models.Index(fields=['course', 'document', 'chunk_index'], name='chunk_course_doc_idx'),
+        ]
         
     def __str__(self):
         return f"Chunk {self.chunk_index} of {self.document}"
+    
+    def section_matches(self, sections) -> bool:
+        """Whether any heading in the chunk's section path contains one of the given terms (case-insensitive)."""
+        headings = [heading.lower() for heading in (self.metadata or {}).get('section_path', [])]
+        return any(term.lower() in heading for term in sections for heading in headings)
+    
+    def get_citation(self) -> str:
+        """Human-readable source reference, e.g. "Lecture 3.pdf, pp. 4-5, Thermodynamics > Entropy"."""
+        metadata = self.metadata or {}
+        parts = [self.document.material.name]
+        
+        if 'page_start' in metadata:
+            start, end = metadata['page_start'], metadata.get('page_end', metadata['page_start'])
+            parts.append(f"p. {start}" if start == end else f"pp. {start}-{end}")
+        elif 'slide' in metadata:
+            start, end = metadata['slide'], metadata.get('slide_end', metadata['slide'])
+            parts.append(f"slide {start}" if start == end else f"slides {start}-{end}")
+            
+        if metadata.get('section_path'):
+            parts.append(" > ".join(metadata['section_path']))
+            
+        return ", ".join(parts)
+
+class EmbeddingSegment(models.Model):
+    """
+    Contiguous float32 embedding matrix for all chunks of a document,
+    stored as a .npy file under settings.EMBEDDING_SEGMENT_PATH.
+    Each Chunk points at its row through Chunk.segment_row.
+    """
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='embedding_segment')
+    file_name = models.CharField(max_length=255)  # Relative to settings.EMBEDDING_SEGMENT_PATH
+    model_name = models.CharField(max_length=255)  # Embedding model that produced the vectors
+    dimension = models.PositiveIntegerField()
+    row_count = models.PositiveIntegerField()
+    dtype = models.CharField(max_length=20, default='float32')
+    normalized = models.BooleanField(default=True)  # Whether rows are L2-normalized
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Embedding segment for {self.document} ({self.row_count}x{self.dimension})"
 
 class AssignmentDraft(models.Model):
     """
@@ -55,4 +112,70 @@ class AssignmentDraft(models.Model):
     prompt_used = models.TextField(null=True, blank=True) 
     
     def __str__(self):
-        return f"Draft for {self.assignment.title} ({'Final' if self.is_final else 'Draft'})"
\ No newline at end of file
+        return f"Draft for {self.assignment.title} ({'Final' if self.is_final else 'Draft'})"
+
+class EmbeddingCacheEntry(models.Model):
+    """
+    Cached embedding vector for a piece of chunk text, keyed by the
+    embedding model and a hash of the normalized text. Lets re-synced or
+    shared materials reuse embeddings instead of encoding the same text again.
+    """
+    model_name = models.CharField(max_length=255)
+    text_hash = models.CharField(max_length=64)  # SHA-256 hex digest of the normalized text
+    dimension = models.PositiveIntegerField()
+    vector = models.BinaryField()  # Raw float32 bytes
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)  # For LRU eviction
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model_name', 'text_hash'], name='unique_embedding_cache_key'),
+        ]
+        
+    def __str__(self):
+        return f"{self.model_name}:{self.text_hash[:12]}"
+
+class ExtractionCacheEntry(models.Model):
+    """
+    Cached text extraction result for a file, keyed by the SHA-256 of the
+    file bytes and the extractor version. Shared by every material, user and
+    course that attaches a byte-identical file.
+    """
+    content_hash = models.CharField(max_length=64)  # SHA-256 hex digest of the file bytes
+    extractor_version = models.CharField(max_length=100)
+    text = models.TextField()
+    page_count = models.PositiveIntegerField(default=0)
+    page_map = models.JSONField(default=list, blank=True)  # [page_number, start offset in text] pairs
+    metadata = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)  # For LRU eviction
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_hash', 'extractor_version'], name='unique_extraction_cache_key'),
+        ]
+        
+    def __str__(self):
+        return f"{self.extractor_version}:{self.content_hash[:12]}"
+
+
+class OcrPageCacheEntry(models.Model):
+    """
+    OCR text of one page (or slide) of a file, keyed by the SHA-256 of the
+    file bytes, the page number and the OCR configuration. Cached per page so
+    an interrupted OCR job resumes where it stopped.
+    """
+    content_hash = models.CharField(max_length=64)  # SHA-256 hex digest of the file bytes
+    page_number = models.PositiveIntegerField()  # 1-based
+    ocr_version = models.CharField(max_length=100)  # Engine version, languages and DPI
+    text = models.TextField(blank=True)
+    seconds = models.FloatField(default=0.0)  # Render + recognition time
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_hash', 'page_number', 'ocr_version'], name='unique_ocr_page_cache_key'),
+        ]
+        
+    def __str__(self):
+        return f"{self.ocr_version}:{self.content_hash[:12]}:{self.page_number}"
@@ -0,0 +1,313 @@
+"""
+OCR for the pages text extraction couldn't read: scanned PDF pages and
+slides that are only pictures.
+
+Runs from ocr_document_task on its own Celery queue so long OCR jobs never
+hold up ordinary extraction. Pages are rendered and recognised in a thread
+pool; Tesseract and poppler run as subprocesses, so threads scale across
+cores without a process pool. Each page's text is cached in
+OcrPageCacheEntry by file content hash, so a retried or re-synced file only
+OCRs the pages it hasn't seen.
+"""
+
+import io
+import os
+import logging
+import tempfile
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from django.conf import settings
+
+from .models import OcrPageCacheEntry
+from .text_extractor import SLIDE_SEPARATOR, FileSource, get_available_cores
+
+# OCR engine
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+# PDF page rendering (needs poppler's pdftoppm)
+try:
+    from pdf2image import convert_from_path
+except ImportError:
+    convert_from_path = None
+
+# Slide pictures
+try:
+    from pptx import Presentation
+    from pptx.shapes.picture import Picture
+except ImportError:
+    Presentation = None
+    Picture = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a change alters OCR output, so cached pages are redone
+OCR_VERSION = '1'
+
+
+def is_ocr_available(file_type: str) -> bool:
+    """Return True if OCR is enabled and the libraries and tesseract binary it needs for this file type are installed."""
+    if not settings.OCR_ENABLED or pytesseract is None:
+        return False
+    if file_type == '.pdf':
+        libraries_installed = convert_from_path is not None
+    elif file_type == '.pptx':
+        libraries_installed = Presentation is not None and Image is not None
+    else:
+        return False
+    return libraries_installed and _tesseract_installed()
+
+
+@lru_cache(maxsize=1)
+def _tesseract_version() -> str:
+    return str(pytesseract.get_tesseract_version())
+
+
+@lru_cache(maxsize=1)
+def _tesseract_installed() -> bool:
+    """Probe the tesseract binary once per process; pytesseract imports fine without it."""
+    try:
+        _tesseract_version()
+        return True
+    except Exception as e:
+        logger.warning(f"Tesseract is not available, OCR is disabled: {e}")
+        return False
+
+
+def get_ocr_version() -> str:
+    """Identify the OCR code, engine and settings, for OCR page cache keys."""
+    return f"{OCR_VERSION}:tesseract-{_tesseract_version()}:{settings.OCR_LANGUAGES}:{settings.OCR_DPI}"
+
+
+def get_ocr_workers() -> int:
+    """Return how many pages may be OCRed at once: the OCR_WORKERS setting, or the available cores."""
+    return settings.OCR_WORKERS or get_available_cores()
+
+
+def _recognize(image) -> str:
+    return pytesseract.image_to_string(image, lang=settings.OCR_LANGUAGES)
+
+
+@contextmanager
+def _local_file(source: FileSource, extension: str) -> Iterator[str]:
+    """Yield a path for the source, writing raw content to a temporary file for the renderer."""
+    if not isinstance(source, (bytes, bytearray, memoryview)):
+        yield os.fspath(source)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=extension) as f:
+        f.write(source)
+        f.flush()
+        yield f.name
+
+
+def _pdf_page_jobs(path: str, page_numbers: Iterable[int]) -> Dict[int, Callable[[], str]]:
+    """One job per page: render it to a grayscale image, then recognise it."""
+    def job(page_number: int) -> str:
+        images = convert_from_path(
+            path, dpi=settings.OCR_DPI, first_page=page_number, last_page=page_number, grayscale=True
+        )
+        try:
+            return "\n".join(_recognize(image) for image in images)
+        finally:
+            for image in images:
+                image.close()
+
+    return {page_number: partial(job, page_number) for page_number in page_numbers}
+
+
+def _slide_jobs(path: str, slide_numbers: Iterable[int]) -> Dict[int, Callable[[], str]]:
+    """One job per slide, recognising each of its pictures in turn."""
+    wanted = set(slide_numbers)
+    blobs: Dict[int, List[bytes]] = {}
+    # Pictures are read up front; python-pptx objects aren't safe to share across threads
+    for number, slide in enumerate(Presentation(path).slides, start=1):
+        if number in wanted:
+            blobs[number] = [shape.image.blob for shape in slide.shapes if isinstance(shape, Picture)]
+
+    def job(slide_number: int) -> str:
+        texts = []
+        for blob in blobs[slide_number]:
+            with Image.open(io.BytesIO(blob)) as image:
+                texts.append(_recognize(image))
+        return "\n".join(texts)
+
+    return {number: partial(job, number) for number in blobs}
+
+
+def _timed(job: Callable[[], str]) -> Tuple[str, float]:
+    start = time.perf_counter()
+    return job(), time.perf_counter() - start
+
+
+def ocr_pages(source: FileSource, file_type: str, page_numbers: List[int],
+              content_hash: str) -> Tuple[Dict[int, str], Dict]:
+    """
+    OCR pages of a PDF, or picture-only slides of a PPTX, in parallel.
+
+    Cached pages are returned without OCR; newly recognised pages are cached
+    as they finish. Pages that fail are logged and left out of the result, so
+    they are retried the next time the file is processed.
+
+    Args:
+        source (FileSource): File path or raw file content
+        file_type (str): '.pdf' or '.pptx', as sniffed at extraction
+        page_numbers (List[int]): 1-based pages (or slides) to OCR
+        content_hash (str): SHA-256 of the file bytes, the cache key
+
+    Returns:
+        tuple: ({page_number: text}, stats) where stats holds page counts,
+            workers, seconds and throughput in pages per second per core
+    """
+    ocr_version = get_ocr_version()
+    results = dict(OcrPageCacheEntry.objects.filter(
+        content_hash=content_hash,
+        ocr_version=ocr_version,
+        page_number__in=page_numbers
+    ).values_list('page_number', 'text'))
+    cached_pages = len(results)
+    pending = [page_number for page_number in page_numbers if page_number not in results]
+
+    workers = max(1, min(get_ocr_workers(), len(pending)))
+    failed_pages = []
+    page_seconds = 0.0
+    start = time.perf_counter()
+
+    if pending:
+        with _local_file(source, file_type) as path:
+            jobs = _pdf_page_jobs(path, pending) if file_type == '.pdf' else _slide_jobs(path, pending)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(_timed, job): page_number for page_number, job in jobs.items()}
+                for future in as_completed(futures):
+                    page_number = futures[future]
+                    try:
+                        text, seconds = future.result()
+                    except Exception as e:
+                        logger.warning(f"OCR failed on page {page_number} of {content_hash[:12]}: {str(e)}")
+                        failed_pages.append(page_number)
+                        continue
+
+                    results[page_number] = text
+                    page_seconds += seconds
+                    OcrPageCacheEntry.objects.bulk_create(
+                        [OcrPageCacheEntry(
+                            content_hash=content_hash,
+                            page_number=page_number,
+                            ocr_version=ocr_version,
+                            text=text,
+                            seconds=seconds
+                        )],
+                        ignore_conflicts=True  # Another worker may have OCRed the same file
+                    )
+
+        evict_ocr_pages(settings.OCR_CACHE_MAX_PAGES)
+
+    elapsed = time.perf_counter() - start
+    recognized = len(results) - cached_pages
+    # Throughput per core actually used, comparable across hosts and worker counts
+    cores = min(workers, get_available_cores())
+    pages_per_second = recognized / elapsed if recognized and elapsed > 0 else 0.0
+    stats = {
+        'version': ocr_version,
+        'pages': len(page_numbers),
+        'cached_pages': cached_pages,
+        'recognized_pages': recognized,
+        'failed_pages': sorted(failed_pages),
+        'workers': workers,
+        'seconds': round(elapsed, 3),
+        'page_seconds': round(page_seconds, 3),
+        'pages_per_second': round(pages_per_second, 3),
+        'pages_per_second_per_core': round(pages_per_second / cores, 3),
+    }
+
+    logger.info(
+        f"OCRed {recognized} pages of {content_hash[:12]} ({cached_pages} cached, {len(failed_pages)} failed) "
+        f"in {elapsed:.2f}s with {workers} threads: {stats['pages_per_second_per_core']} pages/s/core"
+    )
+    return results, stats
+
+
+def evict_ocr_pages(max_pages: int) -> int:
+    """
+    Delete the oldest cached OCR pages above max_pages.
+
+    Returns:
+        int: Number of pages deleted
+    """
+    excess = OcrPageCacheEntry.objects.count() - max_pages
+    if excess <= 0:
+        return 0
+
+    stale_ids = list(
+        OcrPageCacheEntry.objects.order_by('created_at').values_list('id', flat=True)[:excess]
+    )
+    deleted, _ = OcrPageCacheEntry.objects.filter(id__in=stale_ids).delete()
+    logger.info(f"Evicted {deleted} OCR page cache entries")
+    return deleted
+
+
+def merge_ocr_text(text: str, metadata: Dict, ocr_text: Dict[int, str]) -> Tuple[str, Dict]:
+    """
+    Splice OCR text into an extracted document in place of pages that had
+    none, shifting page_map and section_map to match. Pages with extracted
+    text keep it.
+
+    Args:
+        text (str): Extracted text, pages joined as recorded in metadata['page_map']
+        metadata (dict): Extraction metadata with page_map and optionally section_map
+        ocr_text (dict): OCR text by 1-based page number
+
+    Returns:
+        tuple: (merged_text, updated metadata)
+    """
+    page_map = metadata.get('page_map') or []
+    if not page_map:
+        return text, metadata
+
+    separator = SLIDE_SEPARATOR if metadata.get('page_unit') == 'slide' else "\n\n"
+    old_starts = [offset for _, offset in page_map]
+    old_ends = [start - len(separator) for start in old_starts[1:]] + [len(text)]
+
+    parts = []
+    new_page_map = []
+    new_starts = []
+    replaced = []
+    offset = 0
+    for (page_number, old_start), old_end in zip(page_map, old_ends):
+        page_text = text[old_start:old_end]
+        recognized = (ocr_text.get(page_number) or "").strip()
+        # An existing text layer is never replaced; OCR only fills empty pages
+        use_ocr = bool(recognized) and not page_text.strip()
+        if use_ocr:
+            page_text = recognized
+
+        parts.append(page_text)
+        new_page_map.append([page_number, offset])
+        new_starts.append(offset)
+        replaced.append(use_ocr)
+        offset += len(page_text) + len(separator)
+
+    section_map = []
+    for old_offset, path in metadata.get('section_map') or []:
+        index = max(bisect_right(old_starts, old_offset) - 1, 0)
+        # Headings on replaced pages can't be located in the new text, so they move to the page start
+        shift = 0 if replaced[index] else old_offset - old_starts[index]
+        section_map.append([new_starts[index] + shift, path])
+
+    ocr_page_numbers = [page_number for (page_number, _), use_ocr in zip(page_map, replaced) if use_ocr]
+    return separator.join(parts), dict(
+        metadata, page_map=new_page_map, section_map=section_map, ocr_replaced_pages=ocr_page_numbers
+    )
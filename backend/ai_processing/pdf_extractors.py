@@ -0,0 +1,266 @@
+"""
+Page-level PDF text extraction engines.
+
+Engines are tried per page in the order of settings.PDF_EXTRACTOR_CHAIN,
+cheapest first. A page only escalates to the next (slower, layout-aware)
+engine when the text from the previous one fails is_usable_page_text(), so
+digital-native PDFs are usually handled entirely by the fast path.
+"""
+
+import logging
+import time
+import unicodedata
+from typing import BinaryIO, Dict, List, Tuple, Type
+
+from django.conf import settings
+
+import PyPDF2
+import pdfplumber
+
+logger = logging.getLogger(__name__)
+
+# Quality thresholds for accepting a page's text without escalating
+MIN_CLEAN_CHAR_RATIO = 0.85  # Letters, digits, whitespace and punctuation
+MIN_WHITESPACE_RATIO = 0.05  # Of space-separated script letters; lower usually means words were glued together
+MIN_SPACING_CHECK_LETTERS = 40  # Headings and labels are too short to tell glued words from one long word
+MAX_BROKEN_GLYPH_RATIO = 0.01  # Unmapped glyphs: '�' or pdfminer's '(cid:NN)'
+
+# Symbols counted as clean besides Unicode punctuation
+_clean_symbols = frozenset("+=<>$€£°|^~`")
+
+# Scripts written without spaces between words: Thai, Lao, Myanmar, Khmer, CJK and kana
+_unspaced_script_ranges = (
+    (0x0E00, 0x0EFF), (0x1000, 0x109F), (0x1780, 0x17FF), (0x2E80, 0x2FDF),
+    (0x3000, 0x30FF), (0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF),
+    (0xFF66, 0xFF9F), (0x20000, 0x3FFFF),
+)
+
+
+def _is_unspaced_script(char: str) -> bool:
+    code = ord(char)
+    return any(start <= code <= end for start, end in _unspaced_script_ranges)
+
+PDF_ENGINES: Dict[str, Type['PdfEngine']] = {}
+
+
+def register_pdf_engine(engine_class: Type['PdfEngine']) -> Type['PdfEngine']:
+    """Class decorator making an engine available to PDF_EXTRACTOR_CHAIN by its name."""
+    PDF_ENGINES[engine_class.name] = engine_class
+    return engine_class
+
+
+class PdfEngine:
+    """
+    A PDF opened by one extraction engine. Subclasses set `name` and
+    implement page_count, get_metadata() and extract_page().
+    """
+    name = None
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+
+    @property
+    def page_count(self) -> int:
+        raise NotImplementedError
+
+    def get_metadata(self) -> Dict[str, str]:
+        """Return the PDF's document info dictionary."""
+        return {}
+
+    def extract_page(self, index: int) -> str:
+        """Return the text of the 0-based page `index`."""
+        raise NotImplementedError
+
+    def get_outline(self) -> List[Tuple[int, List[str]]]:
+        """Return the document outline as (0-based page index, heading path) pairs in outline order."""
+        return []
+
+    def close(self):
+        pass
+
+
+@register_pdf_engine
+class PyPDF2Engine(PdfEngine):
+    """Content-stream text extraction without layout analysis. Fast."""
+    name = 'pypdf2'
+
+    def __init__(self, stream: BinaryIO):
+        super().__init__(stream)
+        self.reader = PyPDF2.PdfReader(stream)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.reader.pages)
+
+    def get_metadata(self) -> Dict[str, str]:
+        if not self.reader.metadata:
+            return {}
+        return {k.lstrip('/'): str(v) for k, v in self.reader.metadata.items()}
+
+    def extract_page(self, index: int) -> str:
+        return self.reader.pages[index].extract_text() or ""
+
+    def page_has_images(self, index: int) -> bool:
+        """Return True if the 0-based page `index` draws an image, directly or through a form XObject."""
+        def has_image(resources, depth):
+            xobjects = resources.get('/XObject') if resources else None
+            if not xobjects:
+                return False
+            for xobject in xobjects.get_object().values():
+                xobject = xobject.get_object()
+                subtype = xobject.get('/Subtype')
+                if subtype == '/Image':
+                    return True
+                if subtype == '/Form' and depth < 3 and has_image(xobject.get('/Resources'), depth + 1):
+                    return True
+            return False
+
+        return has_image(self.reader.pages[index].get('/Resources'), 0)
+
+    def get_outline(self) -> List[Tuple[int, List[str]]]:
+        entries = []
+
+        def walk(items, path):
+            # A nested list holds the children of the item just before it
+            parent_title = None
+            for item in items:
+                if isinstance(item, list):
+                    if parent_title is not None:
+                        walk(item, path + [parent_title])
+                    continue
+                parent_title = str(item.title).strip()
+                try:
+                    page_index = self.reader.get_destination_page_number(item)
+                except Exception:
+                    continue
+                if page_index is not None and page_index >= 0:
+                    entries.append((page_index, path + [parent_title]))
+
+        walk(self.reader.outline, [])
+        return entries
+
+
+@register_pdf_engine
+class PdfplumberEngine(PdfEngine):
+    """Layout-aware extraction through pdfminer. Slower, but orders columns and spacing correctly."""
+    name = 'pdfplumber'
+
+    def __init__(self, stream: BinaryIO):
+        super().__init__(stream)
+        self.pdf = pdfplumber.open(stream)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pdf.pages)
+
+    def get_metadata(self) -> Dict[str, str]:
+        return {k: str(v) for k, v in (self.pdf.metadata or {}).items()}
+
+    def extract_page(self, index: int) -> str:
+        page = self.pdf.pages[index]
+        try:
+            return page.extract_text() or ""
+        finally:
+            # Drop the page's parsed objects before moving on
+            page.close()
+
+    def close(self):
+        self.pdf.close()
+
+
+def get_pdf_engine_chain() -> List[Type[PdfEngine]]:
+    """Return the configured engine classes, fastest first."""
+    chain = []
+    for name in getattr(settings, 'PDF_EXTRACTOR_CHAIN', ['pypdf2', 'pdfplumber']):
+        engine_class = PDF_ENGINES.get(name)
+        if engine_class is None:
+            logger.warning(f"Unknown PDF extractor '{name}' in PDF_EXTRACTOR_CHAIN, skipping")
+            continue
+        chain.append(engine_class)
+    return chain or [PdfplumberEngine]
+
+
+def is_usable_page_text(text: str) -> bool:
+    """
+    Cheap text check deciding whether a page's extracted text is good enough
+    to keep, or should be re-extracted by the next engine in the chain.
+
+    Only an empty page or garbled text escalates: unmapped glyphs, symbol
+    soup, or (in scripts that separate words with spaces, given enough
+    letters to judge) words glued together. Short pages such as chapter
+    titles and CJK text without spaces are usable.
+
+    Args:
+        text (str): Text extracted from one page
+
+    Returns:
+        bool: True if the text looks like real, correctly spaced text
+    """
+    stripped = text.strip()
+    length = len(stripped)
+    if not length:
+        return False
+
+    clean = whitespace = spaced_letters = unspaced_letters = 0
+    for char in stripped:
+        if char.isspace():
+            whitespace += 1
+            clean += 1
+        elif char.isalnum():
+            clean += 1
+            if _is_unspaced_script(char):
+                unspaced_letters += 1
+            else:
+                spaced_letters += 1
+        elif char in _clean_symbols or unicodedata.category(char).startswith('P'):
+            clean += 1
+
+    broken = stripped.count('�') + stripped.count('(cid:')
+    if clean / length < MIN_CLEAN_CHAR_RATIO or broken / length > MAX_BROKEN_GLYPH_RATIO:
+        return False
+
+    # Spacing only says something about space-separated scripts, and only over enough letters
+    if spaced_letters >= max(unspaced_letters, MIN_SPACING_CHECK_LETTERS):
+        return whitespace / spaced_letters >= MIN_WHITESPACE_RATIO
+    return True
+
+
+def summarize_page_stats(pages_metadata: List[Dict]) -> Dict:
+    """
+    Aggregate per-page extraction metadata into per-engine totals.
+
+    Args:
+        pages_metadata (List[Dict]): ExtractedPage.metadata of every page
+
+    Returns:
+        dict: engine_seconds and engine_pages per engine, fallback_pages
+            (pages that escalated past the first engine) and page_seconds
+    """
+    engine_seconds: Dict[str, float] = {}
+    engine_pages: Dict[str, int] = {}
+    fallback_pages = 0
+
+    for page in pages_metadata:
+        for name, seconds in page.get('engine_seconds', {}).items():
+            engine_seconds[name] = engine_seconds.get(name, 0.0) + seconds
+        engine_pages[page['extractor']] = engine_pages.get(page['extractor'], 0) + 1
+        if page.get('fallbacks'):
+            fallback_pages += 1
+
+    return {
+        'engine_seconds': {name: round(seconds, 4) for name, seconds in engine_seconds.items()},
+        'engine_pages': engine_pages,
+        'fallback_pages': fallback_pages,
+        'page_seconds': [round(page['seconds'], 4) for page in pages_metadata],
+    }
+
+
+def timed_extract(engine: PdfEngine, index: int) -> Tuple[str, float]:
+    """Extract one page with an engine, returning (text, seconds). Errors yield empty text."""
+    start = time.perf_counter()
+    try:
+        text = engine.extract_page(index)
+    except Exception as e:
+        logger.warning(f"{engine.name} failed on PDF page {index + 1}: {str(e)}")
+        text = ""
+    return text, time.perf_counter() - start
@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import time
+from typing import List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Backends private to each process: a version bump from a Celery worker never reaches the web process
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def results_cache_enabled() -> bool:
+    """Return True if the default cache is shared across processes, as retrieval result caching requires."""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+def _course_version_key(course_id: int) -> str:
+    return f"rag:course_index_version:{course_id}"
+
+
+def get_course_index_version(course_id: int) -> int:
+    """
+    Return the current index version of a course. The version changes
+    whenever any chunk of the course is added or removed.
+    """
+    key = _course_version_key(course_id)
+    # Seed with a timestamp so an evicted version never repeats an older one
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key) or 0
+
+
+def bump_course_index_version(course_id: int):
+    """Invalidate every cached retrieval result for a course."""
+    key = _course_version_key(course_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+    except Exception as e:
+        # Results cached under the old version can't be read without the cache either
+        logger.warning(f"Could not bump index version for course {course_id}: {e}")
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def get_cached_query_embedding(query_text: str) -> Optional[np.ndarray]:
+    """Return a previously computed query embedding, if cached."""
+    try:
+        data = cache.get(f"rag:query_embedding:{_hash(settings.EMBEDDING_MODEL_NAME, normalize_text(query_text))}")
+    except Exception as e:
+        logger.warning(f"Query embedding cache unavailable: {e}")
+        return None
+    if data is None:
+        return None
+    return np.frombuffer(data, dtype=np.float32)
+
+
+def cache_query_embedding(query_text: str, embedding: np.ndarray):
+    """Cache a query embedding keyed by model name and normalized query text."""
+    try:
+        cache.set(
+            f"rag:query_embedding:{_hash(settings.EMBEDDING_MODEL_NAME, normalize_text(query_text))}",
+            np.asarray(embedding, dtype=np.float32).tobytes(),
+            timeout=settings.RAG_QUERY_CACHE_TIMEOUT
+        )
+    except Exception as e:
+        logger.warning(f"Query embedding cache unavailable: {e}")
+
+
+def get_results_cache_key(course_id: int, query_text: str, top_k: int, *options) -> Optional[str]:
+    """
+    Build the result cache key for a query against the course's current
+    index version. Take the key before retrieving so a concurrent chunk
+    change can't get its stale results stored under the new version.
+    
+    Args:
+        course_id (int): The course searched
+        query_text (str): The query text
+        top_k (int): Number of results requested
+        *options: Any other retrieval arguments that change the ranking
+    
+    Returns:
+        Optional[str]: The key, or None if the cache is unavailable or not
+            shared across processes
+    """
+    if not results_cache_enabled():
+        return None
+
+    # Retrieval settings are part of the key so toggling them never serves stale rankings
+    content_hash = _hash(
+        normalize_text(query_text), top_k, settings.EMBEDDING_MODEL_NAME,
+        settings.RAG_HYBRID_SEARCH, settings.RAG_RERANK_ENABLED, *options
+    )
+    try:
+        return f"rag:retrieval:{course_id}:{get_course_index_version(course_id)}:{content_hash}"
+    except Exception as e:
+        logger.warning(f"Retrieval cache unavailable: {e}")
+        return None
+
+
+def get_cached_results(key: Optional[str]) -> Optional[List[int]]:
+    """Return the cached ranked chunk ids for a result cache key, if present."""
+    if key is None:
+        return None
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.warning(f"Retrieval cache unavailable: {e}")
+        return None
+
+
+def cache_results(key: Optional[str], chunk_ids: List[int]):
+    """Cache ranked chunk ids under a key from get_results_cache_key()."""
+    if key is None:
+        return
+    try:
+        cache.set(key, list(chunk_ids), timeout=settings.RAG_QUERY_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Retrieval cache unavailable: {e}")
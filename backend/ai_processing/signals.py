@@ -0,0 +1,32 @@
+import logging
+from django.db import transaction
+from django.db.models.signals import pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Document, EmbeddingSegment
+
+logger = logging.getLogger(__name__)
+
+@receiver(pre_delete, sender=Document)
+def remove_document_from_course_indices(sender, instance, **kwargs):
+    """
+    Drop a document's chunks from the course FAISS and lexical indices before
+    the document (and, by cascade, its chunks) is deleted.
+    """
+    from .vector_store import CourseIndexStore, get_course_id_for_document
+    from .lexical_index import CourseLexicalIndex
+    
+    try:
+        course_id = get_course_id_for_document(instance)
+        chunk_ids = list(instance.chunks.values_list('id', flat=True))
+        CourseIndexStore(course_id).remove(chunk_ids)
+        CourseLexicalIndex(course_id).remove(chunk_ids)
+    except Exception as e:
+        logger.error(f"Error removing document {instance.pk} from course index: {e}")
+
+@receiver(post_delete, sender=EmbeddingSegment)
+def delete_embedding_segment_file(sender, instance, **kwargs):
+    """Remove the .npy file once the deletion of its EmbeddingSegment row commits."""
+    from .embedding_segments import delete_segment_file
+    
+    transaction.on_commit(lambda: delete_segment_file(instance))
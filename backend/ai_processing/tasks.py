@@ -5,26 +5,50 @@ from celery import shared_task
 from django.conf import settings
 from django.utils import timezone
 from classroom_integration.models import AssignmentMaterial, Assignment
+from core import blob_store
 
 # Local imports
 from .models import Document, Chunk, AssignmentDraft
-from .text_extractor import TextExtractor
+from .extraction_cache import extract_text_cached
+from .ocr import is_ocr_available, merge_ocr_text, ocr_pages
 from .Rag import RAGSystem
+from .vector_store import CourseIndexStore
+from .lexical_index import CourseLexicalIndex
 
 logger = logging.getLogger(__name__)
 
+
+def get_material_file_path(material, blob_key=None):
+    """
+    Locate a material's downloaded file in the blob store: the given blob,
+    else the material's own blob.
+    
+    Returns:
+        str: The file path, or None if the file isn't available
+    """
+    blob_key = blob_key or material.blob_key
+    if not blob_key:
+        return None
+    
+    path = blob_store.blob_path(blob_key)
+    if os.path.exists(path):
+        return path
+    logger.error(f"Blob {blob_key[:12]} of material {material.id} is missing from the blob store")
+    return None
+
+
 @shared_task
-def process_material_task(material_id, file_content_bytes=None):
+def process_material_task(material_id, blob_key=None):
     """
     Celery task to process a material file:
     1. Extract text from the file
     2. Create Document object with extracted text
-    3. Trigger chunk and embedding generation
+    3. Trigger OCR of unreadable pages if there are any, else chunk and embedding generation
     
     Args:
         material_id (int): The ID of the material to process
-        file_content_bytes (bytes, optional): Binary file content if already downloaded
-            If None, material must have a local_path that can be read
+        blob_key (str, optional): Blob store key of the downloaded file,
+            defaults to the material's blob_key
     """
     try:
         # Get the material
@@ -34,41 +58,54 @@ def process_material_task(material_id, file_content_bytes=None):
         material.processing_status = 'Processing'
         material.save(update_fields=['processing_status'])
         
-        logger.info(f"Processing material {material_id}: {material.title}")
+        logger.info(f"Processing material {material_id}: {material.name}")
         
-        # Get file content
-        if file_content_bytes is None:
-            if not material.local_path or not os.path.exists(material.local_path):
-                logger.error(f"Material {material_id} has no file content and no valid local path")
-                material.processing_status = 'Error'
-                material.save(update_fields=['processing_status'])
-                return f"Failed: No content for material {material_id}"
-                
-            # Read from local file
-            with open(material.local_path, 'rb') as f:
-                file_content_bytes = f.read()
-        
-        # Extract text
-        file_name = material.title or f"material_{material_id}"
-        extracted_text, metadata, page_count = TextExtractor.extract_text(file_content_bytes, file_name)
-        
-        if not extracted_text:
+        # Extract text, straight from the local file so large PDFs are never read into memory whole
+        file_path = get_material_file_path(material, blob_key)
+        if file_path is None:
+            logger.error(f"Material {material_id} has no downloaded file")
+            material.processing_status = 'Error'
+            material.save(update_fields=['processing_status'])
+            return f"Failed: No content for material {material_id}"
+            
+        file_name = material.name or f"material_{material_id}"
+        # Byte-identical files (re-syncs, handouts shared across assignments) reuse the cached extraction;
+        # a blob key is already the file's SHA-256
+        extracted_text, metadata, page_count = extract_text_cached(file_path, file_name, blob_key or material.blob_key)
+        
+        # Scanned pages and picture-only slides come back without usable text
+        pending_ocr = metadata.get('ocr_pages') or []
+        if pending_ocr and not is_ocr_available(metadata.get('file_type')):
+            logger.warning(f"OCR unavailable, skipping {len(pending_ocr)} unreadable pages of material {material_id}")
+            pending_ocr = []
+        
+        # Streamed text files are chunked from the file, so their stored text is empty
+        if not extracted_text.strip() and not pending_ocr and not metadata.get('streamed'):
             logger.error(f"Failed to extract text from material {material_id}")
             material.processing_status = 'Error'
             material.save(update_fields=['processing_status'])
             return f"Failed: No text extracted from material {material_id}"
             
-        logger.info(f"Successfully extracted {len(extracted_text)} characters from material {material_id}")
+        logger.info(f"Successfully extracted {metadata.get('char_count', len(extracted_text))} characters from material {material_id}")
         
         # Create or update Document
         document, created = Document.objects.update_or_create(
             material=material,
             defaults={
                 'raw_text': extracted_text,
-                'page_count': page_count
+                'page_count': page_count,
+                'metadata': metadata,
+                'course_id': material.assignment.course_id
             }
         )
         
+        if pending_ocr:
+            # OCR runs on its own queue and triggers chunking once the pages are merged in
+            material.processing_status = 'OCR'
+            material.save(update_fields=['processing_status'])
+            ocr_document_task.delay(document.id, blob_key)
+            return f"Queued {len(pending_ocr)} pages of material {material_id} for OCR"
+        
         # Update material status
         material.processing_status = 'Chunking'
         material.save(update_fields=['processing_status'])
@@ -95,6 +132,70 @@ def process_material_task(material_id, file_content_bytes=None):
         return f"Failed to process material {material_id}: {str(e)}"
 
 
+@shared_task
+def ocr_document_task(document_id, blob_key=None):
+    """
+    OCR the pages of a document that text extraction couldn't read, merge
+    the text in and trigger chunk and embedding generation. Routed to the
+    'ocr' queue (settings.CELERY_TASK_ROUTES).
+    
+    Args:
+        document_id (int): The ID of the document to OCR
+        blob_key (str, optional): Blob store key of the downloaded file,
+            defaults to the material's blob_key
+    """
+    try:
+        document = Document.objects.select_related('material').get(pk=document_id)
+        material = document.material
+        metadata = document.metadata or {}
+        page_numbers = metadata.get('ocr_pages') or []
+        
+        file_path = get_material_file_path(material, blob_key)
+        if page_numbers and file_path is None:
+            logger.error(f"Document {document_id} has no downloaded file to OCR")
+            page_numbers = []
+            
+        if page_numbers:
+            try:
+                ocr_text, stats = ocr_pages(file_path, metadata['file_type'], page_numbers, metadata['content_hash'])
+            except Exception as e:
+                # The text extracted so far is still worth chunking; only the unreadable pages are lost
+                logger.exception(f"OCR failed for document {document_id}, continuing with the extracted text: {e}")
+            else:
+                document.raw_text, document.metadata = merge_ocr_text(document.raw_text, metadata, ocr_text)
+                document.metadata['ocr'] = stats
+                document.save(update_fields=['raw_text', 'metadata'])
+            
+        if not document.raw_text.strip():
+            logger.error(f"No text extracted or recognized for document {document_id}")
+            material.processing_status = 'Error'
+            material.save(update_fields=['processing_status'])
+            return f"Failed: No text extracted from document {document_id}"
+            
+        material.processing_status = 'Chunking'
+        material.save(update_fields=['processing_status'])
+        
+        generate_chunks_and_embeddings_task.delay(document.id)
+        
+        return f"Successfully OCRed document {document_id}"
+        
+    except Document.DoesNotExist:
+        logger.error(f"Document with ID {document_id} not found")
+        return f"Failed: Document {document_id} not found"
+    except Exception as e:
+        logger.exception(f"Error running OCR for document {document_id}: {e}")
+        
+        try:
+            # Update material status to error
+            document = Document.objects.get(pk=document_id)
+            document.material.processing_status = 'Error'
+            document.material.save(update_fields=['processing_status'])
+        except Exception:
+            pass
+            
+        return f"Failed to OCR document {document_id}: {str(e)}"
+
+
 @shared_task
 def generate_chunks_and_embeddings_task(document_id):
     """
@@ -136,7 +237,7 @@ def generate_chunks_and_embeddings_task(document_id):
         assignment = material.assignment
         unprocessed_materials = AssignmentMaterial.objects.filter(
             assignment=assignment,
-            processing_status__in=['Pending', 'Downloading', 'Downloaded', 'Processing', 'Chunking', 'Embedding']
+            processing_status__in=['Pending', 'Downloading', 'Downloaded', 'Processing', 'OCR', 'Chunking', 'Embedding']
         ).count()
         
         if unprocessed_materials == 0:
@@ -169,6 +270,31 @@ def generate_chunks_and_embeddings_task(document_id):
         return f"Failed to process document {document_id}: {str(e)}"
 
 
+@shared_task
+def build_course_index_task(course_id, index_type=None, rebuild_lexical=False):
+    """
+    Rebuild and, for ANN index types, train the FAISS index of a course.
+    Triggered when a course grows into a different index type, an HNSW
+    index needs compacting after deletes, or an index update failed after
+    its chunks were committed.
+    
+    Args:
+        course_id (int): The ID of the course whose index to rebuild
+        index_type (str, optional): Force an index type instead of choosing by chunk count
+        rebuild_lexical (bool): Also rebuild the course's lexical index
+    """
+    try:
+        logger.info(f"Building FAISS index for course {course_id}")
+        vector_count = CourseIndexStore(course_id).rebuild(index_type)
+        if rebuild_lexical:
+            CourseLexicalIndex(course_id).rebuild()
+        return f"Built index for course {course_id} with {vector_count} vectors"
+        
+    except Exception as e:
+        logger.exception(f"Error building index for course {course_id}: {e}")
+        return f"Failed to build index for course {course_id}: {str(e)}"
+
+
 @shared_task
 def generate_assignment_draft_task(assignment_id):
     """
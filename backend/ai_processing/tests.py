@@ -1,3 +1,38 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .chunking import iter_chunk_spans
+
+
+def count_characters(texts):
+    """One token per non-space character, as WordPiece tokenizers count CJK text."""
+    return [len(''.join(text.split())) for text in texts]
+
+
+class ChunkSizeTests(SimpleTestCase):
+    def assert_chunks_fit(self, text, max_tokens):
+        spans = list(iter_chunk_spans(text, max_tokens=max_tokens, overlap_tokens=0,
+                                      count_tokens=count_characters, anchor_every=0))
+        self.assertGreater(len(spans), 1)
+        for span in spans:
+            self.assertLessEqual(count_characters([span.text])[0], max_tokens)
+            self.assertEqual(text[span.start:span.end], span.text)
+        self.assertEqual(''.join(span.text for span in spans), text)
+        return spans
+
+    def test_unspaced_cjk_splits_at_full_width_terminators(self):
+        sentence = '熵是描述系统无序程度的物理量在热力学中非常重要。'
+        text = sentence * 50
+        spans = self.assert_chunks_fit(text, max_tokens=200)
+        for span in spans:
+            self.assertTrue(span.text.endswith('。'))
+
+    def test_run_without_spaces_or_terminators_splits_between_characters(self):
+        text = '热力学第二定律' * 170 + 'x' * 10
+        self.assert_chunks_fit(text, max_tokens=200)
+
+    def test_long_word_in_spaced_text_is_split(self):
+        text = 'see ' + 'a' * 450 + ' for details'
+        spans = list(iter_chunk_spans(text, max_tokens=200, overlap_tokens=0,
+                                      count_tokens=count_characters, anchor_every=0))
+        self.assertTrue(all(count_characters([span.text])[0] <= 200 for span in spans))
+        self.assertEqual([text[span.start:span.end] for span in spans], [span.text for span in spans])
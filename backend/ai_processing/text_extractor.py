@@ -2,12 +2,27 @@
 import logging
 import io
 import os
+import re
+import codecs
+import mmap
+import time
 import tempfile
-from typing import Dict, Optional, Tuple
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from django.conf import settings
 
 # PDF processing
-import PyPDF2
-import pdfplumber
+from .pdf_extractors import (
+    PyPDF2Engine, get_pdf_engine_chain, is_usable_page_text, summarize_page_stats, timed_extract
+)
+# Format detection and the formats parsed in-house
+from .file_formats import (
+    FIB_ENCRYPTED, FIB_FLAGS_OFFSET, FIB_WHICH_TABLE_STREAM, TEXT_EXTENSIONS, Paragraph, html_to_paragraphs,
+    detect_utf16, olefile, read_doc_paragraphs, read_epub, read_ppt_slides, rtf_to_text, sniff_file_type
+)
 
 # Document processing
 try:
@@ -15,118 +30,580 @@ try:
 except ImportError:
     docx = None
 
+# Charset detection for text that is neither UTF-8 nor marked with a BOM
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
 # Presentation processing
 try:
     from pptx import Presentation
+    from pptx.shapes.picture import Picture
 except ImportError:
     Presentation = None
-
-# For detecting MIME types
-import mimetypes
+    Picture = None
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever a change to extraction alters its output, so cached extractions are redone
+EXTRACTOR_VERSION = '4'
+
+# A file path (read through a memory map) or the raw file content
+FileSource = Union[str, os.PathLike, bytes]
+
+SLIDE_SEPARATOR = "\n\n===== Next Slide =====\n\n"
+
+_heading_style_re = re.compile(r'^(?:Heading (\d)|Title)$')
+
+# Pages timed serially before deciding whether the rest of a PDF is worth a process pool
+PDF_PARALLEL_SAMPLE_PAGES = 8
+
+
+# Leading bytes examined to pick a text encoding, so the whole file is decoded only once
+TEXT_SNIFF_BYTES = 64 * 1024
+
+# UTF-32 LE before UTF-16 LE, whose BOM it starts with
+_text_boms = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+_declared_charset_re = re.compile(
+    rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)|<\?xml[^>]+encoding\s*=\s*["\']([\w.:-]+)', re.I
+)
+
+
+def detect_text_encoding(prefix: bytes, markup: bool = False) -> str:
+    """
+    Pick the encoding of a text file from its first bytes.
+    
+    A BOM wins, then BOM-less UTF-16 recognized from its NUL bytes, then (for
+    HTML/XML) a declared charset, then UTF-8 if the prefix is valid UTF-8,
+    then charset_normalizer's guess, then Windows-1252.
+    
+    Args:
+        prefix (bytes): The first TEXT_SNIFF_BYTES or so of the file
+        markup (bool): Honour <meta charset> and <?xml encoding?> declarations
+        
+    Returns:
+        str: A codec name for bytes.decode
+    """
+    for bom, encoding in _text_boms:
+        if prefix.startswith(bom):
+            return encoding
+            
+    # NUL bytes are valid UTF-8, so UTF-16 has to be ruled out first
+    utf16 = detect_utf16(prefix)
+    if utf16:
+        return utf16
+            
+    if markup:
+        declared = _declared_charset_re.search(prefix)
+        if declared:
+            try:
+                return codecs.lookup((declared.group(1) or declared.group(2)).decode('ascii')).name
+            except LookupError:
+                pass
+                
+    try:
+        # Not final: the prefix may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+        
+    if charset_normalizer is not None:
+        matches = list(charset_normalizer.from_bytes(prefix))
+        if matches:
+            best = matches[0]
+            # Latin code pages often tie on Western text; Windows-1252 is by far the most likely of them
+            for match in matches:
+                if match.encoding == 'cp1252' and match.chaos <= best.chaos and match.coherence >= best.coherence:
+                    return 'cp1252'
+            return best.encoding
+    return 'cp1252'
+
+
+def iter_text_parts(source: FileSource, encoding: str = None, block_size: int = None) -> Iterator[str]:
+    """
+    Stream a text file as decoded parts, reading a block at a time.
+    
+    Parts end where the file has a blank line, and "\n\n".join(parts) is the
+    file's text, so they can go straight into iter_chunk_spans(). A run of
+    block_size characters without a blank line (e.g. CSV rows) is cut at its
+    last line break instead, which the joined text turns into a blank line.
+    
+    Args:
+        source (FileSource): Text file path or raw file content
+        encoding (str, optional): Codec, detected from the first bytes by default
+        block_size (int, optional): Bytes per read, defaults to settings.TEXT_STREAM_BLOCK_BYTES
+        
+    Yields:
+        str: Decoded parts of the text, in order
+    """
+    block_size = block_size or settings.TEXT_STREAM_BLOCK_BYTES
+    
+    with open_file_source(source) as stream:
+        if encoding is None:
+            encoding = detect_text_encoding(stream.read(TEXT_SNIFF_BYTES))
+            stream.seek(0)
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        
+        pending = ''
+        for block in iter(lambda: stream.read(block_size), b''):
+            pending += decoder.decode(block)
+            cut = pending.rfind('\n\n')
+            if cut >= 0:
+                yield pending[:cut]
+                pending = pending[cut + 2:]
+            elif len(pending) >= block_size:
+                # A lone line break: not at either end, where it may belong to a blank line split by a block
+                cut = pending.rfind('\n', 1, len(pending) - 1)
+                if cut > 0:
+                    yield pending[:cut]
+                    pending = pending[cut + 1:]
+                    
+        # Always yielded, even empty, so the joined text keeps a trailing blank line
+        yield pending + decoder.decode(b'', final=True)
+
+
+def iter_document_text(text: str, metadata: Dict, source: FileSource = None) -> Iterator[str]:
+    """
+    Yield a document's text for chunking: the stored text, or for text files
+    extracted with streamed=True, parts decoded from the file as they are read.
+    
+    Args:
+        text (str): The stored extracted text
+        metadata (dict): Extraction metadata
+        source (FileSource, optional): The original file, needed for streamed text
+        
+    Yields:
+        str: Parts of the text, to be treated as separated by blank lines
+    """
+    if not metadata.get('streamed'):
+        yield text
+        return
+    if source is None:
+        raise FileNotFoundError("The file of a streamed text document is not available")
+    yield from iter_text_parts(source, metadata.get('encoding'))
+
+
+class ExtractedPage(NamedTuple):
+    """Text of a single page, yielded by the streaming extraction API."""
+    page_number: int  # 1-based
+    text: str
+    metadata: Dict
+
+
+@contextmanager
+def open_file_source(source: FileSource):
+    """
+    Open a file source as an independent, seekable binary stream.
+    
+    Paths are memory-mapped so parsers only touch the pages they read and
+    the OS can drop them again, instead of copying the whole file into memory.
+    
+    Args:
+        source (FileSource): File path or raw file content
+        
+    Yields:
+        A readable, seekable binary stream
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+        return
+        
+    with open(source, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            yield f
+            return
+        with mapped:
+            yield mapped
+
+
+def get_extractor_version() -> str:
+    """Identify the extraction code and configured PDF engine chain, for extraction cache keys."""
+    return f"{EXTRACTOR_VERSION}:{','.join(engine.name for engine in get_pdf_engine_chain())}"
+
+
+def get_available_cores() -> int:
+    """Return the number of CPU cores this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_pdf_extraction_workers() -> int:
+    """
+    Return how many processes parallel PDF extraction may use: the
+    PDF_EXTRACTION_WORKERS setting, or the cores available to this process.
+    """
+    return getattr(settings, 'PDF_EXTRACTION_WORKERS', 0) or get_available_cores()
+
+
+def _extract_pdf_page_range(source: FileSource, start: int, end: int) -> List[ExtractedPage]:
+    """Process pool entry point: extract pages [start, end) of a PDF."""
+    return list(TextExtractor.iter_pdf_pages(source, page_range=(start, end)))
+
+
 class TextExtractor:
     """
     Utility class for extracting text from various file formats.
-    Supports PDF, DOCX, PPTX, and plain text files.
+    Supports PDF, DOCX and legacy DOC, PPTX and legacy PPT, RTF, HTML, EPUB
+    and plain text files.
     """
     
     @staticmethod
     def extract_text(file_content: bytes, file_name: str = None) -> Tuple[str, Dict, int]:
         """
-        Extract text from file content based on file extension or detected MIME type.
+        Extract text from file content, dispatching on the format sniffed from
+        its leading bytes rather than the file extension.
         
         Args:
             file_content (bytes): Binary file content
-            file_name (str, optional): Original filename with extension
+            file_name (str, optional): Original filename with extension, only
+                used to tell text formats apart
             
         Returns:
             tuple: (extracted_text, metadata, page_count)
                 - extracted_text (str): The extracted text content
-                - metadata (dict): Additional metadata about the extraction
+                - metadata (dict): Additional metadata about the extraction, including the file_type
                 - page_count (int): Number of pages in the document
         """
-        if file_name:
-            file_extension = os.path.splitext(file_name)[1].lower()
+        file_type = sniff_file_type(io.BytesIO(file_content), file_name)
+        return TextExtractor._extract_by_type(file_content, file_type)
+    
+    @staticmethod
+    def extract_text_from_file(file_path: str, file_name: str = None) -> Tuple[str, Dict, int]:
+        """
+        Extract text from a file on disk without reading it into memory first.
+        PDFs are parsed a page at a time from a memory map and very large text
+        files are decoded a block at a time; other formats are small enough
+        to be read whole.
+        
+        Args:
+            file_path (str): Path of the file to extract
+            file_name (str, optional): Original filename with extension, defaults to the path's name
+            
+        Returns:
+            tuple: (extracted_text, metadata, page_count)
+        """
+        with open_file_source(file_path) as stream:
+            file_type = sniff_file_type(stream, file_name or file_path)
+        if file_type == '.pdf':
+            return TextExtractor._extract_by_type(file_path, file_type)
+        if file_type in TEXT_EXTENSIONS and os.path.getsize(file_path) >= settings.TEXT_STREAMING_MIN_BYTES:
+            return TextExtractor._extract_from_large_text(file_path, file_type)
+            
+        with open(file_path, 'rb') as f:
+            return TextExtractor._extract_by_type(f.read(), file_type)
+    
+    @staticmethod
+    def _extract_by_type(source: FileSource, file_type: str) -> Tuple[str, Dict, int]:
+        """
+        Run the extractor for a sniffed file type.
+        
+        Args:
+            source (FileSource): Raw file content, or a file path for PDFs
+            file_type (str): Format from sniff_file_type()
+            
+        Returns:
+            tuple: (extracted_text, metadata, page_count)
+        """
+        if file_type == '.pdf':
+            result = TextExtractor._extract_from_pdf(source)
         else:
-            # Try to detect MIME type from content
-            file_extension = ".txt"  # Default
-            
-        # Create a file-like object from the byte content
-        file_stream = io.BytesIO(file_content)
-        
-        # Extract based on file extension
-        if file_extension in ('.pdf'):
-            return TextExtractor._extract_from_pdf(file_stream)
-        elif file_extension in ('.docx', '.doc'):
-            return TextExtractor._extract_from_docx(file_stream)
-        elif file_extension in ('.pptx', '.ppt'):
-            return TextExtractor._extract_from_pptx(file_stream)
-        elif file_extension in ('.txt', '.md', '.rtf'):
-            return TextExtractor._extract_from_text(file_stream)
+            file_stream = io.BytesIO(source)
+            if file_type == '.docx':
+                result = TextExtractor._extract_from_docx(file_stream)
+            elif file_type == '.doc':
+                result = TextExtractor._extract_from_doc(file_stream)
+            elif file_type == '.pptx':
+                result = TextExtractor._extract_from_pptx(file_stream)
+            elif file_type == '.ppt':
+                result = TextExtractor._extract_from_ppt(file_stream)
+            elif file_type == '.rtf':
+                result = TextExtractor._extract_from_rtf(file_stream)
+            elif file_type == '.html':
+                result = TextExtractor._extract_from_html(file_stream)
+            elif file_type == '.epub':
+                result = TextExtractor._extract_from_epub(file_stream)
+            elif file_type in ('.xlsx', '.xls', '.zip', '.bin'):
+                # Decoding binaries as text only produces garbage for the index
+                logger.warning(f"Unsupported file type: {file_type}")
+                result = "", {"extraction_error": f"Unsupported file type {file_type}"}, 0
+            else:
+                result = TextExtractor._extract_from_text(file_stream)
+        
+        extracted_text, metadata, page_count = result
+        metadata['file_type'] = file_type
+        return extracted_text, metadata, page_count
+    
+    @staticmethod
+    def iter_pdf_pages(source: FileSource,
+                       document_metadata: Dict = None,
+                       page_range: Tuple[int, int] = None) -> Iterator[ExtractedPage]:
+        """
+        Stream the text of a PDF one page at a time.
+        
+        Each page goes through the PDF_EXTRACTOR_CHAIN engines, fastest first,
+        until one produces text passing is_usable_page_text(); slower engines
+        are only opened once a page needs them. Each page's parsed objects are
+        released before the next page is read, so memory stays flat regardless
+        of page count and consumers can start chunking before the last page
+        is extracted.
+        
+        Args:
+            source (FileSource): PDF file path or raw file content
+            document_metadata (dict, optional): Filled with the PDF's document
+                info and 'page_count' once the file is opened
+            page_range (tuple, optional): 0-based (start, end) page slice to extract
+                
+        Yields:
+            ExtractedPage: Page number, text and per-page metadata (extractor,
+                seconds, engine_seconds, fallbacks), in page order
+        """
+        chain = get_pdf_engine_chain()
+        
+        with ExitStack() as stack:
+            engines = []
+            
+            def open_engine(position):
+                # Every engine parses from its own stream so they never share a file position
+                while len(engines) <= position:
+                    engine = chain[len(engines)](stack.enter_context(open_file_source(source)))
+                    stack.callback(engine.close)
+                    engines.append(engine)
+                return engines[position]
+            
+            first_engine = open_engine(0)
+            page_count = first_engine.page_count
+            
+            if document_metadata is not None:
+                document_metadata.update(first_engine.get_metadata())
+                document_metadata['page_count'] = page_count
+            
+            start, end = page_range or (0, page_count)
+            for index in range(start, min(end, page_count)):
+                page_text = ""
+                extractor = chain[-1].name
+                engine_seconds = {}
+                
+                for position in range(len(chain)):
+                    engine = open_engine(position)
+                    candidate, seconds = timed_extract(engine, index)
+                    engine_seconds[engine.name] = seconds
+                    
+                    # Keep the latest non-empty text in case no engine passes the quality check
+                    if candidate.strip():
+                        page_text, extractor = candidate, engine.name
+                    if is_usable_page_text(candidate):
+                        break
+                        
+                yield ExtractedPage(index + 1, page_text, {
+                    'extractor': extractor,
+                    'seconds': sum(engine_seconds.values()),
+                    'engine_seconds': engine_seconds,
+                    'fallbacks': len(engine_seconds) - 1,
+                })
+    
+    @staticmethod
+    def extract_pdf_pages(source: FileSource, document_metadata: Dict = None) -> List[ExtractedPage]:
+        """
+        Extract every page of a PDF, serially at first. Once a sample of pages
+        shows the rest would take at least PDF_PARALLEL_MIN_SECONDS (typically
+        because pages need the slower engines) and at least
+        PDF_PARALLEL_MIN_PAGES remain, the remaining page range is split across
+        a process pool. Starting the pool costs seconds, so ordinary documents
+        the fast engine reads in well under that never pay for it. Single-core
+        hosts and daemonic processes (which may not start children) always
+        extract serially.
+        
+        Args:
+            source (FileSource): PDF file path or raw file content
+            document_metadata (dict, optional): Filled as by iter_pdf_pages()
+            
+        Returns:
+            List[ExtractedPage]: Pages in page order
+        """
+        if document_metadata is None:
+            document_metadata = {}
+            
+        # The first page also tells us the page count; it includes opening the file, so it isn't sampled
+        serial_pages = TextExtractor.iter_pdf_pages(source, document_metadata)
+        pages = []
+        for page in serial_pages:
+            pages.append(page)
+            break
+            
+        page_count = document_metadata.get('page_count', 0)
+        min_pages = settings.PDF_PARALLEL_MIN_PAGES
+        if (page_count - len(pages) < min_pages
+                or min(get_pdf_extraction_workers(), page_count - len(pages)) < 2
+                or multiprocessing.current_process().daemon):
+            pages.extend(serial_pages)
+            return pages
+            
+        sampled_seconds = 0.0
+        for page in serial_pages:
+            pages.append(page)
+            sampled_seconds += page.metadata['seconds']
+            sampled_pages = len(pages) - 1
+            remaining = page_count - len(pages)
+            if remaining < min_pages:
+                # Too little left to be worth a pool
+                pages.extend(serial_pages)
+                return pages
+            if (sampled_pages >= PDF_PARALLEL_SAMPLE_PAGES
+                    and sampled_seconds / sampled_pages * remaining >= settings.PDF_PARALLEL_MIN_SECONDS):
+                break
         else:
-            # Default to trying to read as text
-            logger.warning(f"Unsupported file extension: {file_extension}. Attempting to extract as plain text.")
-            return TextExtractor._extract_from_text(file_stream)
+            return pages
+        serial_pages.close()
+        
+        # Contiguous ranges, a few per worker so one slow (e.g. scanned) range doesn't hold up the rest
+        first = len(pages)
+        workers = min(get_pdf_extraction_workers(), page_count - first)
+        range_size = -(-(page_count - first) // (workers * 4))
+        ranges = [(start, min(start + range_size, page_count)) for start in range(first, page_count, range_size)]
+        
+        try:
+            # Spawn so workers don't inherit the parent's threads or loaded models
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = [executor.submit(_extract_pdf_page_range, source, start, end) for start, end in ranges]
+                for future in futures:
+                    pages.extend(future.result())
+        except Exception as e:
+            logger.warning(f"Parallel PDF extraction failed, extracting serially: {str(e)}")
+            pages = pages[:first]
+            pages.extend(TextExtractor.iter_pdf_pages(source, page_range=(first, page_count)))
+            
+        logger.info(f"Extracted {page_count} PDF pages, {page_count - first} of them with {workers} processes")
+        return pages
     
     @staticmethod
-    def _extract_from_pdf(file_stream: io.BytesIO) -> Tuple[str, Dict, int]:
+    def _extract_from_pdf(source: FileSource) -> Tuple[str, Dict, int]:
         """
-        Extract text from PDF file using a combination of PyPDF2 and pdfplumber.
+        Extract text from a PDF, in parallel for large documents.
+        
+        Metadata includes page_map, [page_number, offset] pairs locating each
+        page in the text, section_map, [offset, heading path] pairs from
+        the PDF's outline (bookmarks) where it has one, and ocr_pages, the
+        pages with no text layer that draw an image (usually scans).
         
         Args:
-            file_stream (io.BytesIO): PDF file content as BytesIO
+            source (FileSource): PDF file path or raw file content
             
         Returns:
             tuple: (extracted_text, metadata, page_count)
         """
-        full_text = ""
         metadata = {}
-        page_count = 0
         
         try:
-            # Try with pdfplumber first (better at text extraction)
-            with pdfplumber.open(file_stream) as pdf:
-                page_count = len(pdf.pages)
-                pages_text = []
-                
-                # Get metadata
-                if hasattr(pdf, 'metadata') and pdf.metadata:
-                    metadata = {k: str(v) for k, v in pdf.metadata.items()}
-                
-                # Extract each page
-                for page in pdf.pages:
-                    page_text = page.extract_text() or ""
-                    pages_text.append(page_text)
-                
-                full_text = "\n\n".join(pages_text)
-                
-            # If pdfplumber didn't get text, try PyPDF2 as fallback
-            if not full_text.strip():
-                file_stream.seek(0)  # Reset stream position
-                reader = PyPDF2.PdfReader(file_stream)
-                page_count = len(reader.pages)
-                
-                # Get metadata
-                if reader.metadata:
-                    metadata = {k: str(v) for k, v in reader.metadata.items()}
-                
-                # Extract each page
-                pages_text = []
-                for page in reader.pages:
-                    page_text = page.extract_text() or ""
-                    pages_text.append(page_text)
-                
-                full_text = "\n\n".join(pages_text)
+            pages = TextExtractor.extract_pdf_pages(source, metadata)
+            
+            # Record where each page starts in the joined text
+            page_map = []
+            offset = 0
+            for page in pages:
+                page_map.append([page.page_number, offset])
+                offset += len(page.text) + 2
+            full_text = "\n\n".join(page.text for page in pages)
+            
+            page_count = metadata.pop('page_count', len(pages))
+            metadata['page_map'] = page_map
+            metadata['section_map'] = TextExtractor._get_pdf_section_map(source, full_text, page_map)
+            metadata['extraction'] = summarize_page_stats([page.metadata for page in pages])
+            empty_pages = [page.page_number for page in pages if not page.text.strip()]
+            metadata['ocr_pages'] = TextExtractor._get_pdf_image_pages(source, empty_pages) if empty_pages else []
             
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {str(e)}")
-            full_text = ""
-            metadata = {"extraction_error": str(e)}
+            return "", {"extraction_error": str(e)}, 0
         
         return full_text, metadata, page_count
     
+    @staticmethod
+    def _get_pdf_image_pages(source: FileSource, page_numbers: List[int]) -> List[int]:
+        """
+        Keep the pages that draw an image, so blank pages aren't sent to OCR.
+        
+        Args:
+            source (FileSource): PDF file path or raw file content
+            page_numbers (List[int]): 1-based pages without a text layer
+            
+        Returns:
+            list: The page numbers with images; all of them if the PDF can't be inspected
+        """
+        try:
+            with open_file_source(source) as stream:
+                engine = PyPDF2Engine(stream)
+                return [page_number for page_number in page_numbers if engine.page_has_images(page_number - 1)]
+        except Exception as e:
+            logger.warning(f"Could not inspect PDF pages for images: {str(e)}")
+            return page_numbers
+    
+    @staticmethod
+    def _get_pdf_section_map(source: FileSource, full_text: str, page_map: List[List[int]]) -> List:
+        """
+        Map the PDF outline onto the extracted text. Each heading is placed where
+        its title appears on its target page, or at the start of that page.
+        
+        Returns:
+            list: [offset, heading path] pairs sorted by offset
+        """
+        try:
+            with open_file_source(source) as stream:
+                outline = PyPDF2Engine(stream).get_outline()
+        except Exception as e:
+            logger.warning(f"Could not read PDF outline: {str(e)}")
+            return []
+        
+        page_offsets = [offset for _, offset in page_map] + [len(full_text)]
+        section_map = []
+        for page_index, path in outline:
+            if page_index >= len(page_map):
+                continue
+            page_start, page_end = page_offsets[page_index], page_offsets[page_index + 1]
+            found = full_text.find(path[-1], page_start, page_end)
+            section_map.append([found if found >= 0 else page_start, path])
+        
+        section_map.sort(key=lambda entry: entry[0])
+        return section_map
+    
+    @staticmethod
+    def _join_paragraphs(paragraphs: List[Paragraph], section_map: List = None,
+                         offset: int = 0) -> Tuple[str, List]:
+        """
+        Join paragraphs with blank lines, recording a section_map entry for each heading.
+        
+        Args:
+            paragraphs (List[Paragraph]): (text, heading level or None) pairs
+            section_map (list, optional): Section map to extend; its last entry's
+                path is the heading path in force before these paragraphs
+            offset (int): Offset of the first paragraph in the document text
+            
+        Returns:
+            tuple: (text, section_map) with [offset, heading path] entries
+        """
+        section_map = [] if section_map is None else section_map
+        headings = list(section_map[-1][1]) if section_map else []
+        texts = []
+        for text, level in paragraphs:
+            if level and text.strip():
+                headings = headings[:level - 1] + [text.strip()]
+                section_map.append([offset, list(headings)])
+            texts.append(text)
+            offset += len(text) + 2
+        return "\n\n".join(texts), section_map
+    
     @staticmethod
     def _extract_from_docx(file_stream: io.BytesIO) -> Tuple[str, Dict, int]:
         """
@@ -145,15 +622,21 @@ class TextExtractor:
         try:
             doc = docx.Document(file_stream)
             
-            # Extract text
-            full_text = "\n\n".join([para.text for para in doc.paragraphs])
+            # Extract text, tracking the heading path from Title/Heading N paragraph styles
+            paragraphs = []
+            for para in doc.paragraphs:
+                style_match = _heading_style_re.match(para.style.name if para.style is not None else '')
+                paragraphs.append((para.text, int(style_match.group(1) or 1) if style_match else None))
+                
+            full_text, section_map = TextExtractor._join_paragraphs(paragraphs)
             
             # Get metadata
             metadata = {
                 "title": doc.core_properties.title or "",
                 "author": doc.core_properties.author or "",
                 "created": str(doc.core_properties.created) if doc.core_properties.created else "",
-                "modified": str(doc.core_properties.modified) if doc.core_properties.modified else ""
+                "modified": str(doc.core_properties.modified) if doc.core_properties.modified else "",
+                "section_map": section_map
             }
             
             # Page count is trickier for DOCX, estimating
@@ -165,10 +648,58 @@ class TextExtractor:
             logger.error(f"Error extracting text from DOCX: {str(e)}")
             return "", {"extraction_error": str(e)}, 0
             
+    @staticmethod
+    def _extract_from_doc(file_stream: io.BytesIO) -> Tuple[str, Dict, int]:
+        """
+        Extract text from a legacy Word 97-2003 (.doc) file.
+        
+        Args:
+            file_stream (io.BytesIO): DOC file content as BytesIO
+            
+        Returns:
+            tuple: (extracted_text, metadata, page_count)
+        """
+        if not olefile:
+            logger.error("olefile package is not installed")
+            return "", {"extraction_error": "olefile not installed"}, 0
+            
+        try:
+            with olefile.OleFileIO(file_stream) as ole:
+                word_document = ole.openstream('WordDocument').read()
+                flags = int.from_bytes(word_document[FIB_FLAGS_OFFSET:FIB_FLAGS_OFFSET + 2], 'little')
+                if flags & FIB_ENCRYPTED:
+                    return "", {"extraction_error": "Document is encrypted"}, 0
+                table = ole.openstream('1Table' if flags & FIB_WHICH_TABLE_STREAM else '0Table').read()
+                properties = ole.get_metadata()
+                
+            paragraphs = read_doc_paragraphs(word_document, table)
+            full_text = "\n\n".join(paragraph for paragraph in paragraphs if paragraph.strip())
+            
+            metadata = {
+                "title": TextExtractor._decode_ole_property(properties.title),
+                "author": TextExtractor._decode_ole_property(properties.author),
+                "created": str(properties.create_time) if properties.create_time else "",
+                "modified": str(properties.last_saved_time) if properties.last_saved_time else "",
+            }
+            
+            page_count = properties.num_pages or max(1, len(paragraphs) // 10)
+            return full_text, metadata, page_count
+            
+        except Exception as e:
+            logger.error(f"Error extracting text from DOC: {str(e)}")
+            return "", {"extraction_error": str(e)}, 0
+    
+    @staticmethod
+    def _decode_ole_property(value) -> str:
+        if isinstance(value, bytes):
+            return value.decode('cp1252', errors='replace').strip('\x00 ')
+        return str(value or "")
+    
     @staticmethod
     def _extract_from_pptx(file_stream: io.BytesIO) -> Tuple[str, Dict, int]:
         """
-        Extract text from PPTX file.
+        Extract text from PPTX file. Slides without text that hold pictures
+        are listed in metadata['ocr_pages'].
         
         Args:
             file_stream (io.BytesIO): PPTX file content as BytesIO
@@ -183,20 +714,38 @@ class TextExtractor:
         try:
             presentation = Presentation(file_stream)
             
-            # Extract text from each slide
+            # Extract text from each slide, recording where each slide starts and its title
             slides_text = []
-            for slide in presentation.slides:
+            page_map = []
+            section_map = []
+            ocr_pages = []
+            offset = 0
+            for number, slide in enumerate(presentation.slides, start=1):
                 slide_text = []
+                has_picture = False
                 for shape in slide.shapes:
                     if hasattr(shape, "text") and shape.text:
                         slide_text.append(shape.text)
+                    has_picture = has_picture or isinstance(shape, Picture)
                 slides_text.append("\n".join(slide_text))
+                if has_picture and not slides_text[-1].strip():
+                    ocr_pages.append(number)
+                
+                page_map.append([number, offset])
+                title_shape = slide.shapes.title
+                title = title_shape.text.strip() if title_shape is not None and title_shape.has_text_frame else ""
+                if title:
+                    section_map.append([offset, [title]])
+                offset += len(slides_text[-1]) + len(SLIDE_SEPARATOR)
             
-            full_text = "\n\n===== Next Slide =====\n\n".join(slides_text)
+            full_text = SLIDE_SEPARATOR.join(slides_text)
             
-            # Minimal metadata
             metadata = {
                 "slide_count": len(presentation.slides),
+                "page_unit": "slide",
+                "page_map": page_map,
+                "section_map": section_map,
+                "ocr_pages": ocr_pages,
             }
             
             return full_text, metadata, len(presentation.slides)
@@ -205,6 +754,136 @@ class TextExtractor:
             logger.error(f"Error extracting text from PPTX: {str(e)}")
             return "", {"extraction_error": str(e)}, 0
     
+    @staticmethod
+    def _extract_from_ppt(file_stream: io.BytesIO) -> Tuple[str, Dict, int]:
+        """
+        Extract text from a legacy PowerPoint 97-2003 (.ppt) file.
+        
+        Args:
+            file_stream (io.BytesIO): PPT file content as BytesIO
+            
+        Returns:
+            tuple: (extracted_text, metadata, page_count)
+        """
+        if not olefile:
+            logger.error("olefile package is not installed")
+            return "", {"extraction_error": "olefile not installed"}, 0
+            
+        try:
+            with olefile.OleFileIO(file_stream) as ole:
+                slides_text = read_ppt_slides(ole.openstream('PowerPoint Document').read())
+                
+            page_map = []
+            offset = 0
+            for number, slide_text in enumerate(slides_text, start=1):
+                page_map.append([number, offset])
+                offset += len(slide_text) + len(SLIDE_SEPARATOR)
+                
+            metadata = {
+                "slide_count": len(slides_text),
+                "page_unit": "slide",
+                "page_map": page_map,
+            }
+            
+            return SLIDE_SEPARATOR.join(slides_text), metadata, len(slides_text)
+            
+        except Exception as e:
+            logger.error(f"Error extracting text from PPT: {str(e)}")
+            return "", {"extraction_error": str(e)}, 0
+    
+    @staticmethod
+    def _extract_from_rtf(file_stream: io.BytesIO) -> Tuple[str, Dict, int]:
+        """
+        Extract text from an RTF file.
+        
+        Args:
+            file_stream (io.BytesIO): RTF file content as BytesIO
+            
+        Returns:
+            tuple: (extracted_text, metadata, page_count)
+        """
+        try:
+            # RTF is 7-bit; anything else is escaped and decoded per the document's code page
+            text = rtf_to_text(file_stream.read().decode('latin-1'))
+            paragraphs = text.count('\n\n') + 1
+            return text, {}, max(1, paragraphs // 10)
+            
+        except Exception as e:
+            logger.error(f"Error extracting text from RTF: {str(e)}")
+            return "", {"extraction_error": str(e)}, 0
+    
+    @staticmethod
+    def _extract_from_html(file_stream: io.BytesIO) -> Tuple[str, Dict, int]:
+        """
+        Extract the visible text of an HTML file, with a section_map from its h1-h6 headings.
+        
+        Args:
+            file_stream (io.BytesIO): HTML file content as BytesIO
+            
+        Returns:
+            tuple: (extracted_text, metadata, page_count)
+        """
+        try:
+            text, _ = TextExtractor._decode_text(file_stream, markup=True)
+            paragraphs, title = html_to_paragraphs(text)
+            full_text, section_map = TextExtractor._join_paragraphs(paragraphs)
+            
+            metadata = {"title": title, "section_map": section_map}
+            return full_text, metadata, max(1, len(paragraphs) // 10)
+            
+        except Exception as e:
+            logger.error(f"Error extracting text from HTML: {str(e)}")
+            return "", {"extraction_error": str(e)}, 0
+    
+    @staticmethod
+    def _extract_from_epub(file_stream: io.BytesIO) -> Tuple[str, Dict, int]:
+        """
+        Extract text from an EPUB's content documents in reading order, with a
+        section_map from their headings.
+        
+        Args:
+            file_stream (io.BytesIO): EPUB file content as BytesIO
+            
+        Returns:
+            tuple: (extracted_text, metadata, page_count)
+        """
+        try:
+            documents, metadata = read_epub(file_stream)
+            
+            parts = []
+            section_map = []
+            offset = 0
+            for _, content in documents:
+                paragraphs, _ = html_to_paragraphs(content.decode('utf-8', errors='replace'))
+                if not paragraphs:
+                    continue
+                part, section_map = TextExtractor._join_paragraphs(paragraphs, section_map, offset)
+                parts.append(part)
+                offset += len(part) + 2
+                
+            metadata['section_map'] = section_map
+            metadata['chapter_count'] = len(parts)
+            return "\n\n".join(parts), metadata, max(1, len(parts))
+            
+        except Exception as e:
+            logger.error(f"Error extracting text from EPUB: {str(e)}")
+            return "", {"extraction_error": str(e)}, 0
+    
+    @staticmethod
+    def _decode_text(file_stream: io.BytesIO, markup: bool = False) -> Tuple[str, str]:
+        """
+        Decode a text file in one pass, with the encoding detected from its first bytes.
+        
+        Returns:
+            tuple: (text, encoding)
+        """
+        buffer = file_stream.getbuffer()
+        encoding = detect_text_encoding(bytes(buffer[:TEXT_SNIFF_BYTES]), markup)
+        try:
+            return str(buffer, encoding, 'replace'), encoding
+        finally:
+            buffer.release()
+    
     @staticmethod
     def _extract_from_text(file_stream: io.BytesIO) -> Tuple[str, Dict, int]:
         """
@@ -217,22 +896,7 @@ class TextExtractor:
             tuple: (extracted_text, metadata, page_count)
         """
         try:
-            # Try common encodings
-            encodings = ['utf-8', 'latin-1', 'ascii']
-            text = None
-            
-            for encoding in encodings:
-                try:
-                    file_stream.seek(0)
-                    text = file_stream.read().decode(encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            if text is None:
-                # If all attempts fail, try with errors='replace'
-                file_stream.seek(0)
-                text = file_stream.read().decode('utf-8', errors='replace')
+            text, encoding = TextExtractor._decode_text(file_stream)
             
             # Count lines as rough page estimate
             lines = text.count('\n') + 1
@@ -243,63 +907,40 @@ class TextExtractor:
         except Exception as e:
             logger.error(f"Error extracting text from text file: {str(e)}")
             return "", {"extraction_error": str(e)}, 0
-
-
-def chunk_text(text: str, chunk_size: int = 1500, overlap: int = 150) -> list:
-    """
-    Split a text into smaller chunks with specified size and overlap.
-    
-    Args:
-        text (str): The text to chunk
-        chunk_size (int): Target size of each chunk in characters
-        overlap (int): Number of characters to overlap between chunks
-        
-    Returns:
-        list: List of text chunks
-    """
-    if not text or not text.strip():
-        return []
-        
-    # Use paragraphs as natural break points
-    paragraphs = text.split('\n\n')
-    chunks = []
-    current_chunk = []
-    current_size = 0
     
-    for paragraph in paragraphs:
-        paragraph_clean = paragraph.strip()
-        paragraph_size = len(paragraph_clean)
-        
-        if paragraph_size == 0:
-            continue
-            
-        # If adding this paragraph exceeds the chunk size and we already have content
-        if current_size + paragraph_size > chunk_size and current_size > 0:
-            # Save the current chunk
-            chunks.append('\n\n'.join(current_chunk))
-            
-            # Start a new chunk with overlap by keeping some paragraphs
-            overlap_size = 0
-            overlap_paragraphs = []
-            
-            # Add paragraphs from the end until we reach desired overlap
-            for p in reversed(current_chunk):
-                if overlap_size + len(p) <= overlap:
-                    overlap_paragraphs.insert(0, p)
-                    overlap_size += len(p)
-                else:
-                    break
-                    
-            # Start new chunk with overlap paragraphs
-            current_chunk = overlap_paragraphs
-            current_size = overlap_size
+    @staticmethod
+    def _extract_from_large_text(file_path: str, file_type: str) -> Tuple[str, Dict, int]:
+        """
+        Scan a text file too large to store as one string. Nothing is kept:
+        the file is decoded a block at a time through iter_text_parts() only
+        to count characters and lines, and the chunker later streams the
+        same parts from the file (see iter_document_text()).
         
-        # Add the current paragraph to the chunk
-        current_chunk.append(paragraph_clean)
-        current_size += paragraph_size
-    
-    # Don't forget the last chunk
-    if current_chunk:
-        chunks.append('\n\n'.join(current_chunk))
-    
-    return chunks
\ No newline at end of file
+        Args:
+            file_path (str): Path of the text file
+            file_type (str): Format from sniff_file_type()
+            
+        Returns:
+            tuple: ("", metadata, page_count), metadata marking the text as
+                streamed with its encoding and char_count
+        """
+        try:
+            with open(file_path, 'rb') as f:
+                encoding = detect_text_encoding(f.read(TEXT_SNIFF_BYTES))
+            
+            char_count = 0
+            lines = 1
+            has_text = False
+            for part in iter_text_parts(file_path, encoding):
+                char_count += len(part)
+                lines += part.count('\n')
+                has_text = has_text or bool(part.strip())
+            if not has_text:
+                return "", {"encoding": encoding, "file_type": file_type}, 0
+            
+            metadata = {"encoding": encoding, "file_type": file_type, "streamed": True, "char_count": char_count}
+            return "", metadata, max(1, lines // 30)
+            
+        except Exception as e:
+            logger.error(f"Error extracting text from text file: {str(e)}")
+            return "", {"extraction_error": str(e)}, 0
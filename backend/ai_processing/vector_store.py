@@ -0,0 +1,516 @@
+import os
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from core.utils import get_configuration_value
+
+from .retrieval_cache import bump_course_index_version
+
+# FAISS for vector storage/search
+import faiss
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Process-wide cache of loaded (memory-mapped) indices: course_id -> (mtime, index), least recently used
+# first and bounded by settings.FAISS_LOADED_INDICES_MAX so long-lived workers don't map every course
+_loaded_indices: OrderedDict[int, Tuple[int, faiss.Index]] = OrderedDict()
+_loaded_indices_lock = threading.Lock()
+
+# Supported index types
+INDEX_FLAT = 'flat'
+INDEX_HNSW = 'hnsw'
+INDEX_IVF = 'ivf'
+INDEX_IVFPQ = 'ivfpq'
+INDEX_TYPES = (INDEX_FLAT, INDEX_HNSW, INDEX_IVF, INDEX_IVFPQ)
+
+# Tunables, overridable through core.ConfigurationSetting
+INDEX_TUNING_DEFAULTS = {
+    'RAG_INDEX_TYPE': 'auto',  # 'auto' or one of INDEX_TYPES
+    'RAG_HNSW_MIN_CHUNKS': 50000,
+    'RAG_IVF_MIN_CHUNKS': 250000,
+    'RAG_IVFPQ_MIN_CHUNKS': 1000000,
+    'RAG_HNSW_M': 32,
+    'RAG_HNSW_EF_CONSTRUCTION': 80,
+    'RAG_HNSW_EF_SEARCH': 64,
+    'RAG_IVF_NLIST': 0,  # 0 = 4 * sqrt(chunk count)
+    'RAG_IVF_NPROBE': 16,
+    'RAG_IVFPQ_M': 16,  # Sub-quantizers; must divide the embedding dimension
+    'RAG_INDEX_TRAIN_SAMPLE': 100000,  # Max vectors used to train IVF indices
+}
+
+
+def get_index_tuning(*keys: str) -> Dict[str, object]:
+    """
+    Read index tunables from core.ConfigurationSetting, falling back to
+    INDEX_TUNING_DEFAULTS. Values are coerced to the default's type (settings
+    stored as strings, like "5000", are common); invalid values are logged and
+    replaced by the default.
+
+    Args:
+        *keys (str): Keys to read; all tunables when omitted
+
+    Returns:
+        dict: Tunable values keyed by setting name
+    """
+    tuning = {}
+    for key in (keys or INDEX_TUNING_DEFAULTS):
+        default = INDEX_TUNING_DEFAULTS[key]
+        value = get_configuration_value(key, default)
+        try:
+            if key == 'RAG_INDEX_TYPE':
+                value = str(value).strip().lower()
+                if value != 'auto' and value not in INDEX_TYPES:
+                    raise ValueError(f"not 'auto' or one of {INDEX_TYPES}")
+            else:
+                value = int(value)
+                if value < 0:
+                    raise ValueError("must not be negative")
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Invalid index setting {key}={value!r} ({e}), using {default!r}")
+            value = default
+        tuning[key] = value
+    return tuning
+
+
+def select_index_type(chunk_count: int, tuning: Dict[str, object] = None) -> str:
+    """
+    Pick an index type for a corpus size: exact search for small courses,
+    HNSW for medium ones and IVF/IVF-PQ for the largest.
+    """
+    tuning = tuning or get_index_tuning(
+        'RAG_INDEX_TYPE', 'RAG_HNSW_MIN_CHUNKS', 'RAG_IVF_MIN_CHUNKS', 'RAG_IVFPQ_MIN_CHUNKS'
+    )
+
+    configured = tuning['RAG_INDEX_TYPE']
+    if configured in INDEX_TYPES:
+        return configured
+
+    if chunk_count >= tuning['RAG_IVFPQ_MIN_CHUNKS']:
+        return INDEX_IVFPQ
+    if chunk_count >= tuning['RAG_IVF_MIN_CHUNKS']:
+        return INDEX_IVF
+    if chunk_count >= tuning['RAG_HNSW_MIN_CHUNKS']:
+        return INDEX_HNSW
+    return INDEX_FLAT
+
+
+def get_index_type(index: faiss.Index) -> str:
+    """Return which of INDEX_TYPES a stored (IDMap-wrapped) index is."""
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return INDEX_HNSW
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return INDEX_IVFPQ
+    if isinstance(inner, faiss.IndexIVF):
+        return INDEX_IVF
+    return INDEX_FLAT
+
+
+def build_index(index_type: str, vectors: np.ndarray, tuning: Dict[str, object] = None) -> faiss.Index:
+    """
+    Create an empty (but trained, where needed) ID-mapped index of the given type.
+
+    Args:
+        index_type (str): One of INDEX_TYPES
+        vectors (numpy.ndarray): Vectors the index will hold, used for IVF training
+        tuning (dict, optional): Tunables from get_index_tuning()
+
+    Returns:
+        faiss.Index: Index ready for add_with_ids
+    """
+    tuning = tuning or get_index_tuning()
+    count, dimension = vectors.shape
+
+    # 8-bit PQ codebooks need 256 centroids with ~39 training points each
+    if index_type == INDEX_IVFPQ and count < 256 * 39:
+        logger.warning(f"Too few vectors ({count}) to train IVF-PQ, using IVF-Flat instead")
+        index_type = INDEX_IVF
+
+    # Inner product = cosine similarity for normalized vectors
+    if index_type == INDEX_HNSW:
+        inner = faiss.IndexHNSWFlat(dimension, tuning['RAG_HNSW_M'], faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = tuning['RAG_HNSW_EF_CONSTRUCTION']
+    elif index_type in (INDEX_IVF, INDEX_IVFPQ):
+        nlist = tuning['RAG_IVF_NLIST'] or int(4 * np.sqrt(count))
+        nlist = max(1, min(nlist, count // 39 or 1))  # FAISS wants ~39 training points per list
+        quantizer = faiss.IndexFlatIP(dimension)
+
+        if index_type == INDEX_IVFPQ:
+            pq_m = tuning['RAG_IVFPQ_M']
+            while dimension % pq_m:
+                pq_m -= 1
+            inner = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+        else:
+            inner = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+
+        sample_size = min(count, tuning['RAG_INDEX_TRAIN_SAMPLE'])
+        sample = vectors[np.random.default_rng(0).choice(count, sample_size, replace=False)]
+        inner.train(np.ascontiguousarray(sample, dtype=np.float32))
+    else:
+        inner = faiss.IndexFlatIP(dimension)
+
+    return faiss.IndexIDMap2(inner)
+
+
+class CourseIndexStore:
+    """
+    Persistent FAISS index for all chunks of a single course.
+
+    The index lives under settings.FAISS_INDEX_PATH as `course_<id>.index`.
+    It wraps an inner-product index (exact, HNSW or IVF; see select_index_type)
+    in an IndexIDMap2 so that FAISS rows map directly to Chunk primary keys,
+    which lets us add and remove chunks incrementally instead of rebuilding
+    the whole index for every query.
+    Reads are memory-mapped and cached per process; writes happen under a
+    file lock and are swapped in atomically.
+    """
+
+    def __init__(self, course_id: int, base_path=None):
+        self.course_id = course_id
+        self.base_path = str(base_path or settings.FAISS_INDEX_PATH)
+        self.index_path = os.path.join(self.base_path, f"course_{course_id}.index")
+        self.lock_path = f"{self.index_path}.lock"
+        self.stale_path = f"{self.index_path}.stale"
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path)
+
+    def load(self) -> Optional[faiss.Index]:
+        """
+        Load the course index memory-mapped and read-only.
+        The loaded index is cached per process and reloaded when the file changes.
+
+        Returns:
+            Optional[faiss.Index]: The index, or None if it has not been built yet
+        """
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return None
+
+        with _loaded_indices_lock:
+            cached = _loaded_indices.get(self.course_id)
+            if cached and cached[0] == mtime:
+                _loaded_indices.move_to_end(self.course_id)
+                return cached[1]
+
+            index = faiss.read_index(
+                self.index_path,
+                faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+            _loaded_indices[self.course_id] = (mtime, index)
+            _loaded_indices.move_to_end(self.course_id)
+            # Evicted indices are unmapped once no search still holds them
+            while len(_loaded_indices) > settings.FAISS_LOADED_INDICES_MAX:
+                _loaded_indices.popitem(last=False)
+            return index
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Search the course index.
+        
+        Args:
+            query_embedding (numpy.ndarray): Normalized query vector
+            top_k (int): Number of results to return
+            
+        Returns:
+            List[Tuple[int, float]]: (chunk_id, score) pairs sorted by score descending
+        """
+        index = self.load()
+        if index is None or index.ntotal == 0:
+            return []
+
+        self._apply_search_params(index)
+
+        query = np.ascontiguousarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        scores, ids = index.search(query, min(top_k, index.ntotal))
+
+        # HNSW can't delete in place, so a re-added chunk may appear twice until retraining
+        results = []
+        seen = set()
+        for chunk_id, score in zip(ids[0], scores[0]):
+            if chunk_id != -1 and chunk_id not in seen:
+                seen.add(chunk_id)
+                results.append((int(chunk_id), float(score)))
+        return results
+
+    @staticmethod
+    def _apply_search_params(index: faiss.Index):
+        inner = faiss.downcast_index(index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = get_index_tuning('RAG_HNSW_EF_SEARCH')['RAG_HNSW_EF_SEARCH']
+        elif isinstance(inner, faiss.IndexIVF):
+            inner.nprobe = get_index_tuning('RAG_IVF_NPROBE')['RAG_IVF_NPROBE']
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.base_path, exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_writable(self) -> Optional[faiss.Index]:
+        if not self.exists():
+            return None
+        return faiss.read_index(self.index_path)
+
+    def _write(self, index: faiss.Index):
+        tmp_path = f"{self.index_path}.tmp"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+
+    def _remove_ids(self, index: faiss.Index, ids: np.ndarray) -> int:
+        try:
+            return index.remove_ids(ids)
+        except RuntimeError:
+            # HNSW doesn't support removal; leave the vectors and retrain later
+            self.mark_stale()
+            return 0
+
+    def mark_stale(self):
+        """Flag the index as out of date with the stored embeddings, so needs_rebuild() returns True."""
+        os.makedirs(os.path.dirname(self.stale_path), exist_ok=True)
+        open(self.stale_path, 'a').close()
+
+    def add(self, chunk_ids: List[int], embeddings: np.ndarray):
+        """
+        Add chunk embeddings to the course index, replacing any existing
+        vectors with the same chunk ids.
+        
+        Args:
+            chunk_ids (List[int]): Chunk primary keys
+            embeddings (numpy.ndarray): Matrix of shape (len(chunk_ids), dimension)
+        """
+        if not len(chunk_ids):
+            return
+
+        ids = np.asarray(chunk_ids, dtype=np.int64)
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        with self._write_lock():
+            index = self._read_writable()
+            if index is None:
+                # A new or lost index file must hold the whole course, not just this batch
+                index, stored_ids = self._build_from_db()
+                if index is None:
+                    # Start exact; build_course_index_task switches type as the course grows
+                    index = build_index(INDEX_FLAT, vectors)
+                else:
+                    missing = ~np.isin(ids, stored_ids)
+                    ids, vectors = ids[missing], vectors[missing]
+            else:
+                self._remove_ids(index, ids)
+            if len(ids):
+                index.add_with_ids(vectors, ids)
+            self._write(index)
+
+        bump_course_index_version(self.course_id)
+        logger.debug(f"Added {len(ids)} vectors to FAISS index for course {self.course_id}")
+
+    def remove(self, chunk_ids: Iterable[int]):
+        """
+        Remove chunks from the course index.
+        
+        Args:
+            chunk_ids (Iterable[int]): Chunk primary keys to remove
+        """
+        ids = np.fromiter(chunk_ids, dtype=np.int64)
+        if not len(ids):
+            return
+
+        with self._write_lock():
+            index = self._read_writable()
+            if index is None:
+                return
+            removed = self._remove_ids(index, ids)
+            self._write(index)
+
+        bump_course_index_version(self.course_id)
+        logger.debug(f"Removed {removed} vectors from FAISS index for course {self.course_id}")
+
+    def needs_rebuild(self) -> bool:
+        """
+        Whether the index should be rebuilt in the background, either because
+        the course has grown into a different index type or because the index
+        was marked stale, e.g. an HNSW index holding vectors it could not delete.
+        """
+        if os.path.exists(self.stale_path):
+            return True
+
+        index = self.load()
+        if index is None:
+            return False
+        return get_index_type(index) != select_index_type(index.ntotal)
+
+    def _collect_vectors(self) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Gather every stored chunk embedding of the course.
+        Each document's embedding segment is memory-mapped and sliced once;
+        chunks from before segments existed fall back to their per-row blob.
+        
+        Returns:
+            tuple: (chunk_ids, vectors) with vectors None when there are none
+        """
+        from .models import Chunk, EmbeddingSegment
+        from .embedding_segments import load_segment
+
+        ids = []
+        blocks = []
+        legacy = []
+        rows_by_document = {}
+
+        # One indexed single-table scan, streaming only the columns we need
+        rows = Chunk.objects.filter(course_id=self.course_id).values_list(
+            'id', 'document_id', 'segment_row', 'embedding_vector'
+        ).iterator(chunk_size=2000)
+
+        for chunk_id, document_id, segment_row, embedding_bytes in rows:
+            if segment_row is not None:
+                # Chunks stored in per-document segments
+                chunk_ids, segment_rows = rows_by_document.setdefault(document_id, ([], []))
+                chunk_ids.append(chunk_id)
+                segment_rows.append(segment_row)
+            elif embedding_bytes:
+                # Legacy chunks with a per-row embedding blob
+                legacy.append((chunk_id, np.frombuffer(embedding_bytes, dtype=np.float32)))
+
+        for segment in EmbeddingSegment.objects.filter(document_id__in=list(rows_by_document)):
+            chunk_ids, segment_rows = rows_by_document[segment.document_id]
+            ids.extend(chunk_ids)
+            blocks.append(load_segment(segment)[segment_rows])
+
+        if legacy:
+            ids.extend(chunk_id for chunk_id, _ in legacy)
+            blocks.append(np.vstack([vector for _, vector in legacy]))
+
+        if not blocks:
+            return np.asarray(ids, dtype=np.int64), None
+        return np.asarray(ids, dtype=np.int64), np.ascontiguousarray(np.vstack(blocks), dtype=np.float32)
+
+    def rebuild(self, index_type: str = None) -> int:
+        """
+        Rebuild (and train, for ANN types) the course index from the stored
+        chunk embeddings.
+        
+        Args:
+            index_type (str, optional): One of INDEX_TYPES; chosen by chunk count if omitted
+            
+        Returns:
+            int: Number of vectors in the rebuilt index
+        """
+        # Train outside the lock; only the swap needs to be exclusive
+        index, ids = self._build_from_db(index_type)
+
+        if index is None:
+            with self._write_lock():
+                for path in (self.index_path, self.stale_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+            return 0
+
+        with self._write_lock():
+            self._write(index)
+            if os.path.exists(self.stale_path):
+                os.remove(self.stale_path)
+
+        bump_course_index_version(self.course_id)
+
+        logger.info(f"Rebuilt {get_index_type(index)} FAISS index for course {self.course_id} with {len(ids)} vectors")
+        return len(ids)
+
+    def _build_from_db(self, index_type: str = None) -> Tuple[Optional[faiss.Index], np.ndarray]:
+        """
+        Build an index holding every stored chunk embedding of the course.
+
+        Returns:
+            tuple: (index, chunk_ids), with index None when the course has no embeddings
+        """
+        ids, vectors = self._collect_vectors()
+        if vectors is None:
+            return None, ids
+
+        tuning = get_index_tuning()
+        index = build_index(index_type or select_index_type(len(ids), tuning), vectors, tuning)
+        index.add_with_ids(vectors, ids)
+        return index, ids
+
+    def evaluate_recall(self, k: int = 10, query_count: int = 100) -> Dict[str, object]:
+        """
+        Measure recall@k of the stored index against exact flat search,
+        using a random sample of the course's own chunk vectors as queries.
+        
+        Args:
+            k (int): Number of neighbours compared per query
+            query_count (int): Number of sampled queries
+            
+        Returns:
+            dict: Index type, size, recall@k and mean per-query latency of both indices
+        """
+        index = self.load()
+        ids, vectors = self._collect_vectors()
+        if index is None or vectors is None:
+            return {'course_id': self.course_id, 'index_type': None, 'ntotal': 0}
+
+        k = min(k, len(ids))
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(len(ids), min(query_count, len(ids)), replace=False)]
+
+        exact = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+        exact.add_with_ids(vectors, ids)
+
+        start = time.perf_counter()
+        _, exact_ids = exact.search(queries, k)
+        flat_seconds = time.perf_counter() - start
+
+        self._apply_search_params(index)
+        start = time.perf_counter()
+        _, index_ids = index.search(queries, k)
+        index_seconds = time.perf_counter() - start
+
+        hits = sum(
+            len(set(expected) & set(found))
+            for expected, found in zip(exact_ids, index_ids)
+        )
+
+        return {
+            'course_id': self.course_id,
+            'index_type': get_index_type(index),
+            'ntotal': int(index.ntotal),
+            'k': k,
+            'queries': len(queries),
+            'recall_at_k': hits / float(k * len(queries)),
+            'flat_ms_per_query': 1000 * flat_seconds / len(queries),
+            'index_ms_per_query': 1000 * index_seconds / len(queries),
+        }
+
+
+def get_course_id_for_document(document) -> int:
+    """Return the id of the course a document's material belongs to."""
+    if document.course_id is not None:
+        return document.course_id
+    return document.material.assignment.course_id
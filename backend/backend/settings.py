@@ -54,7 +54,7 @@ INSTALLED_APPS = [
     'classroom_integration.apps.ClassroomIntegrationConfig',
     'ai_processing.apps.AiProcessingConfig',
     'aiAgent.apps.AiagentConfig', # Renamed from agent_services? Keep consistent.
-    # 'core.apps.CoreConfig', # Add core app if created
+    'core.apps.CoreConfig',
 ]
 
 MIDDLEWARE = [
@@ -180,6 +180,22 @@ STATIC_URL = 'static/'
 # Add STATIC_ROOT for collectstatic in production
 # STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Uploaded and downloaded files; Drive downloads live in a content-addressed blob store under MEDIA_ROOT/downloads
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', str(BASE_DIR / 'media'))
+# Unreferenced blobs are kept this long before garbage collection, so in-flight tasks can re-reference them
+BLOB_GC_GRACE_SECONDS = int(os.getenv('BLOB_GC_GRACE_SECONDS', str(60 * 60 * 24)))
+# Drive downloads are fetched in ranged requests of this size, the most held in memory at once
+DRIVE_DOWNLOAD_CHUNK_BYTES = int(os.getenv('DRIVE_DOWNLOAD_CHUNK_BYTES', str(8 * 1024 * 1024)))
+# Retries per chunk, with backoff, before a download fails
+DRIVE_DOWNLOAD_RETRIES = int(os.getenv('DRIVE_DOWNLOAD_RETRIES', '5'))
+# Larger Drive files are skipped rather than downloaded
+DRIVE_DOWNLOAD_MAX_BYTES = int(os.getenv('DRIVE_DOWNLOAD_MAX_BYTES', str(512 * 1024 * 1024)))
+# Items per page of Classroom list calls; every page is fetched
+CLASSROOM_PAGE_SIZE = int(os.getenv('CLASSROOM_PAGE_SIZE', '100'))
+# Requests combined into one Google API HTTP batch
+GOOGLE_BATCH_SIZE = int(os.getenv('GOOGLE_BATCH_SIZE', '50'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -187,6 +203,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 
+# Cache Configuration
+# Share the cache through Redis when available; retrieval result caching is off without a shared cache
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Celery Configuration
 # Use memory broker for local development if Redis is not available
 CELERY_BROKER_URL = os.getenv('REDIS_URL', 'memory://') # Changed from redis://redis:6379/0
@@ -196,12 +228,80 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE # Use Django's timezone
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler' # If using scheduled tasks
+# OCR gets its own queue so long jobs don't starve extraction: celery -A backend worker -Q ocr --concurrency=1
+CELERY_TASK_ROUTES = {
+    'ai_processing.tasks.ocr_document_task': {'queue': 'ocr'},
+}
+CELERY_BEAT_SCHEDULE = {
+    'collect-blob-garbage': {'task': 'core.tasks.collect_blob_garbage_task', 'schedule': 60 * 60 * 6},
+}
 
 # AI Processing Configuration
 # Define a path for storing FAISS index and other temporary AI files
 AI_DATA_PATH = BASE_DIR / 'ai_data'
 FAISS_INDEX_PATH = AI_DATA_PATH / 'faiss_indices'
 os.makedirs(FAISS_INDEX_PATH, exist_ok=True) # Ensure the directory exists
+# Course indices each process keeps memory-mapped, least recently used evicted first
+FAISS_LOADED_INDICES_MAX = int(os.getenv('FAISS_LOADED_INDICES_MAX', '64'))
+# Per-document contiguous float32 embedding matrices (.npy)
+EMBEDDING_SEGMENT_PATH = AI_DATA_PATH / 'embedding_segments'
+os.makedirs(EMBEDDING_SEGMENT_PATH, exist_ok=True)
+# Per-course BM25 inverted indices over chunk text (SQLite files)
+LEXICAL_INDEX_PATH = AI_DATA_PATH / 'lexical_indices'
+os.makedirs(LEXICAL_INDEX_PATH, exist_ok=True)
+
+# Embedding model shared by every task in a worker process (see ai_processing.model_registry)
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+# Load the embedding model when each Celery worker process starts instead of on first use
+EMBEDDING_MODEL_PRELOAD = os.getenv('EMBEDDING_MODEL_PRELOAD', 'True') == 'True'
+# Number of chunks encoded per model.encode batch
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+# Content-hash embedding cache (ai_processing.EmbeddingCacheEntry), evicted least recently used first
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True') == 'True'
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '200000'))
+
+# Text extraction: the rest of a PDF moves to a process pool only once sampled pages project at least
+# PDF_PARALLEL_MIN_SECONDS of serial work over at least PDF_PARALLEL_MIN_PAGES remaining pages;
+# a spawn pool takes seconds to start, far longer than the fast engine needs for ordinary documents
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '100'))
+PDF_PARALLEL_MIN_SECONDS = float(os.getenv('PDF_PARALLEL_MIN_SECONDS', '15'))
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', '0'))  # 0 = one per available core
+# Page-level PDF engines, fastest first; a page escalates only when the text fails the quality check
+PDF_EXTRACTOR_CHAIN = os.getenv('PDF_EXTRACTOR_CHAIN', 'pypdf2,pdfplumber').split(',')
+# Content-addressed extraction cache (ai_processing.ExtractionCacheEntry), evicted least recently used first
+EXTRACTION_CACHE_ENABLED = os.getenv('EXTRACTION_CACHE_ENABLED', 'True') == 'True'
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv('EXTRACTION_CACHE_MAX_ENTRIES', '20000'))
+# Text files at least this large are decoded a block at a time instead of read whole
+TEXT_STREAMING_MIN_BYTES = int(os.getenv('TEXT_STREAMING_MIN_BYTES', str(32 * 1024 * 1024)))
+TEXT_STREAM_BLOCK_BYTES = int(os.getenv('TEXT_STREAM_BLOCK_BYTES', str(1024 * 1024)))
+# OCR (Tesseract) of scanned PDF pages and picture-only slides; needs pytesseract, pdf2image and poppler
+OCR_ENABLED = os.getenv('OCR_ENABLED', 'True') == 'True'
+OCR_LANGUAGES = os.getenv('OCR_LANGUAGES', 'eng')  # Tesseract language codes joined by '+'
+OCR_DPI = int(os.getenv('OCR_DPI', '300'))
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', '0'))  # Pages OCRed at once per task, 0 = one per available core
+OCR_CACHE_MAX_PAGES = int(os.getenv('OCR_CACHE_MAX_PAGES', '200000'))
+
+# Chunk size limits in embedding-model tokens (all-MiniLM-L6-v2 truncates input beyond 256)
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '200'))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '30'))
+# Content-defined chunk boundaries every ~N paragraphs, so edits only re-chunk (and re-embed) their neighbourhood
+CHUNK_ANCHOR_PARAGRAPHS = int(os.getenv('CHUNK_ANCHOR_PARAGRAPHS', '8'))
+
+# Retrieval: fuse FAISS and BM25 rankings with reciprocal rank fusion
+RAG_HYBRID_SEARCH = os.getenv('RAG_HYBRID_SEARCH', 'True') == 'True'
+RAG_FUSION_CANDIDATES = int(os.getenv('RAG_FUSION_CANDIDATES', '50'))  # Candidates taken from each ranking
+RAG_RRF_K = int(os.getenv('RAG_RRF_K', '60'))
+# Optional second stage: re-rank a wider candidate pool with a cross-encoder
+RAG_RERANK_ENABLED = os.getenv('RAG_RERANK_ENABLED', 'False') == 'True'
+RERANK_MODEL_NAME = os.getenv('RERANK_MODEL_NAME', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RAG_RERANK_CANDIDATES = int(os.getenv('RAG_RERANK_CANDIDATES', '30'))
+RAG_RERANK_BATCH_SIZE = int(os.getenv('RAG_RERANK_BATCH_SIZE', '16'))
+RAG_RERANK_BUDGET_MS = int(os.getenv('RAG_RERANK_BUDGET_MS', '300'))  # Stop scoring once exceeded
+# Section-aware retrieval: score multiplier for boosted sections, search depth multiplier when filtering
+RAG_SECTION_BOOST = float(os.getenv('RAG_SECTION_BOOST', '0.2'))
+RAG_SECTION_FILTER_EXPANSION = int(os.getenv('RAG_SECTION_FILTER_EXPANSION', '4'))
+# How long query embeddings and ranked chunk ids stay cached (invalidated early by any chunk change)
+RAG_QUERY_CACHE_TIMEOUT = int(os.getenv('RAG_QUERY_CACHE_TIMEOUT', str(60 * 60 * 24)))
 
 # Logging Configuration (Optional but recommended)
 LOGGING = {
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ClassroomIntegrationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'classroom_integration'
+
+    def ready(self):
+        # Release downloaded files in the blob store when their materials are deleted
+        from . import signals  # noqa: F401
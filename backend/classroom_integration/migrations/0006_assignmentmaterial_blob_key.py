@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classroom_integration', '0005_delete_material_remove_assignment_google_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignmentmaterial',
+            name='blob_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
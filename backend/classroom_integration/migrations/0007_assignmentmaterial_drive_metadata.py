@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classroom_integration', '0006_assignmentmaterial_blob_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignmentmaterial',
+            name='drive_md5_checksum',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='assignmentmaterial',
+            name='drive_modified_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='assignmentmaterial',
+            name='drive_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
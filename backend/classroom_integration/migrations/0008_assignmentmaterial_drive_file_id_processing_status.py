@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classroom_integration', '0007_assignmentmaterial_drive_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignmentmaterial',
+            name='drive_file_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='assignmentmaterial',
+            name='processing_status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Downloading', 'Downloading'), ('Downloaded', 'Downloaded'), ('Processing', 'Processing'), ('OCR', 'OCR'), ('Chunking', 'Chunking'), ('Embedding', 'Embedding'), ('Processed', 'Processed'), ('Error', 'Error')], max_length=50, null=True),
+        ),
+    ]
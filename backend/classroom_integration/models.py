@@ -42,6 +42,28 @@ class AssignmentMaterial(models.Model):
     name = models.CharField(max_length=255)
     material_type = models.CharField(max_length=50, choices=[('pdf', 'PDF'), ('doc', 'Document'), ('slide', 'Slide')])
     download_link = models.URLField(blank=True, null=True)
+    drive_file_id = models.CharField(max_length=255, blank=True, null=True)  # Google Drive ID, for download and re-sync
+    processing_status = models.CharField(
+        max_length=50,
+        choices=[
+            ('Pending', 'Pending'),
+            ('Downloading', 'Downloading'),
+            ('Downloaded', 'Downloaded'),
+            ('Processing', 'Processing'),
+            ('OCR', 'OCR'),
+            ('Chunking', 'Chunking'),
+            ('Embedding', 'Embedding'),
+            ('Processed', 'Processed'),
+            ('Error', 'Error'),
+        ],
+        blank=True,
+        null=True,  # Unset for materials that are never downloaded, such as links
+    )
+    blob_key = models.CharField(max_length=64, blank=True, null=True)  # Downloaded file in core.blob_store
+    # Drive metadata of the downloaded content, compared on re-sync to skip unchanged files
+    drive_md5_checksum = models.CharField(max_length=32, blank=True, null=True)
+    drive_modified_time = models.DateTimeField(blank=True, null=True)
+    drive_size = models.BigIntegerField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -1,5 +1,6 @@
 import logging
 import io
+import hashlib
 from django.conf import settings
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request as GoogleRequest
@@ -10,6 +11,42 @@ from users.models import User # Assuming User model is in 'users' app
 
 logger = logging.getLogger(__name__)
 
+# Google-native files have no binary content; Drive exports them to these formats instead
+GOOGLE_EXPORT_MIME_TYPES = {
+    'application/vnd.google-apps.document': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.google-apps.presentation': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'application/vnd.google-apps.spreadsheet': 'text/csv',
+    'application/vnd.google-apps.drawing': 'application/pdf',
+}
+
+# Field masks: only what the sync tasks read, plus the page token for list calls
+COURSE_LIST_FIELDS = 'nextPageToken,courses(id,name,description)'
+COURSE_WORK_LIST_FIELDS = 'nextPageToken,courseWork(id,title,description,alternateLink,dueDate,dueTime)'
+COURSE_WORK_MATERIAL_FIELDS = 'id,materials'
+DRIVE_CHANGE_FIELDS = 'md5Checksum,modifiedTime,size'
+
+
+class DownloadTooLarge(Exception):
+    """Raised when a Drive download grows past DRIVE_DOWNLOAD_MAX_BYTES."""
+
+
+class _CheckedWriter:
+    """Passes downloaded chunks through to a file object, hashing them with MD5 and enforcing a size limit."""
+
+    def __init__(self, destination, max_bytes: int):
+        self._destination = destination
+        self._max_bytes = max_bytes
+        self.md5 = hashlib.md5(usedforsecurity=False)
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        if self.size > self._max_bytes:
+            raise DownloadTooLarge(f"Download exceeds {self._max_bytes} bytes")
+        self.md5.update(data)
+        return self._destination.write(data)
+
+
 def get_google_credentials(user: User) -> Credentials | None:
     """
     Retrieves and potentially refreshes Google OAuth credentials for a user.
@@ -86,6 +123,47 @@ def get_google_service(user: User, service_name: str, version: str):
         logger.exception(f"Unexpected error building Google service {service_name} for user {user.email}")
         return None
 
+
+def _list_all(collection, items_key: str, **kwargs):
+    """Execute a list call page by page until nextPageToken runs out, returning every item."""
+    request = collection.list(**kwargs)
+    items = []
+    while request is not None:
+        response = request.execute()
+        items.extend(response.get(items_key, []))
+        request = collection.list_next(request, response)
+    return items
+
+
+def _execute_batch(service, requests: dict, responses=None):
+    """
+    Execute API requests in HTTP batches of up to GOOGLE_BATCH_SIZE, one round trip per batch.
+
+    Args:
+        service: The API service the requests were built from
+        requests (dict): {key: request}
+        responses (dict, optional): Dict to collect responses into, so a caller
+            keeps the batches that completed if a later one raises
+
+    Returns:
+        dict: {key: response}; requests that fail are logged and left out
+    """
+    responses = {} if responses is None else responses
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            logger.warning(f"Batched API request {request_id} failed: {exception}")
+        else:
+            responses[request_id] = response
+
+    keys = list(requests)
+    for start in range(0, len(keys), settings.GOOGLE_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=callback)
+        for key in keys[start:start + settings.GOOGLE_BATCH_SIZE]:
+            batch.add(requests[key], request_id=key)
+        batch.execute()
+    return responses
+
 # --- Placeholder Functions for Classroom/Drive API Calls ---
 
 def fetch_classroom_courses(user: User):
@@ -96,8 +174,10 @@ def fetch_classroom_courses(user: User):
 
     try:
         logger.info(f"Fetching courses for user {user.email}")
-        results = service.courses().list(studentId='me').execute()
-        courses = results.get('courses', [])
+        courses = _list_all(
+            service.courses(), 'courses',
+            studentId='me', pageSize=settings.CLASSROOM_PAGE_SIZE, fields=COURSE_LIST_FIELDS
+        )
         logger.info(f"Found {len(courses)} courses for user {user.email}")
         return courses
     except HttpError as error:
@@ -116,11 +196,13 @@ def fetch_course_assignments(user: User, course_id: str):
 
     try:
         logger.info(f"Fetching assignments for course {course_id} for user {user.email}")
-        results = service.courses().courseWork().list(
+        assignments = _list_all(
+            service.courses().courseWork(), 'courseWork',
             courseId=course_id,
-            courseWorkStates=['PUBLISHED'] # Fetch only published assignments
-        ).execute()
-        assignments = results.get('courseWork', [])
+            courseWorkStates=['PUBLISHED'], # Fetch only published assignments
+            pageSize=settings.CLASSROOM_PAGE_SIZE,
+            fields=COURSE_WORK_LIST_FIELDS
+        )
         logger.info(f"Found {len(assignments)} assignments for course {course_id}")
         return assignments
     except HttpError as error:
@@ -131,24 +213,141 @@ def fetch_course_assignments(user: User, course_id: str):
         return None
 
 
-def download_drive_file(user: User, file_id: str) -> io.BytesIO | None:
-    """Placeholder: Downloads a file from Google Drive by its ID."""
+def fetch_course_work_materials(user: User, course_id: str, course_work_ids):
+    """
+    Fetches the materials of several assignments of a course, batching the
+    courseWork gets into as few HTTP requests as possible.
+
+    Args:
+        user (User): Owner of the Google credentials
+        course_id (str): Classroom course ID
+        course_work_ids (Iterable[str]): Classroom courseWork IDs
+
+    Returns:
+        dict: {course_work_id: materials}; assignments that can't be read are
+            left out. None if the Classroom service is unavailable or the batch fails.
+    """
+    service = get_google_service(user, 'classroom', 'v1')
+    if not service:
+        return None
+
+    try:
+        course_work = service.courses().courseWork()
+        responses = _execute_batch(service, {
+            course_work_id: course_work.get(courseId=course_id, id=course_work_id, fields=COURSE_WORK_MATERIAL_FIELDS)
+            for course_work_id in course_work_ids
+        })
+        return {course_work_id: response.get('materials', []) for course_work_id, response in responses.items()}
+    except HttpError as error:
+        logger.error(f"API error fetching assignment materials for course {course_id}: {error}")
+        return None
+    except Exception as e:
+        logger.exception(f"Error fetching assignment materials for course {course_id}")
+        return None
+
+
+def fetch_drive_file_metadata(user: User, file_ids):
+    """
+    Fetches the Drive metadata that shows whether files changed since they
+    were downloaded, without downloading them.
+
+    Args:
+        user (User): Owner of the Google credentials
+        file_ids (Iterable[str]): Drive file IDs
+
+    Returns:
+        dict: {file_id: {'md5Checksum', 'modifiedTime', 'size'}} (Google-native
+            files have only modifiedTime); files that can't be read are left
+            out, as are all files of batches that fail. None if the Drive
+            service is unavailable.
+    """
+    service = get_google_service(user, 'drive', 'v3')
+    if not service:
+        return None
+
+    # Files without metadata are simply downloaded again, so partial results are still useful
+    metadata = {}
+    try:
+        files = service.files()
+        return _execute_batch(service, {
+            file_id: files.get(fileId=file_id, fields=DRIVE_CHANGE_FIELDS) for file_id in file_ids
+        }, metadata)
+    except HttpError as error:
+        logger.error(f"API error fetching Drive file metadata: {error}")
+        return metadata
+    except Exception as e:
+        logger.exception("Error fetching Drive file metadata")
+        return metadata
+
+
+def download_drive_file(user: User, file_id: str, destination=None):
+    """
+    Downloads a file from Google Drive by its ID. Google Docs, Slides, Sheets
+    and Drawings are exported (see GOOGLE_EXPORT_MIME_TYPES) since they
+    have no content to download as-is.
+
+    The content is fetched in ranged requests of DRIVE_DOWNLOAD_CHUNK_BYTES,
+    so at most one chunk is held in memory. A chunk that fails transiently
+    (5xx, 429 or a dropped connection) is retried with backoff up to
+    DRIVE_DOWNLOAD_RETRIES times from the last byte received. Files larger
+    than DRIVE_DOWNLOAD_MAX_BYTES are refused before downloading or as soon
+    as they grow past it, and binary files are checked against Drive's
+    md5Checksum.
+    
+    Args:
+        user (User): Owner of the Google credentials
+        file_id (str): Drive file ID
+        destination (optional): Writable file object to stream the content into,
+            such as a core.blob_store.BlobWriter; defaults to a new BytesIO
+            
+    Returns:
+        The destination (a BytesIO rewound to the start if none was given), or None on failure
+    """
     service = get_google_service(user, 'drive', 'v3')
     if not service:
         return None
 
+    max_bytes = settings.DRIVE_DOWNLOAD_MAX_BYTES
     try:
         logger.info(f"Downloading Drive file {file_id} for user {user.email}")
-        request = service.files().get_media(fileId=file_id)
-        file_stream = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_stream, request)
+        metadata = service.files().get(fileId=file_id, fields='mimeType,size,md5Checksum').execute()
+        mime_type = metadata.get('mimeType', '')
+        if mime_type in GOOGLE_EXPORT_MIME_TYPES:
+            # Exports are generated on request, so there's no size or checksum up front
+            request = service.files().export_media(fileId=file_id, mimeType=GOOGLE_EXPORT_MIME_TYPES[mime_type])
+        elif mime_type.startswith('application/vnd.google-apps.'):
+            logger.warning(f"Drive file {file_id} is a {mime_type}, which can't be downloaded or exported")
+            return None
+        else:
+            size = int(metadata.get('size') or 0)
+            if size > max_bytes:
+                logger.warning(f"Drive file {file_id} is {size} bytes, over the {max_bytes} byte limit. Skipping download.")
+                return None
+            request = service.files().get_media(fileId=file_id)
+
+        file_stream = destination if destination is not None else io.BytesIO()
+        writer = _CheckedWriter(file_stream, max_bytes)
+        downloader = MediaIoBaseDownload(writer, request, chunksize=settings.DRIVE_DOWNLOAD_CHUNK_BYTES)
         done = False
         while done is False:
-            status, done = downloader.next_chunk()
+            # Retries re-request the same byte range, so the download resumes where it stopped
+            status, done = downloader.next_chunk(num_retries=settings.DRIVE_DOWNLOAD_RETRIES)
+            if status.total_size and status.total_size > max_bytes:
+                raise DownloadTooLarge(f"Drive reports {status.total_size} bytes")
             logger.debug(f"Download {int(status.progress() * 100)}%.")
-        logger.info(f"Successfully downloaded Drive file {file_id}")
-        file_stream.seek(0) # Reset stream position to the beginning
+
+        expected_md5 = metadata.get('md5Checksum')
+        if expected_md5 and writer.md5.hexdigest() != expected_md5:
+            logger.error(f"Drive file {file_id} failed MD5 verification: expected {expected_md5}, got {writer.md5.hexdigest()}")
+            return None
+
+        logger.info(f"Successfully downloaded Drive file {file_id} ({writer.size} bytes)")
+        if destination is None:
+            file_stream.seek(0) # Reset stream position to the beginning
         return file_stream
+    except DownloadTooLarge as e:
+        logger.warning(f"Aborted download of Drive file {file_id}: {e}, over the {max_bytes} byte limit")
+        return None
     except HttpError as error:
         # Handle specific errors like file not found (404) or permission denied (403)
         logger.error(f"API error downloading Drive file {file_id}: {error}")
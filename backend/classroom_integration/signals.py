@@ -0,0 +1,16 @@
+import logging
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from core import blob_store
+from .models import AssignmentMaterial
+
+logger = logging.getLogger(__name__)
+
+@receiver(post_delete, sender=AssignmentMaterial)
+def release_material_blob(sender, instance, **kwargs):
+    """Drop a deleted material's reference to its downloaded file."""
+    try:
+        blob_store.release(instance.blob_key)
+    except Exception as e:
+        logger.error(f"Error releasing blob of material {instance.pk}: {e}")
@@ -1,14 +1,123 @@
 import logging
+from datetime import datetime, timezone as dt_timezone
 from celery import shared_task
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from googleapiclient.errors import HttpError
 from users.models import User
 from .models import Course, Assignment, AssignmentMaterial
-from .services import fetch_classroom_courses, fetch_course_assignments, download_drive_file
+from .services import (
+    fetch_classroom_courses, fetch_course_assignments, fetch_course_work_materials,
+    fetch_drive_file_metadata, download_drive_file
+)
+from core import blob_store
 # Import the task from ai_processing to trigger it after download
 from ai_processing.tasks import process_material_task
 
 logger = logging.getLogger(__name__)
 
+
+def _drive_change_fields(metadata):
+    """Map Drive file metadata to the material fields that record which version was downloaded."""
+    size = metadata.get('size')
+    modified_time = metadata.get('modifiedTime')
+    return {
+        'drive_md5_checksum': metadata.get('md5Checksum'),
+        'drive_modified_time': parse_datetime(modified_time) if modified_time else None,
+        'drive_size': int(size) if size else None,
+    }
+
+
+def _drive_file_unchanged(material, metadata) -> bool:
+    """
+    Return True if the material was processed from the Drive file's current
+    content: same MD5 and size for binary files, or same modifiedTime for
+    Google-native files, which have neither.
+    """
+    if not material.blob_key or material.processing_status == 'Error':
+        return False
+
+    fields = _drive_change_fields(metadata)
+    if fields['drive_md5_checksum']:
+        # A rename or sharing change moves modifiedTime without touching the content
+        return (fields['drive_md5_checksum'] == material.drive_md5_checksum
+                and fields['drive_size'] == material.drive_size)
+    return fields['drive_modified_time'] is not None and fields['drive_modified_time'] == material.drive_modified_time
+
+
+def _material_type(title):
+    """Guess a material's type from its file name; anything that isn't a PDF or slides is a document."""
+    extension = title.rsplit('.', 1)[-1].lower() if '.' in title else ''
+    if extension == 'pdf':
+        return 'pdf'
+    if extension in ('ppt', 'pptx', 'odp', 'key'):
+        return 'slide'
+    return 'doc'
+
+
+def _parse_due_date(google_assignment):
+    """Combine Classroom's dueDate and dueTime (both UTC) into a datetime, or None if there's no due date."""
+    due_date = google_assignment.get('dueDate')
+    if not due_date:
+        return None
+    due_time = google_assignment.get('dueTime', {})
+    return datetime(
+        due_date['year'], due_date['month'], due_date['day'],
+        due_time.get('hours', 0), due_time.get('minutes', 0), tzinfo=dt_timezone.utc
+    )
+
+
+def _reconcile(model, scope, incoming):
+    """
+    Bring a model's rows for Google objects in line with what Google returned,
+    in a handful of queries however many objects there are.
+
+    Existing rows in scope are loaded in one query and diffed in memory; only
+    rows with a changed field are written, in one bulk update. New rows are
+    inserted in bulk, skipping any classroom_id that already has a row: a
+    concurrent sync of the same scope may have inserted it first, and a row
+    synced for another user or course is never taken over or overwritten.
+
+    Args:
+        model: Course or Assignment
+        scope (dict): Filter for the rows being synced, also set on new rows (e.g. {'user': user})
+        incoming (dict): {classroom_id: {field: value}} as fetched from Google
+
+    Returns:
+        tuple: (created objects, number of rows updated)
+    """
+    existing = {obj.classroom_id: obj for obj in model.objects.filter(**scope)}
+    to_create = []
+    to_update = []
+    changed_fields = set()
+
+    for classroom_id, values in incoming.items():
+        obj = existing.get(classroom_id)
+        if obj is None:
+            to_create.append(model(classroom_id=classroom_id, **scope, **values))
+            continue
+
+        changed = [field for field, value in values.items() if getattr(obj, field) != value]
+        if changed:
+            for field in changed:
+                setattr(obj, field, values[field])
+            changed_fields.update(changed)
+            to_update.append(obj)
+
+    created = []
+    if to_create:
+        new_ids = [obj.classroom_id for obj in to_create]
+        # classroom_id is unique across all scopes, so conflicting rows are left as they are
+        model.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+        created = list(model.objects.filter(**scope, classroom_id__in=new_ids))
+        skipped = set(new_ids) - {obj.classroom_id for obj in created}
+        if skipped:
+            logger.warning(f"Skipped {len(skipped)} {model.__name__} rows already synced under another owner: {sorted(skipped)}")
+    if to_update:
+        model.objects.bulk_update(to_update, sorted(changed_fields), batch_size=500)
+    return created, len(to_update)
+
+
 @shared_task
 def sync_user_courses_task(user_id):
     """
@@ -24,42 +133,28 @@ def sync_user_courses_task(user_id):
             logger.error(f"Failed to fetch courses from Google for user {user.email}")
             return f"Failed to fetch courses for user {user_id}"
 
-        synced_count = 0
-        created_count = 0
-        existing_google_ids = set(Course.objects.filter(owner=user).values_list('google_id', flat=True))
-        fetched_google_ids = set()
-
-        for gc in google_courses:
-            google_id = gc.get('id')
-            if not google_id:
-                continue
-            
-            fetched_google_ids.add(google_id)
-            defaults = {
+        # Classroom can list a course more than once; the last listing wins
+        incoming = {
+            gc['id']: {
                 'name': gc.get('name', 'Untitled Course'),
-                'description': gc.get('description', ''),
-                'last_synced': timezone.now()
             }
-            course, created = Course.objects.update_or_create(
-                google_id=google_id,
-                owner=user,
-                defaults=defaults
-            )
-            synced_count += 1
-            if created:
-                created_count += 1
-                logger.info(f"Created new course: {course.name} (ID: {google_id}) for user {user.email}")
-            else:
-                logger.debug(f"Updated existing course: {course.name} (ID: {google_id}) for user {user.email}")
+            for gc in google_courses if gc.get('id')
+        }
+        created, updated_count = _reconcile(Course, {'user': user}, incoming)
+        synced_count = len(incoming)
+        created_count = len(created)
+        for course in created:
+            logger.info(f"Created new course: {course.name} (ID: {course.classroom_id}) for user {user.email}")
+        fetched_classroom_ids = set(incoming)
 
         # Optional: Handle courses removed from Google Classroom (if needed)
-        # removed_ids = existing_google_ids - fetched_google_ids
+        # removed_ids = existing_classroom_ids - fetched_classroom_ids
         # if removed_ids:
-        #     Course.objects.filter(owner=user, google_id__in=removed_ids).delete()
+        #     Course.objects.filter(user=user, classroom_id__in=removed_ids).delete()
         #     logger.info(f"Removed {len(removed_ids)} courses no longer found in Google Classroom for user {user.email}")
 
-        logger.info(f"Course sync completed for user {user.email}. Synced: {synced_count}, Created: {created_count}")
-        return f"Course sync completed for user {user_id}. Synced: {synced_count}, Created: {created_count}"
+        logger.info(f"Course sync completed for user {user.email}. Synced: {synced_count}, Created: {created_count}, Updated: {updated_count}")
+        return f"Course sync completed for user {user_id}. Synced: {synced_count}, Created: {created_count}, Updated: {updated_count}"
 
     except User.DoesNotExist:
         logger.error(f"User with ID {user_id} not found for course sync.")
@@ -77,53 +172,42 @@ def sync_course_assignments_task(course_id):
     and update the database.
     """
     try:
-        course = Course.objects.select_related('owner').get(pk=course_id)
-        user = course.owner
-        logger.info(f"Starting assignment sync for course '{course.name}' (ID: {course.google_id}) for user {user.email}")
+        course = Course.objects.select_related('user').get(pk=course_id)
+        user = course.user
+        logger.info(f"Starting assignment sync for course '{course.name}' (ID: {course.classroom_id}) for user {user.email}")
 
-        google_assignments = fetch_course_assignments(user, course.google_id)
+        google_assignments = fetch_course_assignments(user, course.classroom_id)
         if google_assignments is None:
-            logger.error(f"Failed to fetch assignments from Google for course {course.google_id}")
+            logger.error(f"Failed to fetch assignments from Google for course {course.classroom_id}")
             return f"Failed to fetch assignments for course {course_id}"
 
-        synced_count = 0
-        created_count = 0
-        material_tasks_triggered = 0
-
-        for ga in google_assignments:
-            google_id = ga.get('id')
-            if not google_id:
-                continue
-
-            defaults = {
+        incoming = {
+            ga['id']: {
                 'title': ga.get('title', 'Untitled Assignment'),
                 'description': ga.get('description', ''),
-                'google_link': ga.get('alternateLink'),
-                'last_synced': timezone.now(),
-                # Update due date if present
-                'due_date': ga.get('dueDate') # Needs parsing from Google format
+                'due_date': _parse_due_date(ga),
             }
-            assignment, created = Assignment.objects.update_or_create(
-                google_id=google_id,
-                course=course,
-                defaults=defaults
-            )
-            synced_count += 1
-            if created:
-                created_count += 1
-                logger.info(f"Created new assignment: {assignment.title} (ID: {google_id}) in course {course.name}")
-                # Trigger material sync for newly created assignments
-                sync_assignment_materials_task.delay(assignment.id)
-                material_tasks_triggered += 1
-            else:
-                logger.debug(f"Updated existing assignment: {assignment.title} (ID: {google_id}) in course {course.name}")
-                # Optionally re-sync materials if assignment updated recently?
-
-        course.last_synced = timezone.now() # Mark course as synced
-        course.save(update_fields=['last_synced'])
+            for ga in google_assignments if ga.get('id')
+        }
+        created, updated_count = _reconcile(Assignment, {'course': course}, incoming)
+        synced_count = len(incoming)
+        created_count = len(created)
+        material_tasks_triggered = 0
 
-        logger.info(f"Assignment sync completed for course '{course.name}'. Synced: {synced_count}, Created: {created_count}, Material Syncs Triggered: {material_tasks_triggered}")
-        return f"Assignment sync completed for course {course_id}. Synced: {synced_count}, Created: {created_count}"
+        # Materials of all new assignments in batched requests rather than one get per assignment task
+        created_materials = (
+            fetch_course_work_materials(user, course.classroom_id, [assignment.classroom_id for assignment in created])
+            if created else {}
+        ) or {}
+        for assignment in created:
+            logger.info(f"Created new assignment: {assignment.title} (ID: {assignment.classroom_id}) in course {course.name}")
+            # Trigger material sync for newly created assignments
+            sync_assignment_materials_task.delay(assignment.id, created_materials.get(assignment.classroom_id))
+            material_tasks_triggered += 1
+        # Optionally re-sync materials if assignment updated recently?
+
+        logger.info(f"Assignment sync completed for course '{course.name}'. Synced: {synced_count}, Created: {created_count}, Updated: {updated_count}, Material Syncs Triggered: {material_tasks_triggered}")
+        return f"Assignment sync completed for course {course_id}. Synced: {synced_count}, Created: {created_count}, Updated: {updated_count}"
 
     except Course.DoesNotExist:
         logger.error(f"Course with ID {course_id} not found for assignment sync.")
@@ -134,32 +218,34 @@ def sync_course_assignments_task(course_id):
 
 
 @shared_task
-def sync_assignment_materials_task(assignment_id):
+def sync_assignment_materials_task(assignment_id, google_materials=None):
     """
     Celery task to fetch materials for a specific assignment from Google Classroom,
     download them (if from Drive), and trigger processing.
+
+    Args:
+        assignment_id (int): The assignment to sync
+        google_materials (list, optional): The assignment's Classroom materials,
+            when already fetched in a batch; fetched here otherwise
     """
     try:
-        assignment = Assignment.objects.select_related('course__owner').get(pk=assignment_id)
-        user = assignment.course.owner
-        logger.info(f"Starting material sync for assignment '{assignment.title}' (ID: {assignment.google_id})")
+        assignment = Assignment.objects.select_related('course__user').get(pk=assignment_id)
+        user = assignment.course.user
+        logger.info(f"Starting material sync for assignment '{assignment.title}' (ID: {assignment.classroom_id})")
         assignment.status = 'Syncing'
         assignment.save(update_fields=['status'])
 
-        # Fetch assignment details again to get materials (Classroom API structure)
-        classroom_service = get_google_service(user, 'classroom', 'v1')
-        if not classroom_service:
-            raise Exception("Failed to get Classroom service")
+        if google_materials is None:
+            # Fetch assignment details again to get materials (Classroom API structure)
+            fetched = fetch_course_work_materials(user, assignment.course.classroom_id, [assignment.classroom_id])
+            if fetched is None or assignment.classroom_id not in fetched:
+                raise Exception(f"Failed to fetch materials for assignment {assignment.classroom_id}")
+            google_materials = fetched[assignment.classroom_id]
 
-        ga_details = classroom_service.courses().courseWork().get(
-            courseId=assignment.course.google_id,
-            id=assignment.google_id
-        ).execute()
-
-        google_materials = ga_details.get('materials', [])
-        logger.info(f"Found {len(google_materials)} materials for assignment {assignment.google_id}")
+        logger.info(f"Found {len(google_materials)} materials for assignment {assignment.classroom_id}")
 
         materials_processed_count = 0
+        drive_materials = []
         materials_to_process = []
 
         for gm in google_materials:
@@ -168,63 +254,75 @@ def sync_assignment_materials_task(assignment_id):
             youtube_video = gm.get('youtubeVideo') # Add handling if needed
             form = gm.get('form') # Add handling if needed
 
-            material_google_id = None
+            lookup = None
             material_title = "Untitled Material"
             material_link = None
-            material_type = "Unknown"
             drive_file_id = None
 
             if drive_file:
                 df = drive_file.get('driveFile', {})
-                material_google_id = df.get('id')
+                drive_file_id = df.get('id') # Store Drive ID for download
                 material_title = df.get('title', 'Drive File')
                 material_link = df.get('alternateLink')
-                drive_file_id = material_google_id # Store Drive ID for download
-                # Determine file type from Drive API later if needed, or use title extension
-                material_type = "GOOGLE_DRIVE"
+                lookup = {'drive_file_id': drive_file_id} if drive_file_id else None
             elif link:
-                material_google_id = link.get('url') # Use URL as ID for links
                 material_title = link.get('title', 'Link')
-                material_link = link.get('url')
-                material_type = "LINK"
+                material_link = link.get('url') # Use URL as ID for links
+                lookup = {'download_link': material_link, 'drive_file_id': None} if material_link else None
             # Add elif for youtube_video, form etc.
 
-            if material_google_id:
-                mat, created = Material.objects.update_or_create(
-                    google_id=material_google_id,
+            if lookup:
+                mat, created = AssignmentMaterial.objects.update_or_create(
                     assignment=assignment,
+                    **lookup,
                     defaults={
-                        'title': material_title,
-                        'google_link': material_link,
-                        'file_type': material_type,
-                        'google_drive_file_id': drive_file_id,
-                        'processing_status': 'Pending' # Reset status on sync
+                        'name': material_title,
+                        'download_link': material_link,
+                        'material_type': _material_type(material_title),
                     }
                 )
                 if created:
-                    logger.info(f"Created new material record: {mat.title} (ID: {material_google_id})")
+                    logger.info(f"Created new material record: {mat.name} (ID: {drive_file_id or material_link})")
                 else:
-                    logger.debug(f"Updated material record: {mat.title} (ID: {material_google_id})")
+                    logger.debug(f"Updated material record: {mat.name} (ID: {drive_file_id or material_link})")
                 
-                # If it's a Drive file, trigger download and processing
+                # If it's a Drive file, trigger download and processing unless it's unchanged
                 if drive_file_id:
-                    materials_to_process.append(mat.id)
+                    drive_materials.append((mat, drive_file_id))
             else:
                 logger.warning(f"Could not identify Google ID for material: {gm}")
 
+        # One metadata fetch per file decides what to download; unchanged materials keep their status and chunks
+        drive_metadata = fetch_drive_file_metadata(user, [file_id for _, file_id in drive_materials]) if drive_materials else {}
+        unchanged_count = 0
+        for mat, drive_file_id in drive_materials:
+            metadata = (drive_metadata or {}).get(drive_file_id)
+            if metadata and _drive_file_unchanged(mat, metadata):
+                unchanged_count += 1
+                continue
+            mat.processing_status = 'Pending'
+            mat.save(update_fields=['processing_status'])
+            materials_to_process.append((mat.id, metadata))
+        if unchanged_count:
+            logger.info(f"Skipping {unchanged_count} unchanged Drive materials for assignment {assignment.classroom_id}")
+
         # Trigger download/processing tasks for Drive files
         if materials_to_process:
             assignment.status = 'Processing'
             logger.info(f"Triggering processing for {len(materials_to_process)} materials.")
-            for mat_id in materials_to_process:
-                download_and_process_material_task.delay(mat_id)
+            for mat_id, metadata in materials_to_process:
+                download_and_process_material_task.delay(mat_id, metadata)
+        elif assignment.materials.exclude(processing_status__isnull=True).exclude(processing_status='Processed').exists():
+            # Unchanged files from an earlier sync may still be in the pipeline (or failed); don't draft from them yet
+            assignment.status = 'Processing'
+            logger.info(f"No new or changed Drive materials for assignment {assignment.classroom_id}, but earlier materials are not processed yet.")
         else:
-            # If no Drive materials, mark as ready (or handle links differently)
+            # Every downloaded material is processed (links are never downloaded)
             assignment.status = 'MaterialsReady' 
-            logger.info(f"No Drive materials found to process for assignment {assignment.google_id}. Marked as MaterialsReady.")
+            logger.info(f"No new or changed Drive materials to process for assignment {assignment.classroom_id}. Marked as MaterialsReady.")
             
         assignment.save(update_fields=['status'])
-        return f"Material sync completed for assignment {assignment_id}. Triggered processing for {len(materials_to_process)} items."
+        return f"Material sync completed for assignment {assignment_id}. Triggered processing for {len(materials_to_process)} items, {unchanged_count} unchanged."
 
     except Assignment.DoesNotExist:
         logger.error(f"Assignment with ID {assignment_id} not found for material sync.")
@@ -243,37 +341,51 @@ def sync_assignment_materials_task(assignment_id):
         raise
 
 @shared_task
-def download_and_process_material_task(material_id):
+def download_and_process_material_task(material_id, drive_metadata=None):
     """
     Celery task to download a specific material file from Google Drive
     and trigger the AI processing pipeline.
+
+    Args:
+        material_id (int): The material to download
+        drive_metadata (dict, optional): Drive metadata fetched at sync, recorded
+            with the download so the next sync can tell whether the file changed
     """
     try:
-        material = Material.objects.select_related('assignment__course__owner').get(pk=material_id)
-        user = material.assignment.course.owner
-        drive_file_id = material.google_drive_file_id
+        material = AssignmentMaterial.objects.select_related('assignment__course__user').get(pk=material_id)
+        user = material.assignment.course.user
+        drive_file_id = material.drive_file_id
 
         if not drive_file_id:
-            logger.warning(f"Material {material_id} ('{material.title}') has no Google Drive file ID. Skipping download.")
+            logger.warning(f"Material {material_id} ('{material.name}') has no Google Drive file ID. Skipping download.")
             material.processing_status = 'Error' # Or a different status like 'NotApplicable'
             material.save(update_fields=['processing_status'])
             return f"Material {material_id} is not a Drive file."
 
-        logger.info(f"Starting download for material {material_id} ('{material.title}') - Drive ID: {drive_file_id}")
+        logger.info(f"Starting download for material {material_id} ('{material.name}') - Drive ID: {drive_file_id}")
         material.processing_status = 'Downloading'
         material.save(update_fields=['processing_status'])
 
-        file_stream = download_drive_file(user, drive_file_id)
+        # Stream straight to disk; only the blob key travels through the broker
+        with blob_store.BlobWriter() as writer:
+            blob_key = writer.commit() if download_drive_file(user, drive_file_id, writer) else None
 
-        if file_stream:
-            logger.info(f"Successfully downloaded material {material_id}. Triggering AI processing.")
+        if blob_key:
+            logger.info(f"Successfully downloaded material {material_id} ({writer.size} bytes). Triggering AI processing.")
+            previous_blob_key = material.blob_key
+            material.blob_key = blob_key
             material.processing_status = 'Downloaded'
-            material.save(update_fields=['processing_status'])
+            update_fields = ['blob_key', 'processing_status']
+            if drive_metadata:
+                for field, value in _drive_change_fields(drive_metadata).items():
+                    setattr(material, field, value)
+                    update_fields.append(field)
+            material.save(update_fields=update_fields)
+            # The material now holds the reference taken by commit()
+            blob_store.release(previous_blob_key)
             
             # Trigger the AI processing task (text extraction, chunking, embedding)
-            # Pass the content directly if small enough, or save temporarily and pass path
-            # For simplicity, let's assume process_material_task handles the stream
-            process_material_task.delay(material_id, file_stream.getvalue()) # Pass file content as bytes
+            process_material_task.delay(material_id, blob_key)
             
             return f"Material {material_id} downloaded. Processing triggered."
         else:
@@ -282,17 +394,17 @@ def download_and_process_material_task(material_id):
             material.save(update_fields=['processing_status'])
             return f"Failed to download material {material_id}."
 
-    except Material.DoesNotExist:
+    except AssignmentMaterial.DoesNotExist:
         logger.error(f"Material with ID {material_id} not found for download.")
         return f"Material {material_id} not found."
     except Exception as e:
         logger.exception(f"Error during material download/process trigger for material {material_id}: {e}")
         try:
             # Try to mark material as error if possible
-            material = Material.objects.get(pk=material_id)
+            material = AssignmentMaterial.objects.get(pk=material_id)
             material.processing_status = 'Error'
             material.save(update_fields=['processing_status'])
-        except Material.DoesNotExist:
+        except AssignmentMaterial.DoesNotExist:
             pass # Material already gone?
         raise
 
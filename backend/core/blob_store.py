@@ -0,0 +1,189 @@
+"""
+Content-addressed store for downloaded files.
+
+Blobs live under get_download_directory()/blobs, named by the SHA-256 of
+their bytes, so tasks hand each other a 64-character key instead of file
+content and identical files are stored once. Writes go to a temporary file
+in the same directory and are renamed into place, so a blob is either
+complete or absent. Each StoredBlob row counts the references to its blob;
+collect_garbage() deletes blobs that have had none for a grace period.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import timedelta
+from typing import Iterable, Optional, Union
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import StoredBlob
+from .utils import get_download_directory
+
+logger = logging.getLogger(__name__)
+
+TEMP_PREFIX = '.tmp-'
+
+
+def get_blob_directory() -> str:
+    """Return the blob store's root directory, creating it if needed."""
+    directory = os.path.join(get_download_directory(), 'blobs')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def blob_path(key: str) -> str:
+    """Return the file path of a blob, fanned out by the first two hex digits of its key."""
+    if len(key) != 64 or not all(char in '0123456789abcdef' for char in key):
+        raise ValueError(f"Invalid blob key: {key!r}")
+    return os.path.join(get_blob_directory(), key[:2], key)
+
+
+def open_blob(key: str):
+    """
+    Open a blob for reading.
+
+    Raises:
+        FileNotFoundError: If the blob isn't in the store
+    """
+    return open(blob_path(key), 'rb')
+
+
+class BlobWriter:
+    """
+    Writable file object that streams into the blob store, hashing as it goes.
+
+    Use as a context manager: call commit() to publish the blob; leaving the
+    block without committing (or on an error) discards the temporary file.
+    """
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(dir=get_blob_directory(), prefix=TEMP_PREFIX, delete=False)
+        self.size = 0
+        self.key = None
+
+    def write(self, data) -> int:
+        self._digest.update(data)
+        written = self._file.write(data)
+        self.size += written
+        return written
+
+    def commit(self) -> str:
+        """
+        Publish the written content and take one reference to it for the caller.
+
+        Returns:
+            str: The blob key
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        key = self._digest.hexdigest()
+        path = blob_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Reference before the file appears, so garbage collection can't pick the blob in between
+        with transaction.atomic():
+            acquire(key, size=self.size)
+            # Replacing an existing blob is harmless: same key, same bytes
+            os.replace(self._file.name, path)
+
+        self.key = key
+        return key
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._file.name)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.key is None:
+            self.abort()
+        return False
+
+
+def write_blob(content: Union[bytes, Iterable[bytes]]) -> str:
+    """
+    Store content, taking one reference to it for the caller.
+
+    Args:
+        content (bytes or Iterable[bytes]): The content, or its pieces in order
+
+    Returns:
+        str: The blob key
+    """
+    with BlobWriter() as writer:
+        for piece in ([content] if isinstance(content, (bytes, bytearray, memoryview)) else content):
+            writer.write(piece)
+        return writer.commit()
+
+
+def acquire(key: str, size: Optional[int] = None):
+    """Take a reference to a blob."""
+    with transaction.atomic():
+        blob, created = StoredBlob.objects.select_for_update().get_or_create(
+            key=key, defaults={'size': size or 0, 'ref_count': 1}
+        )
+        if not created:
+            StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1, updated_at=timezone.now())
+
+
+def release(key: Optional[str]):
+    """Drop a reference to a blob. The file stays until garbage collection."""
+    if not key:
+        return
+    updated = StoredBlob.objects.filter(key=key, ref_count__gt=0).update(
+        ref_count=F('ref_count') - 1, updated_at=timezone.now()
+    )
+    if not updated:
+        logger.warning(f"Released blob {key[:12]} which holds no references")
+
+
+def collect_garbage(grace_seconds: int = None) -> int:
+    """
+    Delete blobs that have been unreferenced for longer than the grace period,
+    and temporary files left behind by interrupted writes.
+
+    Args:
+        grace_seconds (int, optional): Defaults to settings.BLOB_GC_GRACE_SECONDS
+
+    Returns:
+        int: Number of blobs deleted
+    """
+    grace_seconds = settings.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+    deleted = 0
+
+    candidates = StoredBlob.objects.filter(ref_count=0, updated_at__lt=cutoff).values_list('key', flat=True)
+    for key in list(candidates.iterator()):
+        with transaction.atomic():
+            # Re-checked under the row lock: a writer may have just re-referenced it
+            if not StoredBlob.objects.select_for_update().filter(key=key, ref_count=0).exists():
+                continue
+            StoredBlob.objects.filter(key=key).delete()
+            try:
+                os.remove(blob_path(key))
+            except FileNotFoundError:
+                pass
+        deleted += 1
+
+    directory = get_blob_directory()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(TEMP_PREFIX) and os.path.getmtime(path) < cutoff.timestamp():
+            os.remove(path)
+
+    if deleted:
+        logger.info(f"Garbage collected {deleted} unreferenced blobs")
+    return deleted
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConfigurationSetting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Configuration key', max_length=100, unique=True)),
+                ('value', models.TextField(help_text='Configuration value')),
+                ('value_type', models.CharField(choices=[('str', 'String'), ('int', 'Integer'), ('float', 'Float'), ('bool', 'Boolean'), ('json', 'JSON')], default='str', help_text='Data type of the value', max_length=20)),
+                ('description', models.TextField(blank=True, help_text='Description of what this setting controls')),
+                ('is_active', models.BooleanField(default=True, help_text='Whether this setting is active')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Configuration Setting',
+                'verbose_name_plural': 'Configuration Settings',
+                'ordering': ['key'],
+            },
+        ),
+    ]
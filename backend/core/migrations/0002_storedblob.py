@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(help_text='SHA-256 hex digest of the content', max_length=64, unique=True)),
+                ('size', models.BigIntegerField(default=0, help_text='Size in bytes')),
+                ('ref_count', models.PositiveIntegerField(default=0, help_text='Number of references held')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='core_stored_ref_cou_3e9028_idx')],
+            },
+        ),
+    ]
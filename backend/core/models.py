@@ -58,4 +58,22 @@ class ConfigurationSetting(models.Model):
                 return json.loads(self.value)
             except Exception:
                 return {}
-        return self.value
\ No newline at end of file
+        return self.value
+
+class StoredBlob(TimeStampedModel):
+    """
+    A file in the content-addressed blob store (core.blob_store), keyed by
+    the SHA-256 of its bytes. ref_count counts the records pointing at it;
+    unreferenced blobs are garbage collected after a grace period.
+    """
+    key = models.CharField(max_length=64, unique=True, help_text="SHA-256 hex digest of the content")
+    size = models.BigIntegerField(default=0, help_text="Size in bytes")
+    ref_count = models.PositiveIntegerField(default=0, help_text="Number of references held")
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.key[:12]} ({self.ref_count} refs)"
@@ -0,0 +1,23 @@
+import logging
+from celery import shared_task
+
+from . import blob_store
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def collect_blob_garbage_task(grace_seconds=None):
+    """
+    Delete downloaded files no material has referenced for settings.BLOB_GC_GRACE_SECONDS.
+    Meant to run periodically from Celery beat.
+    
+    Args:
+        grace_seconds (int, optional): Override the grace period
+    """
+    try:
+        deleted = blob_store.collect_garbage(grace_seconds)
+        return f"Garbage collected {deleted} blobs"
+        
+    except Exception as e:
+        logger.exception(f"Error collecting blob garbage: {e}")
+        return f"Failed to collect blob garbage: {str(e)}"